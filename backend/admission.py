@@ -0,0 +1,238 @@
+"""
+Admission Control
+
+In-memory admission control for expensive endpoints:
+- Per-client token buckets (bounded table, least-recently-seen clients evicted)
+- A global cap on in-flight work, weighted by portfolio size
+- Short bounded queueing when the cap is reached, then fast 429 rejection
+
+All state lives in this process; nothing touches disk.
+"""
+
+import asyncio
+import ipaddress
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Union
+
+from fastapi import HTTPException, Request
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+# ------------------------------
+# Configuration (overridable through environment variables)
+CLIENT_RATE_PER_SEC = float(os.getenv('ADMISSION_CLIENT_RATE', '10'))    # units refilled per second
+CLIENT_BURST = float(os.getenv('ADMISSION_CLIENT_BURST', '40'))          # bucket capacity in units
+MAX_TRACKED_CLIENTS = int(os.getenv('ADMISSION_MAX_CLIENTS', '10000'))
+MAX_INFLIGHT_UNITS = int(os.getenv('ADMISSION_MAX_INFLIGHT', '64'))
+MAX_QUEUED_REQUESTS = int(os.getenv('ADMISSION_MAX_QUEUED', '128'))
+MAX_QUEUE_WAIT = float(os.getenv('ADMISSION_MAX_QUEUE_WAIT', '2.0'))     # seconds
+HOLDINGS_PER_UNIT = 10  # every 10 holdings cost one extra unit
+# Proxies whose X-Forwarded-For is honored (comma-separated addresses or CIDRs); empty trusts none
+TRUSTED_PROXIES = os.getenv('ADMISSION_TRUSTED_PROXIES', '')
+
+
+def portfolio_weight(holdings_count: int) -> int:
+    """Cost of one analysis in admission units: 1 plus 1 per HOLDINGS_PER_UNIT holdings."""
+    return 1 + holdings_count // HOLDINGS_PER_UNIT
+
+
+def parse_networks(spec: str) -> List[IPNetwork]:
+    """Parse a comma-separated list of addresses/CIDRs, skipping invalid entries."""
+    networks = []
+    for part in spec.split(','):
+        part = part.strip()
+        if part:
+            try:
+                networks.append(ipaddress.ip_network(part, strict=False))
+            except ValueError:
+                pass
+    return networks
+
+
+_trusted_proxies = parse_networks(TRUSTED_PROXIES)
+
+
+def _is_trusted(address: str, trusted: List[IPNetwork]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted)
+
+
+def client_key(request: Request, trusted: Optional[List[IPNetwork]] = None) -> str:
+    """
+    Identify the caller by peer address.
+
+    X-Forwarded-For is only honored when the peer is a trusted proxy; the
+    client is then the nearest hop (from the right) that is not itself a
+    trusted proxy, so callers cannot pick their own key by sending the header.
+    """
+    trusted = _trusted_proxies if trusted is None else trusted
+    peer = request.client.host if request.client else 'unknown'
+    forwarded = request.headers.get('x-forwarded-for')
+    if not forwarded or not _is_trusted(peer, trusted):
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted):
+            return hop
+    return hops[0] if hops else peer
+
+
+class TokenBucket:
+    """Classic token bucket refilled lazily on access."""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def try_take(self, cost: float, rate: float, capacity: float, now: float) -> float:
+        """
+        Take cost tokens if available.
+
+        Returns:
+            0.0 on success, otherwise seconds until enough tokens will be available
+        """
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / rate
+
+
+class AdmissionController:
+    """Per-client rate limiting plus a weighted global concurrency cap."""
+
+    def __init__(self, rate: float = CLIENT_RATE_PER_SEC, burst: float = CLIENT_BURST,
+                 max_clients: int = MAX_TRACKED_CLIENTS, max_inflight: int = MAX_INFLIGHT_UNITS,
+                 max_queued: int = MAX_QUEUED_REQUESTS, max_queue_wait: float = MAX_QUEUE_WAIT):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.max_queue_wait = max_queue_wait
+
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._inflight = 0
+        self._queued = 0
+        self._capacity_changed: Optional[asyncio.Condition] = None
+
+        self._metrics = {
+            'admitted': 0,
+            'rejected_rate_limited': 0,
+            'rejected_overloaded': 0,
+            'queued': 0,
+            'queue_timeouts': 0,
+            'queue_wait_total_s': 0.0,
+            'queue_wait_max_s': 0.0,
+            'evicted_clients': 0,
+        }
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so the controller can be built outside a running loop
+        if self._capacity_changed is None:
+            self._capacity_changed = asyncio.Condition()
+        return self._capacity_changed
+
+    def _check_rate(self, client: str, cost: float) -> None:
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+                self._metrics['evicted_clients'] += 1
+        else:
+            self._buckets.move_to_end(client)
+
+        # A single request larger than the bucket is charged as a full bucket
+        wait = bucket.try_take(min(cost, self.burst), self.rate, self.burst, now)
+        if wait > 0:
+            self._metrics['rejected_rate_limited'] += 1
+            raise HTTPException(
+                status_code=429,
+                detail='Rate limit exceeded for this client',
+                headers={'Retry-After': str(max(1, math.ceil(wait)))},
+            )
+
+    async def _acquire_capacity(self, units: int) -> None:
+        if self._queued == 0 and self._inflight + units <= self.max_inflight:
+            self._inflight += units
+            return
+
+        if self._queued >= self.max_queued:
+            self._metrics['rejected_overloaded'] += 1
+            raise HTTPException(status_code=429, detail='Server busy, try again shortly',
+                                headers={'Retry-After': '1'})
+
+        self._queued += 1
+        self._metrics['queued'] += 1
+        start = time.monotonic()
+        condition = self._condition()
+        try:
+            async with condition:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self._inflight + units <= self.max_inflight),
+                    timeout=self.max_queue_wait,
+                )
+                self._inflight += units
+        except asyncio.TimeoutError:
+            self._metrics['queue_timeouts'] += 1
+            self._metrics['rejected_overloaded'] += 1
+            raise HTTPException(status_code=429, detail='Server busy, try again shortly',
+                                headers={'Retry-After': str(max(1, math.ceil(self.max_queue_wait)))})
+        finally:
+            self._queued -= 1
+            waited = time.monotonic() - start
+            self._metrics['queue_wait_total_s'] += waited
+            self._metrics['queue_wait_max_s'] = max(self._metrics['queue_wait_max_s'], waited)
+
+    async def _release_capacity(self, units: int) -> None:
+        self._inflight -= units
+        if self._capacity_changed is not None:
+            async with self._capacity_changed:
+                self._capacity_changed.notify_all()
+
+    @asynccontextmanager
+    async def admit(self, client: str, units: int):
+        """
+        Admit one unit of work or raise HTTPException(429).
+
+        Args:
+            client: Client identifier for rate limiting
+            units: Cost of the work (see portfolio_weight)
+        """
+        # Work bigger than the whole cap may still run, just alone
+        units = min(units, self.max_inflight)
+        self._check_rate(client, units)
+        await self._acquire_capacity(units)
+        self._metrics['admitted'] += 1
+        try:
+            yield
+        finally:
+            await self._release_capacity(units)
+
+    def get_metrics(self) -> Dict:
+        """Get admission counters and current load."""
+        return dict(
+            self._metrics,
+            inflight_units=self._inflight,
+            max_inflight_units=self.max_inflight,
+            queue_depth=self._queued,
+            tracked_clients=len(self._buckets),
+        )
+
+
+# Global admission controller for /api/analyze
+analysis_admission = AdmissionController()
@@ -1,38 +1,202 @@
-from typing import List, Dict
+import sys
+from array import array
+from typing import List, Dict, Iterator, Optional, Tuple
 from market import get_stock_by_symbol
 
 
-def analyze_portfolio(portfolio: List[Dict], market_data: List[Dict]) -> Dict:
+# ------------------------------
+# Advice messages (shared by the reference and precomputed-signal paths)
+CONCENTRATED_MESSAGE = 'Too concentrated — consider reducing this holding.'
+DROP_MESSAGE = 'Recent sharp drop — consider reducing or reviewing reason.'
+GROWTH_MESSAGE = 'Strong recent growth — consider holding or adding if underweight.'
+VOLATILITY_MESSAGE = 'High volatility — this is risky for beginners.'
+UNDERWEIGHT_MESSAGE = 'Underweight and positive momentum — consider adding a small position.'
+DIVERSIFY_MESSAGE = 'Your portfolio lacks diversification; consider adding stocks from other sectors (e.g., Pharma or Banking).'
+
+# ------------------------------
+# Per-symbol signal bits (depend only on the stock, not the portfolio)
+SIGNAL_DROP = 1        # change_7d_pct < -5
+SIGNAL_GROWTH = 2      # change_7d_pct > 5
+SIGNAL_VOLATILE = 4    # volatility > 0.04
+SIGNAL_MOMENTUM = 8    # change_7d_pct > 2
+
+
+def _advice_fragments(mask: int) -> Tuple[Tuple, Tuple]:
+    """(items, items_with_volatility) advice fragments for a signal mask."""
+    items = []
+    if mask & SIGNAL_DROP:
+        items.append(('reduce', DROP_MESSAGE))
+    if mask & SIGNAL_GROWTH:
+        items.append(('hold_or_buy', GROWTH_MESSAGE))
+
+    # Volatility is folded into the first advice item, or becomes its own caution
+    if not mask & SIGNAL_VOLATILE:
+        with_volatility = items
+    elif items:
+        first_action, first_message = items[0]
+        with_volatility = [(first_action, f'{first_message} {VOLATILITY_MESSAGE}')] + items[1:]
+    else:
+        with_volatility = [('caution', VOLATILITY_MESSAGE)]
+    return tuple(items), tuple(with_volatility)
+
+
+# Fragments depend only on the mask, so they are built once per possible mask
+_FRAGMENTS = tuple(_advice_fragments(mask) for mask in range(16))
+
+
+def signal_mask(change_7d_pct: float, volatility: float) -> int:
+    """Signal bits for one stock; NaN inputs set no bits."""
+    mask = 0
+    if change_7d_pct < -5:
+        mask |= SIGNAL_DROP
+    if change_7d_pct > 5:
+        mask |= SIGNAL_GROWTH
+    if volatility > 0.04:
+        mask |= SIGNAL_VOLATILE
+    if change_7d_pct > 2:
+        mask |= SIGNAL_MOMENTUM
+    return mask
+
+
+class SymbolSignals:
+    """Precomputed, portfolio-independent advice inputs for one stock (created on lookup)."""
+
+    __slots__ = ('stock', 'mask', 'items', 'items_with_volatility')
+
+    def __init__(self, stock: Dict, mask: Optional[int] = None):
+        if mask is None:
+            mask = signal_mask(stock['change_7d_pct'], stock['volatility'])
+        self.stock = stock
+        self.mask = mask
+        self.items, self.items_with_volatility = _FRAGMENTS[mask]
+
+
+class SignalTable:
+    """
+    Signals for every row of a market snapshot, keyed by symbol.
+
+    Holds one mask byte per row and a symbol -> row position map; SymbolSignals
+    entries are created on lookup. The position map is shared with the previous
+    table when the symbol column is unchanged, which is the usual case for
+    price refreshes.
+    """
+
+    __slots__ = ('records', 'masks', 'positions')
+
+    def __init__(self, records: List[Dict], masks: array, positions: Dict[str, int]):
+        self.records = records
+        self.masks = masks
+        self.positions = positions
+
+    def get(self, symbol: str, default=None) -> Optional[SymbolSignals]:
+        position = self.positions.get(symbol)
+        if position is None:
+            return default
+        return SymbolSignals(self.records[position], self.masks[position])
+
+    def __getitem__(self, symbol: str) -> SymbolSignals:
+        entry = self.get(symbol)
+        if entry is None:
+            raise KeyError(symbol)
+        return entry
+
+    def __contains__(self, symbol) -> bool:
+        return symbol in self.positions
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.positions)
+
+
+def _columns(market_data: List[Dict], with_signal_fields: bool = True) -> Tuple[List, ...]:
+    """symbol (and change_7d_pct, volatility) values in row order, read column-wise from a store."""
+    fields = ('symbol', 'change_7d_pct', 'volatility') if with_signal_fields else ('symbol',)
+    if hasattr(market_data, 'column') and len(market_data):
+        return tuple(market_data.column(field) for field in fields)
+    return ([stock.get('symbol') for stock in market_data],
+            *([stock[field] for stock in market_data] for field in fields[1:]))
+
+
+def build_signal_table(market_data: List[Dict], previous: Optional[SignalTable] = None) -> SignalTable:
+    """
+    Precompute signals for every stock in a market snapshot.
+
+    The first record wins when a symbol appears twice, matching get_stock_by_symbol.
+    The symbol -> position map of previous is reused when every symbol is at
+    the same position.
+    """
+    symbols, changes, volatilities = _columns(market_data)
+    masks = array('B', map(signal_mask, changes, volatilities))
+    if previous is not None and len(previous.records) == len(symbols) and \
+            _columns(previous.records, with_signal_fields=False)[0] == symbols:
+        positions = previous.positions
+    else:
+        positions = {}
+        for position, symbol in enumerate(symbols):
+            positions.setdefault(symbol, position)
+    return SignalTable(market_data, masks, positions)
+
+
+def signal_table_nbytes(table: SignalTable, seen: Optional[set] = None) -> int:
+    """
+    Approximate bytes held by a signal table: its masks and position map.
+
+    Args:
+        table: Signal table from build_signal_table
+        seen: ids of objects already counted (e.g. a position map shared with another table); updated in place
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    for obj in (table, table.masks):
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            total += sys.getsizeof(obj)
+    positions = table.positions
+    if id(positions) not in seen:
+        seen.add(id(positions))
+        total += sys.getsizeof(positions) + sum(map(sys.getsizeof, positions.values()))
+    return total
+
+
+def analyze_portfolio(portfolio: List[Dict], market_data: List[Dict],
+                      signals: Optional[SignalTable] = None) -> Dict:
     """
     Analyze portfolio and provide investment advice.
-    
+
     Args:
         portfolio: List of {"symbol": "...", "quantity": <int>}
         market_data: List of stock data dictionaries
-    
+        signals: Optional signal table built from market_data by build_signal_table;
+            when given, only the weight-dependent rules are evaluated per request
+
     Returns:
         Dict with advice, portfolio_value, and details
     """
+    if signals is not None:
+        return _analyze_with_signals(portfolio, signals)
+
     advice = []
     per_stock_details = []
     total_portfolio_value = 0.0
     sectors_present = set()
-    
+
     # Calculate portfolio value and per-stock details
     for holding in portfolio:
         symbol = holding['symbol']
         quantity = holding['quantity']
-        
+
         stock_data = get_stock_by_symbol(symbol, market_data)
         if not stock_data:
             continue
-            
+
         price = stock_data['price']
         stock_value = price * quantity
         total_portfolio_value += stock_value
-        
+
         sectors_present.add(stock_data['sector'])
-        
+
         per_stock_details.append({
             'symbol': symbol,
             'quantity': quantity,
@@ -42,65 +206,156 @@ def analyze_portfolio(portfolio: List[Dict], market_data: List[Dict]) -> Dict:
             'change_7d_pct': stock_data['change_7d_pct'],
             'volatility': stock_data['volatility']
         })
-    
+
     # Calculate weights and generate advice
     for detail in per_stock_details:
         symbol = detail['symbol']
         weight = detail['stock_value'] / total_portfolio_value if total_portfolio_value > 0 else 0
         detail['weight'] = weight
-        
+
         change_7d_pct = detail['change_7d_pct']
         volatility = detail['volatility']
-        
+
         # Generate advice based on rules
         if weight > 0.5:
             advice.append({
                 'symbol': symbol,
                 'action': 'reduce',
-                'message': 'Too concentrated — consider reducing this holding.'
+                'message': CONCENTRATED_MESSAGE
             })
-        
+
         if change_7d_pct < -5:
             advice.append({
                 'symbol': symbol,
                 'action': 'reduce',
-                'message': 'Recent sharp drop — consider reducing or reviewing reason.'
+                'message': DROP_MESSAGE
             })
-        
+
         if change_7d_pct > 5:
             advice.append({
                 'symbol': symbol,
                 'action': 'hold_or_buy',
-                'message': 'Strong recent growth — consider holding or adding if underweight.'
+                'message': GROWTH_MESSAGE
             })
-        
+
         if volatility > 0.04:
             # Append to existing advice or create new one
             existing_advice = next((a for a in advice if a['symbol'] == symbol), None)
             if existing_advice:
-                existing_advice['message'] += ' High volatility — this is risky for beginners.'
+                existing_advice['message'] += ' ' + VOLATILITY_MESSAGE
             else:
                 advice.append({
                     'symbol': symbol,
                     'action': 'caution',
-                    'message': 'High volatility — this is risky for beginners.'
+                    'message': VOLATILITY_MESSAGE
                 })
-        
+
         if weight < 0.05 and change_7d_pct > 2:
             advice.append({
                 'symbol': symbol,
                 'action': 'buy',
-                'message': 'Underweight and positive momentum — consider adding a small position.'
+                'message': UNDERWEIGHT_MESSAGE
             })
-    
+
     # Check sector diversification
     if len(sectors_present) < 2:
         advice.append({
             'symbol': 'PORTFOLIO',
             'action': 'diversify',
-            'message': 'Your portfolio lacks diversification; consider adding stocks from other sectors (e.g., Pharma or Banking).'
+            'message': DIVERSIFY_MESSAGE
         })
-    
+
+    return {
+        'advice': advice,
+        'portfolio_value': total_portfolio_value,
+        'details': {
+            'per_stock': per_stock_details
+        }
+    }
+
+
+def _analyze_with_signals(portfolio: List[Dict], signals: SignalTable) -> Dict:
+    """
+    Same output as the reference path, using precomputed per-symbol signals.
+
+    Per holding this only evaluates the weight rules (> 0.5 concentration,
+    < 0.05 underweight) and copies the prebuilt advice fragments.
+    """
+    advice = []
+    per_stock_details = []
+    matched = []
+    total_portfolio_value = 0.0
+    sectors_present = set()
+
+    for holding in portfolio:
+        symbol = holding['symbol']
+        quantity = holding['quantity']
+
+        entry = signals.get(symbol)
+        if entry is None:
+            continue
+        stock_data = entry.stock
+
+        price = stock_data['price']
+        stock_value = price * quantity
+        total_portfolio_value += stock_value
+
+        sectors_present.add(stock_data['sector'])
+
+        per_stock_details.append({
+            'symbol': symbol,
+            'quantity': quantity,
+            'price': price,
+            'stock_value': stock_value,
+            'sector': stock_data['sector'],
+            'change_7d_pct': stock_data['change_7d_pct'],
+            'volatility': stock_data['volatility']
+        })
+        matched.append(entry)
+
+    # First advice item per symbol: volatility notes attach to it when a symbol is held twice
+    first_advice: Dict[str, Dict] = {}
+
+    for detail, entry in zip(per_stock_details, matched):
+        symbol = detail['symbol']
+        weight = detail['stock_value'] / total_portfolio_value if total_portfolio_value > 0 else 0
+        detail['weight'] = weight
+
+        volatile = entry.mask & SIGNAL_VOLATILE
+        earlier = first_advice.get(symbol) if volatile else None
+        if earlier is not None:
+            earlier['message'] += ' ' + VOLATILITY_MESSAGE
+
+        items = []
+        if weight > 0.5:
+            message = CONCENTRATED_MESSAGE
+            if volatile and earlier is None:
+                message += ' ' + VOLATILITY_MESSAGE
+            items.append({'symbol': symbol, 'action': 'reduce', 'message': message})
+            fragments = entry.items
+        elif earlier is not None:
+            fragments = entry.items
+        else:
+            fragments = entry.items_with_volatility
+
+        for action, message in fragments:
+            items.append({'symbol': symbol, 'action': action, 'message': message})
+
+        if weight < 0.05 and entry.mask & SIGNAL_MOMENTUM:
+            items.append({'symbol': symbol, 'action': 'buy', 'message': UNDERWEIGHT_MESSAGE})
+
+        if items and symbol not in first_advice:
+            first_advice[symbol] = items[0]
+        advice.extend(items)
+
+    # Check sector diversification
+    if len(sectors_present) < 2:
+        advice.append({
+            'symbol': 'PORTFOLIO',
+            'action': 'diversify',
+            'message': DIVERSIFY_MESSAGE
+        })
+
     return {
         'advice': advice,
         'portfolio_value': total_portfolio_value,
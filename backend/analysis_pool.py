@@ -0,0 +1,214 @@
+"""
+Analysis Process Pool
+
+Runs large portfolio analyses in a pool of worker processes so they neither
+block the event loop nor compete for the GIL with other requests.
+
+Workers hold the market data of the current snapshot in memory. When the
+market updater publishes a snapshot, a background thread pickles only what
+analyses need (the store and the signal table) once to a temp file; each job
+carries only the snapshot version, that file path and the holdings. A worker
+reloads the data only when it sees a newer version: new workers load the
+latest file in their initializer, and running workers are sent a warm-up
+task that returns at once if they already hold it. Until the file is
+written, analyses of the new snapshot run inline. Small portfolios are
+analyzed inline.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import advisor
+from snapshot import MarketSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------
+# Configuration (overridable through environment variables)
+POOL_THRESHOLD = int(os.getenv('ANALYSIS_POOL_THRESHOLD', '200'))  # holdings at or above this go to the pool
+POOL_WORKERS = int(os.getenv('ANALYSIS_POOL_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))  # 0 disables
+SNAPSHOTS_KEPT = 2   # older snapshot files are deleted; in-flight jobs may still use the previous one
+
+
+LATEST_FILE = 'latest'  # names the newest snapshot file for workers started later
+
+
+# ------------------------------
+# Worker-process state
+_worker_version: Optional[int] = None
+_worker_data: Optional[Tuple] = None  # (records, signals)
+
+
+def _init_worker(snapshot_dir: str) -> None:
+    """Load the newest published snapshot, if any, when a worker process starts."""
+    try:
+        with open(os.path.join(snapshot_dir, LATEST_FILE)) as f:
+            version, path = f.read().split(' ', 1)
+        _ensure_snapshot(int(version), path)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        pass  # nothing published yet, or already replaced: jobs load lazily
+
+
+def _ensure_snapshot(version: int, path: str) -> None:
+    global _worker_version, _worker_data
+    if _worker_version != version:
+        with open(path, 'rb') as f:
+            _worker_data = pickle.load(f)
+        _worker_version = version
+
+
+def _worker_warm(version: int, path: str) -> int:
+    """Load a snapshot unless this worker already holds it; never waits on other workers."""
+    _ensure_snapshot(version, path)
+    return os.getpid()
+
+
+def _worker_analyze(version: int, path: str, portfolio: List[Dict]) -> Dict:
+    _ensure_snapshot(version, path)
+    records, signals = _worker_data
+    return advisor.analyze_portfolio(portfolio, records, signals)
+
+
+class AnalysisPool:
+    """Dispatches analyses inline or to warm worker processes depending on size."""
+
+    def __init__(self, threshold: int = POOL_THRESHOLD, workers: int = POOL_WORKERS):
+        self.threshold = threshold
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # One thread, so snapshots are written in publish order
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._snapshot_dir: Optional[str] = None
+        self._snapshot_files: List[str] = []
+        self._version: Optional[int] = None
+        self._metrics = {'inline': 0, 'offloaded': 0, 'fallbacks': 0, 'snapshots_published': 0}
+
+    def start(self) -> None:
+        """Start the worker processes (no-op when workers is 0)."""
+        if self.workers <= 0 or self._executor is not None:
+            return
+        self._snapshot_dir = tempfile.mkdtemp(prefix='analysis-pool-')
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(self._snapshot_dir,),
+        )
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analysis-pool-publish')
+        logger.info(f"Analysis pool started with {self.workers} workers (threshold {self.threshold} holdings)")
+
+    def shutdown(self) -> None:
+        """Stop the workers and remove snapshot files."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True, cancel_futures=True)
+            self._writer = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._snapshot_dir is not None:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+            self._snapshot_dir = None
+            self._snapshot_files = []
+        self._version = None
+
+    def publish_snapshot(self, snapshot: MarketSnapshot) -> Optional[Future]:
+        """
+        Snapshot listener: hand a new market snapshot to the workers.
+
+        Pickling and writing run on a background thread, not the event loop.
+
+        Returns:
+            Future that completes once workers can be sent jobs for this
+            version, or None when the pool is not running
+        """
+        if self._writer is None:
+            return None
+        return self._writer.submit(self._write_snapshot, snapshot.version, snapshot.store, snapshot.signals)
+
+    def _write_snapshot(self, version: int, records, signals) -> None:
+        try:
+            self._write_snapshot_file(version, records, signals)
+        except Exception as e:
+            logger.error(f"Analysis pool could not publish snapshot v{version}: {e}")
+
+    def _write_snapshot_file(self, version: int, records, signals) -> None:
+        snapshot_dir = self._snapshot_dir
+        path = os.path.join(snapshot_dir, f'snapshot-{version}.pkl')
+        tmp_path = f'{path}.tmp'
+        # Only what analyses read; the search and screen indexes stay in the server
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((records, signals), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        latest_path = os.path.join(snapshot_dir, LATEST_FILE)
+        with open(f'{latest_path}.tmp', 'w') as f:
+            f.write(f'{version} {path}')
+        os.replace(f'{latest_path}.tmp', latest_path)
+
+        with self._lock:
+            self._snapshot_files.append(path)
+            stale_files = self._snapshot_files[:-SNAPSHOTS_KEPT]
+            del self._snapshot_files[:-SNAPSHOTS_KEPT]
+            self._version = version
+            self._metrics['snapshots_published'] += 1
+        for stale in stale_files:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+        # Warm running workers; one that is busy or already holds this version returns at once
+        executor = self._executor
+        if executor is not None:
+            for _ in range(self.workers):
+                executor.submit(_worker_warm, version, path)
+
+    async def analyze(self, portfolio: List[Dict], snapshot: MarketSnapshot) -> Dict:
+        """
+        Analyze a portfolio, offloading to the pool when it is large enough.
+
+        Args:
+            portfolio: Holdings to analyze
+            snapshot: Market snapshot to analyze against; offloading only
+                happens when the pool holds this same version
+
+        Returns:
+            Result of advisor.analyze_portfolio
+        """
+        version = snapshot.version
+        with self._lock:
+            pooled = self._version is not None and version == self._version
+            path = self._snapshot_files[-1] if pooled else None
+        if self._executor is None or len(portfolio) < self.threshold or not pooled:
+            self._metrics['inline'] += 1
+            return advisor.analyze_portfolio(portfolio, snapshot.records, snapshot.signals)
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, _worker_analyze, version, path, portfolio)
+            self._metrics['offloaded'] += 1
+            return result
+        except Exception as e:
+            logger.error(f"Analysis pool job failed, running inline: {e}")
+            self._metrics['fallbacks'] += 1
+            return advisor.analyze_portfolio(portfolio, snapshot.records, snapshot.signals)
+
+    def get_metrics(self) -> Dict:
+        """Get dispatch counters and pool configuration."""
+        return dict(
+            self._metrics,
+            workers=self.workers if self._executor is not None else 0,
+            threshold=self.threshold,
+            snapshot_version=self._version,
+        )
+
+
+# Global analysis pool
+analysis_pool = AnalysisPool()
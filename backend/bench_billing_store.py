@@ -0,0 +1,141 @@
+"""
+Billing Store Benchmark
+
+Compares the JSON and SQLite billing backends on:
+- write throughput: one analysis session (one compound event) appended at a
+  time, as FlexpriceMock.process_full_analysis_billing does
+- summary latency: lifetime totals per item type
+- range latency: revenue for the most recent 10% of the time span
+
+With --concurrency, also measures billing throughput in events per second
+for concurrent sessions going through GroupCommitWriter, as
+FlexpriceMock.record_analysis does, against one commit per event.
+
+Usage:
+    python bench_billing_store.py --sessions 2000 5000
+    python bench_billing_store.py --sessions 2000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from billing_store import GroupCommitWriter, JsonBillingStore, SqliteBillingStore
+
+
+def make_event(i: int, start: datetime) -> Dict:
+    """A compound event shaped like the one FlexpriceMock writes for one analysis."""
+    advice_count = i % 5
+    return {
+        'transaction_id': f"flx_analysis_{i:08d}",
+        'item_type': 'analysis_session',
+        'session_id': f"flx_session_{i:08d}",
+        'quantity': advice_count,
+        'amount': 5.0 + 2.0 * advice_count,
+        'currency': 'INR',
+        'timestamp': (start + timedelta(seconds=i)).isoformat(),
+        'status': 'completed',
+        'breakdown': {
+            'portfolio_analysis': {'amount': 5.0},
+            'advice_generation': {'quantity': advice_count, 'unit_price': 2.0, 'amount': 2.0 * advice_count},
+        },
+    }
+
+
+def make_session(i: int, start: datetime) -> List[Dict]:
+    """Records written for one analysis session."""
+    return [make_event(i, start)]
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """Best-of-N wall time of fn() in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_store(store, sessions: int) -> Dict:
+    start = datetime(2025, 1, 1)
+    write_start = time.perf_counter()
+    for i in range(sessions):
+        store.append_many(make_session(i, start))
+    write_elapsed = time.perf_counter() - write_start
+
+    range_start = (start + timedelta(seconds=int(sessions * 0.9))).isoformat()
+    range_end = (start + timedelta(seconds=sessions)).isoformat()
+    return {
+        'sessions_per_s': sessions / write_elapsed,
+        'summary_ms': timed(store.totals_by_item_type) * 1000,
+        'range_ms': timed(lambda: store.revenue_between(range_start, range_end)) * 1000,
+        'session_lookup_ms': timed(lambda: store.session_records(f"flx_session_{sessions // 2:08d}")) * 1000,
+    }
+
+
+def bench_concurrent(store, sessions: int, concurrency: int, max_batch: int) -> Dict:
+    """Events per second for `concurrency` clients billing `sessions` analyses in total."""
+    writer = GroupCommitWriter(store, max_batch=max_batch)
+    start = datetime(2025, 1, 1)
+
+    async def client(worker: int) -> None:
+        for i in range(worker, sessions, concurrency):
+            await writer.append(make_event(i, start))
+
+    async def run() -> None:
+        await asyncio.gather(*(client(worker) for worker in range(concurrency)))
+
+    write_start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - write_start
+    metrics = writer.get_metrics()
+    return {
+        'events_per_s': sessions / elapsed,
+        'commits': metrics['commits'],
+        'mean_batch_size': metrics['mean_batch_size'],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark billing storage backends')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1000, 3000],
+                        help='Number of analysis sessions to write (JSON cost grows quadratically)')
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help='Also benchmark this many concurrent sessions, group commit vs one commit per event')
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'sessions':>9} {'sessions/s':>11} {'summary ms':>11} {'range ms':>9} {'session ms':>11}")
+    with tempfile.TemporaryDirectory(prefix='billing-bench-') as workdir:
+        for sessions in args.sessions:
+            stores = {
+                'json': JsonBillingStore(os.path.join(workdir, f'billing_{sessions}.json')),
+                'sqlite': SqliteBillingStore(os.path.join(workdir, f'billing_{sessions}.db')),
+            }
+            for name, store in stores.items():
+                result = bench_store(store, sessions)
+                store.close()
+                print(f"{name:<8} {sessions:>9} {result['sessions_per_s']:>11.0f} {result['summary_ms']:>11.2f} "
+                      f"{result['range_ms']:>9.2f} {result['session_lookup_ms']:>11.2f}")
+
+        if args.concurrency > 0:
+            print()
+            print(f"{'backend':<8} {'sessions':>9} {'clients':>8} {'commit':<10} {'events/s':>10} "
+                  f"{'commits':>8} {'mean batch':>11}")
+            for sessions in args.sessions:
+                for name, store_class, suffix in (('json', JsonBillingStore, 'json'), ('sqlite', SqliteBillingStore, 'db')):
+                    for mode, max_batch in (('per-event', 1), ('group', 500)):
+                        store = store_class(os.path.join(workdir, f'concurrent_{sessions}_{mode}.{suffix}'))
+                        result = bench_concurrent(store, sessions, args.concurrency, max_batch)
+                        store.close()
+                        print(f"{name:<8} {sessions:>9} {args.concurrency:>8} {mode:<10} "
+                              f"{result['events_per_s']:>10.0f} {result['commits']:>8} "
+                              f"{result['mean_batch_size']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+"""
+Billing Storage
+
+Storage backends for Flexprice mock billing records:
+- JsonBillingStore: the original single JSON array file
+- SqliteBillingStore: embedded SQLite (WAL mode) with indexes on timestamp,
+  item_type and session_id, so range and per-session queries don't load
+  every record
+
+GroupCommitWriter sits in front of either backend: records submitted by
+concurrent requests while a write is in progress are written together in
+the next one, so N sessions cost one file rewrite or SQLite transaction
+instead of N.
+
+Timestamps are stored as ISO-8601 strings as produced by
+datetime.isoformat(), which sort lexicographically in time order.
+
+Usage:
+    python billing_store.py migrate flexprice_billing.json flexprice_billing.db
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class JsonBillingStore:
+    """Billing records kept as one JSON array; every append rewrites the file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def append_many(self, records: List[Dict]) -> int:
+        """
+        Append records, rewriting the file once for the whole batch.
+
+        Returns:
+            Number of records appended (always len(records))
+        """
+        billing_data = self.load_all()
+        billing_data.extend(records)
+        # Replace atomically so concurrent readers never see a half-written file
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(billing_data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        return len(records)
+
+    def load_all(self) -> List[Dict]:
+        """Load every record, oldest first."""
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def records_between(self, start: str, end: str, item_type: Optional[str] = None) -> List[Dict]:
+        """Records with start <= timestamp < end (full scan)."""
+        return [
+            record for record in self.load_all()
+            if start <= record.get('timestamp', '') < end
+            and (item_type is None or record.get('item_type') == item_type)
+        ]
+
+    def session_records(self, session_id: str) -> List[Dict]:
+        """Records belonging to one billing session (full scan)."""
+        return [record for record in self.load_all() if record.get('session_id') == session_id]
+
+    def revenue_between(self, start: str, end: str) -> float:
+        """Sum of amounts with start <= timestamp < end."""
+        return sum(record.get('amount', 0) for record in self.records_between(start, end))
+
+    def totals_by_item_type(self) -> Dict[str, Dict]:
+        """Count, amount and quantity per item_type (full scan)."""
+        totals: Dict[str, Dict] = {}
+        for record in self.load_all():
+            entry = totals.setdefault(record.get('item_type'), {'count': 0, 'amount': 0, 'quantity': 0})
+            entry['count'] += 1
+            entry['amount'] += record.get('amount', 0)
+            entry['quantity'] += record.get('quantity', 0)
+        return totals
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBillingStore:
+    """Billing records in SQLite with indexed time-range and per-session lookups."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS billing_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT,
+            session_id TEXT,
+            item_type TEXT,
+            amount REAL NOT NULL DEFAULT 0,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            timestamp TEXT NOT NULL,
+            status TEXT,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_billing_timestamp ON billing_records (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_billing_item_type ON billing_records (item_type, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_billing_session ON billing_records (session_id);
+        CREATE INDEX IF NOT EXISTS idx_billing_transaction ON billing_records (transaction_id);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # The app calls in from the event loop thread and from executor threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _row(record: Dict) -> tuple:
+        return (
+            record.get('transaction_id'),
+            record.get('session_id'),
+            record.get('item_type'),
+            record.get('amount', 0) or 0,
+            record.get('quantity', 0) or 0,
+            record.get('timestamp', ''),
+            record.get('status'),
+            json.dumps(record, separators=(',', ':')),
+        )
+
+    def append_many(self, records: List[Dict]) -> int:
+        """
+        Insert records in a single transaction; every record becomes a row.
+
+        Returns:
+            Number of rows inserted (always len(records))
+
+        Raises:
+            sqlite3.IntegrityError: On a conflicting row (only databases created with the
+                former UNIQUE transaction_id constraint have one); nothing of the batch is written
+        """
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT INTO billing_records '
+                '(transaction_id, session_id, item_type, amount, quantity, timestamp, status, record) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [self._row(record) for record in records],
+            )
+            return self._conn.total_changes - before
+
+    def record_counts(self) -> Counter:
+        """How many times each serialized record is stored (for re-runnable migrations)."""
+        with self._lock:
+            rows = self._conn.execute('SELECT record FROM billing_records').fetchall()
+        return Counter(row[0] for row in rows)
+
+    def _select(self, where: str, params: tuple) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT record FROM billing_records {where} ORDER BY id', params
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def load_all(self) -> List[Dict]:
+        """Load every record, oldest first."""
+        return self._select('', ())
+
+    def records_between(self, start: str, end: str, item_type: Optional[str] = None) -> List[Dict]:
+        """Records with start <= timestamp < end, optionally of one item_type."""
+        if item_type is None:
+            return self._select('WHERE timestamp >= ? AND timestamp < ?', (start, end))
+        return self._select('WHERE item_type = ? AND timestamp >= ? AND timestamp < ?', (item_type, start, end))
+
+    def session_records(self, session_id: str) -> List[Dict]:
+        """Records belonging to one billing session."""
+        return self._select('WHERE session_id = ?', (session_id,))
+
+    def revenue_between(self, start: str, end: str) -> float:
+        """Sum of amounts with start <= timestamp < end, computed by SQLite."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT COALESCE(SUM(amount), 0) FROM billing_records WHERE timestamp >= ? AND timestamp < ?',
+                (start, end),
+            ).fetchone()
+        return row[0]
+
+    def totals_by_item_type(self) -> Dict[str, Dict]:
+        """Count, amount and quantity per item_type, aggregated in SQL."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT item_type, COUNT(*), COALESCE(SUM(amount), 0), COALESCE(SUM(quantity), 0) '
+                'FROM billing_records GROUP BY item_type'
+            ).fetchall()
+        return {item_type: {'count': count, 'amount': amount, 'quantity': quantity}
+                for item_type, count, amount, quantity in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class GroupCommitWriter:
+    """
+    Group commit in front of a billing store.
+
+    append() queues a record and resolves once the batch containing it is
+    written. One flush runs at a time, in a worker thread; records arriving
+    meanwhile form the next batch. An idle writer adds no delay unless
+    max_delay is set to wait for more records first.
+    """
+
+    def __init__(self, store, max_batch: int = 500, max_delay: float = 0.0,
+                 on_commit: Optional[Callable[[List[Dict], int], None]] = None):
+        """
+        Args:
+            store: JsonBillingStore or SqliteBillingStore
+            max_batch: Maximum records per write
+            max_delay: Seconds an idle writer waits for more records before writing
+            on_commit: Called with each written batch and the number of its records the
+                store reports as inserted, while the store lock is held
+        """
+        self.store = store
+        self.on_commit = on_commit
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Dict, asyncio.Future]] = []
+        self._in_flight = 0
+        self._task: Optional[asyncio.Task] = None
+        # Serializes store writes between the flush thread and direct write() calls;
+        # hold it to read the store consistently with on_commit
+        self.lock = threading.Lock()
+        self._metrics = {'commits': 0, 'records': 0, 'max_batch_size': 0, 'errors': 0}
+
+    def write(self, records: List[Dict]) -> None:
+        """Write records now, bypassing the queue (for synchronous callers)."""
+        with self.lock:
+            inserted = self.store.append_many(records)
+            if inserted != len(records):
+                logger.error(f"[Billing Store] Only {inserted} of {len(records)} billing records were stored")
+            if self.on_commit is not None:
+                self.on_commit(records, inserted)
+        self._count_commit(inserted)
+
+    async def append(self, record: Dict) -> None:
+        """
+        Queue a record and wait until it is written.
+
+        Raises:
+            Exception: Whatever the store raised for the batch
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((record, future))
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._flush_pending())
+        await future
+
+    async def _flush_pending(self) -> None:
+        if self.max_delay > 0:
+            await asyncio.sleep(self.max_delay)
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            records = [record for record, _ in batch]
+            self._in_flight = len(batch)
+            try:
+                await asyncio.to_thread(self.write, records)
+            except Exception as e:
+                self._metrics['errors'] += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                self._in_flight = 0
+
+    def _count_commit(self, size: int) -> None:
+        self._metrics['commits'] += 1
+        self._metrics['records'] += size
+        self._metrics['max_batch_size'] = max(self._metrics['max_batch_size'], size)
+
+    async def flush(self) -> None:
+        """Wait until every queued record has been written."""
+        while self._task is not None and not self._task.done() and self._task.get_loop() is asyncio.get_running_loop():
+            await asyncio.shield(self._task)
+
+    def queue_depth(self) -> int:
+        """Records accepted but not yet written."""
+        return len(self._pending) + self._in_flight
+
+    def get_metrics(self) -> Dict:
+        commits = self._metrics['commits']
+        return dict(
+            self._metrics,
+            mean_batch_size=self._metrics['records'] / commits if commits else 0.0,
+            queue_depth=self.queue_depth(),
+            max_batch=self.max_batch,
+            max_delay_s=self.max_delay,
+        )
+
+
+def create_store(backend: str, json_path: str, db_path: str):
+    """Build the billing store for a backend name ('json' or 'sqlite')."""
+    if backend == 'sqlite':
+        return SqliteBillingStore(db_path)
+    if backend == 'json':
+        return JsonBillingStore(json_path)
+    raise ValueError(f"Unknown billing storage backend: {backend}")
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str, batch_size: int = 5000) -> int:
+    """
+    One-shot migration of a JSON billing file into SQLite.
+
+    Safe to re-run: a record is skipped only if an identical record is already
+    stored (counted, so identical records in the file each need a stored copy).
+    Distinct records sharing a transaction_id are all migrated.
+
+    Returns:
+        Number of records inserted
+    """
+    records = JsonBillingStore(json_path).load_all()
+    store = SqliteBillingStore(db_path)
+    inserted = 0
+    try:
+        stored = store.record_counts()
+        missing = []
+        for record in records:
+            key = json.dumps(record, separators=(',', ':'))
+            if stored[key] > 0:
+                stored[key] -= 1
+            else:
+                missing.append(record)
+        for offset in range(0, len(missing), batch_size):
+            inserted += store.append_many(missing[offset:offset + batch_size])
+    finally:
+        store.close()
+    logger.info(f"[Billing Store] Migrated {inserted} of {len(records)} records from {json_path} to {db_path} "
+                f"({len(records) - len(missing)} already present)")
+    return inserted
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'migrate':
+        print('Usage: python billing_store.py migrate <billing.json> <billing.db>')
+        sys.exit(1)
+    if not os.path.exists(sys.argv[2]):
+        print(f"No such file: {sys.argv[2]}")
+        sys.exit(1)
+    count = migrate_json_to_sqlite(sys.argv[2], sys.argv[3])
+    print(f"Migrated {count} records into {sys.argv[3]}")
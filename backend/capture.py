@@ -0,0 +1,245 @@
+"""
+Request Capture
+
+Opt-in recorder for /api/analyze traffic, so optimizations can be validated
+offline against production-shaped load with replay.py.
+
+Enabled by setting CAPTURE_DIR. Each analyzed request appends one compact
+JSON line to capture.jsonl:
+
+    {"t": <unix time>, "v": <snapshot version>, "s": <snapshot digest>,
+     "p": [[symbol, quantity], ...], "o": <digest of the analysis result>}
+
+The market data a request was evaluated against is written once per snapshot
+to snapshot-<digest>.json; the digest (not the version, which restarts at 1
+with every process) identifies it. The log rotates by size like
+logging.handlers.RotatingFileHandler: capture.jsonl.1 is the newest rotated
+file and at most CAPTURE_MAX_FILES rotated files are kept. After a rotation,
+snapshot files no retained log refers to are deleted.
+
+Only sampling happens on the request path: digesting and writing snapshots
+and log lines run on one background thread, in request order. At most
+CAPTURE_MAX_QUEUE requests wait for that thread; further ones are dropped
+and counted rather than queued without bound when the disk falls behind.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from snapshot import MarketSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------
+# Configuration (overridable through environment variables)
+CAPTURE_DIR = os.getenv('CAPTURE_DIR')  # unset disables capture
+CAPTURE_SAMPLE_RATE = float(os.getenv('CAPTURE_SAMPLE_RATE', '1.0'))
+CAPTURE_MAX_BYTES = int(os.getenv('CAPTURE_MAX_BYTES', str(50 * 1024 * 1024)))
+CAPTURE_MAX_FILES = int(os.getenv('CAPTURE_MAX_FILES', '5'))
+CAPTURE_MAX_QUEUE = int(os.getenv('CAPTURE_MAX_QUEUE', '1000'))
+
+LOG_NAME = 'capture.jsonl'
+SNAPSHOT_REFERENCE = re.compile(r'"s":"([0-9a-f]+)"')
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def digest(value) -> str:
+    """Short, stable digest of a JSON-serializable value."""
+    return hashlib.sha1(_dumps(value).encode()).hexdigest()[:16]
+
+
+def snapshot_path(directory: str, snapshot_digest: str) -> str:
+    return os.path.join(directory, f'snapshot-{snapshot_digest}.json')
+
+
+def log_files(directory: str) -> List[str]:
+    """Capture logs in the order they were written (oldest rotated file first)."""
+    base = os.path.join(directory, LOG_NAME)
+    rotated = []
+    index = 1
+    while os.path.exists(f'{base}.{index}'):
+        rotated.append(f'{base}.{index}')
+        index += 1
+    files = list(reversed(rotated))
+    if os.path.exists(base):
+        files.append(base)
+    return files
+
+
+class RequestRecorder:
+    """Appends analyzed requests to a size-rotated log; no-op when directory is None."""
+
+    def __init__(self, directory: Optional[str] = CAPTURE_DIR, sample_rate: float = CAPTURE_SAMPLE_RATE,
+                 max_bytes: int = CAPTURE_MAX_BYTES, max_files: int = CAPTURE_MAX_FILES,
+                 max_queue: int = CAPTURE_MAX_QUEUE):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_queue = max(1, max_queue)
+        self._file = None
+        self._size = 0
+        self._snapshot: Optional[MarketSnapshot] = None
+        self._snapshot_digest: Optional[str] = None
+        # Snapshot digests referenced by each retained log, current log first
+        self._references: Optional[List[Set[str]]] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        # Requests submitted to the capture thread and not yet written
+        self._queued = 0
+        self._queue_lock = threading.Lock()
+        self._metrics = {'captured': 0, 'skipped': 0, 'dropped': 0, 'rotations': 0, 'snapshots_written': 0,
+                         'snapshots_pruned': 0, 'errors': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, LOG_NAME)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        if self._references is None:
+            # Include logs left by an earlier process; the open above created the current one
+            self._references = [self._read_references(log) for log in reversed(log_files(self.directory))]
+
+    @staticmethod
+    def _read_references(path: str) -> Set[str]:
+        with open(path, 'r', encoding='utf-8') as f:
+            return set(SNAPSHOT_REFERENCE.findall(f.read()))
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        base = os.path.join(self.directory, LOG_NAME)
+        oldest = f'{base}.{self.max_files}'
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for index in range(self.max_files - 1, 0, -1):
+            if os.path.exists(f'{base}.{index}'):
+                os.replace(f'{base}.{index}', f'{base}.{index + 1}')
+        if self.max_files > 0:
+            os.replace(base, f'{base}.1')
+        else:
+            os.remove(base)
+        self._references.insert(0, set())
+        del self._references[self.max_files + 1:]
+        self._metrics['rotations'] += 1
+        self._prune_snapshots()
+        self._open()
+
+    def _prune_snapshots(self) -> None:
+        """Delete snapshot files that no retained log refers to."""
+        keep = set().union(*self._references)
+        if self._snapshot_digest is not None:
+            keep.add(self._snapshot_digest)
+        for path in glob.glob(os.path.join(self.directory, 'snapshot-*.json')):
+            snapshot_digest = os.path.basename(path)[len('snapshot-'):-len('.json')]
+            if snapshot_digest not in keep:
+                try:
+                    os.remove(path)
+                    self._metrics['snapshots_pruned'] += 1
+                except OSError:
+                    pass
+
+    def _snapshot_digest_for(self, snapshot: MarketSnapshot) -> str:
+        """Digest of a snapshot's records, writing the snapshot file the first time it is seen."""
+        if snapshot is not self._snapshot:
+            records = snapshot.store.to_records()
+            snapshot_digest = digest(records)
+            path = snapshot_path(self.directory, snapshot_digest)
+            if not os.path.exists(path):
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(_dumps({'version': snapshot.version, 'records': records}))
+                os.replace(tmp_path, path)
+                self._metrics['snapshots_written'] += 1
+            self._snapshot, self._snapshot_digest = snapshot, snapshot_digest
+        return self._snapshot_digest
+
+    def record(self, portfolio: List[Dict], snapshot: MarketSnapshot, result: Dict) -> None:
+        """
+        Queue one analyzed request for the capture thread. Errors are logged, never raised;
+        the request is dropped when max_queue requests are already waiting.
+
+        Args:
+            portfolio: Holdings as received
+            snapshot: Snapshot the analysis ran against
+            result: Output of advisor.analyze_portfolio
+        """
+        if self.directory is None:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self._metrics['skipped'] += 1
+            return
+        with self._queue_lock:
+            full = self._queued >= self.max_queue
+            if not full:
+                self._queued += 1
+        if full:
+            self._metrics['dropped'] += 1
+            return
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='capture')
+        self._writer.submit(self._write_queued, round(time.time(), 3), portfolio, snapshot, result)
+
+    def _write_queued(self, timestamp: float, portfolio: List[Dict], snapshot: MarketSnapshot, result: Dict) -> None:
+        try:
+            self._write(timestamp, portfolio, snapshot, result)
+        finally:
+            with self._queue_lock:
+                self._queued -= 1
+
+    def _write(self, timestamp: float, portfolio: List[Dict], snapshot: MarketSnapshot, result: Dict) -> None:
+        try:
+            if self._file is None:
+                self._open()
+            snapshot_digest = self._snapshot_digest_for(snapshot)
+            line = _dumps({
+                't': timestamp,
+                'v': snapshot.version,
+                's': snapshot_digest,
+                'p': [[holding['symbol'], holding['quantity']] for holding in portfolio],
+                'o': digest(result),
+            }) + '\n'
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line)
+            self._references[0].add(snapshot_digest)
+            self._metrics['captured'] += 1
+            if self._size >= self.max_bytes:
+                self._rotate()
+        except (OSError, KeyError, TypeError) as e:
+            self._metrics['errors'] += 1
+            logger.error(f"Request capture failed: {e}")
+
+    def close(self) -> None:
+        """Write out queued requests and close the log."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_metrics(self) -> Dict:
+        return dict(self._metrics, enabled=self.enabled, directory=self.directory,
+                    sample_rate=self.sample_rate, max_queue=self.max_queue,
+                    queue_depth=self._queued)
+
+
+# Global request recorder
+request_recorder = RequestRecorder()
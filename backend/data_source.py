@@ -0,0 +1,254 @@
+"""
+Market Data Sources
+
+Pluggable origins of the market universe, all feeding the one snapshot
+pipeline in market_updater. A refresh runs two source stages and then
+publishes:
+
+    load   raw input from the source (file bytes, newly appended lines, ...)
+    parse  raw input -> MarketStore, sharing unchanged chunks with the previous store
+
+A source returns the previous store itself from parse() when its input has
+not changed, so safety-net refreshes of an idle source skip the parse and
+publish no new snapshot.
+
+Sources:
+
+- CsvFileSource: a CSV file replaced as a whole (the default)
+- TailingCsvSource: an append-only CSV stream; every appended row is an
+  upsert of its symbol, and only new complete lines are read per refresh
+- MemorySource: records held in memory, for tests and embedding
+
+Selected with MARKET_SOURCE (csv or tail) and MARKET_DATA_FILE.
+"""
+
+import csv
+import hashlib
+import io
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from market_store import MarketStore
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------
+# Configuration (overridable through environment variables)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MARKET_DATA_FILE = os.getenv('MARKET_DATA_FILE', os.path.join(BASE_DIR, 'data', 'stocks.csv'))
+MARKET_SOURCE = os.getenv('MARKET_SOURCE', 'csv')
+
+NUMERIC_COLUMNS = ['price', 'change_1d_pct', 'change_7d_pct', 'volatility', 'market_cap_cr']
+
+
+def coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the known numeric columns to numbers; unparseable values become NaN."""
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def parse_csv(raw: bytes) -> pd.DataFrame:
+    """Parse CSV bytes (with header) into a frame with numeric columns coerced."""
+    return coerce_numeric(pd.read_csv(io.BytesIO(raw)))
+
+
+class DataSource(ABC):
+    """Base class for market data sources; subclasses implement load() and parse()."""
+
+    kind = 'base'
+    # File the refresh scheduler watches for changes; None means refreshes are driven externally
+    watch_path: Optional[str] = None
+    # Whether in-place appends (not only completed writes) signal new data
+    appends = False
+
+    @abstractmethod
+    def load(self):
+        """Read raw input; the 'load' stage. Raises on failure."""
+
+    @abstractmethod
+    def parse(self, raw, previous: Optional[MarketStore]) -> MarketStore:
+        """Turn raw input into a store; the 'parse' stage. Returns previous if nothing changed."""
+
+    def is_available(self) -> bool:
+        return True
+
+    def describe(self) -> str:
+        return self.kind
+
+
+class CsvFileSource(DataSource):
+    """A CSV file that writers replace as a whole."""
+
+    kind = 'csv'
+
+    def __init__(self, path: str = MARKET_DATA_FILE):
+        self.path = os.path.abspath(path)
+        self.watch_path = self.path
+        self._parsed: Tuple[Optional[str], Optional[MarketStore]] = (None, None)
+
+    def load(self) -> bytes:
+        # One read of the whole file, so parsing never sees a half-replaced file
+        try:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Market data CSV not found at {self.path}")
+
+    def parse(self, raw: bytes, previous: Optional[MarketStore]) -> MarketStore:
+        digest = hashlib.sha1(raw).hexdigest()
+        last_digest, last_store = self._parsed
+        if digest == last_digest and last_store is previous:
+            return previous
+        store = MarketStore.from_dataframe(parse_csv(raw), previous)
+        self._parsed = (digest, store)
+        return store
+
+    def is_available(self) -> bool:
+        return os.path.exists(self.path)
+
+    def describe(self) -> str:
+        return f'csv:{self.path}'
+
+
+class TailingCsvSource(DataSource):
+    """
+    Append-only CSV stream: a header line, then rows that upsert their symbol.
+
+    Each load reads from the last consumed offset up to the last complete
+    line. A truncated or replaced file (smaller size or new inode) is read
+    again from the start. The offset only moves once parse() has consumed
+    the lines; a malformed line is skipped and counted in bad_lines rather
+    than failing the rest of its batch.
+    """
+
+    kind = 'tail'
+    appends = True
+
+    def __init__(self, path: str = MARKET_DATA_FILE, key: str = 'symbol'):
+        self.path = os.path.abspath(path)
+        self.watch_path = self.path
+        self.key = key
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._header: Optional[bytes] = None
+        self._rows: Dict[object, Dict] = {}
+        self.lines_read = 0
+        self.bad_lines = 0
+        self.resets = 0
+
+    def load(self) -> Tuple[bool, Optional[bytes], bytes, int, int]:
+        """
+        Read new complete lines without consuming them.
+
+        Returns:
+            (reset, header, new complete lines, end offset, inode): reset is True
+            when the file is read from the start
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Market data stream not found at {self.path}")
+        reset = stat.st_ino != self._inode or stat.st_size < self._offset
+        offset = 0 if reset else self._offset
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        end = offset + len(complete)
+        header = None if reset else self._header
+        if header is None and complete:
+            header_end = complete.index(b'\n') + 1
+            header, complete = complete[:header_end], complete[header_end:]
+        return reset, header, complete, end, stat.st_ino
+
+    def _parse_lines(self, header: bytes, lines: bytes) -> Tuple[List[Dict], int]:
+        # pandas silently reshapes rows with extra fields, so check widths first
+        width = len(next(csv.reader([header.decode('utf-8', 'replace')])))
+        good, bad = [], 0
+        for line in lines.splitlines(keepends=True):
+            if not line.strip():
+                continue
+            fields = next(csv.reader([line.decode('utf-8', 'replace')]), [])
+            if len(fields) == width:
+                good.append(line)
+            else:
+                bad += 1
+                logger.warning(f"Skipping malformed line in {self.path}: {line[:200]!r}")
+        return (parse_csv(header + b''.join(good)).to_dict('records') if good else []), bad
+
+    def parse(self, raw: Tuple[bool, Optional[bytes], bytes, int, int],
+              previous: Optional[MarketStore]) -> MarketStore:
+        reset, header, lines, end, inode = raw
+        rows = {} if reset else self._rows
+        if not reset and not lines and previous is not None:
+            self._offset = end
+            return previous
+        records, bad = self._parse_lines(header, lines) if lines and header is not None else ([], 0)
+        for record in records:
+            rows[record.get(self.key)] = record
+        store = MarketStore.from_records(list(rows.values()), previous)
+        # Consume the lines only now that they are parsed
+        if reset:
+            self.resets += 1 if self._offset else 0
+        self._rows, self._header, self._inode, self._offset = rows, header, inode, end
+        self.lines_read += len(records)
+        self.bad_lines += bad
+        return store
+
+    def is_available(self) -> bool:
+        return os.path.exists(self.path)
+
+    def describe(self) -> str:
+        return f'tail:{self.path}'
+
+
+class MemorySource(DataSource):
+    """Records held in memory; set_records() replaces them before the next refresh."""
+
+    kind = 'memory'
+
+    def __init__(self, records: Optional[List[Dict]] = None):
+        self._records = list(records or [])
+        self._generation = 0
+        self._parsed: Tuple[int, Optional[MarketStore]] = (-1, None)
+
+    def set_records(self, records: List[Dict]) -> None:
+        self._records = list(records)
+        self._generation += 1
+
+    def load(self) -> Tuple[int, List[Dict]]:
+        return self._generation, self._records
+
+    def parse(self, raw: Tuple[int, List[Dict]], previous: Optional[MarketStore]) -> MarketStore:
+        generation, records = raw
+        last_generation, last_store = self._parsed
+        if generation == last_generation and last_store is previous:
+            return previous
+        store = MarketStore.from_records(records, previous)
+        self._parsed = (generation, store)
+        return store
+
+    def describe(self) -> str:
+        return f'memory:{len(self._records)} records'
+
+
+SOURCES = {'csv': CsvFileSource, 'tail': TailingCsvSource}
+
+
+def create_source(kind: str = MARKET_SOURCE, path: str = MARKET_DATA_FILE) -> DataSource:
+    """
+    Build the configured file-backed source.
+
+    Raises:
+        ValueError: For an unknown source kind
+    """
+    if kind not in SOURCES:
+        raise ValueError(f"MARKET_SOURCE must be one of {list(SOURCES)}")
+    return SOURCES[kind](path)
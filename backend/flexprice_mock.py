@@ -8,15 +8,45 @@ for transaction processing and usage tracking.
 Flexprice Documentation: https://flexprice.dev/
 """
 
-import json
 import logging
+import os
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import uuid
 
+from billing_store import GroupCommitWriter, create_store
+
 logger = logging.getLogger(__name__)
 
 
+# ------------------------------
+# Configuration (overridable through environment variables)
+FLEXPRICE_COMMIT_MAX_BATCH = int(os.getenv('FLEXPRICE_COMMIT_MAX_BATCH', '500'))
+FLEXPRICE_COMMIT_DELAY = float(os.getenv('FLEXPRICE_COMMIT_DELAY_MS', '0')) / 1000
+
+# One record per analysis; older files also hold separate portfolio/advice records
+SESSION_ITEM_TYPE = 'analysis_session'
+
+_pricing_config: Optional[Dict] = None
+
+
+def get_pricing_config() -> Dict:
+    """
+    Pricing configuration (would come from the Flexprice dashboard), loaded once per process.
+
+    Prices can be overridden with FLEXPRICE_PORTFOLIO_PRICE and FLEXPRICE_ADVICE_PRICE.
+    """
+    global _pricing_config
+    if _pricing_config is None:
+        _pricing_config = {
+            'portfolio_analysis_price': float(os.getenv('FLEXPRICE_PORTFOLIO_PRICE', '5.0')),  # ₹5 per portfolio analysis
+            'advice_item_price': float(os.getenv('FLEXPRICE_ADVICE_PRICE', '2.0')),            # ₹2 per advice item
+            'currency': 'INR',
+            'billing_model': 'pay_per_use'
+        }
+    return _pricing_config
+
+
 class FlexpriceMock:
     """
     Mock Flexprice billing client that simulates usage-based pricing.
@@ -28,155 +58,113 @@ class FlexpriceMock:
     - Provide usage analytics and reporting
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, storage: Optional[str] = None):
         self.api_key = api_key or "mock_flexprice_key_12345"
         self.billing_file = "flexprice_billing.json"
+        self.billing_db = os.getenv('FLEXPRICE_DB', 'flexprice_billing.db')
+        self.storage = storage or os.getenv('FLEXPRICE_STORAGE', 'json')
+        self.store = create_store(self.storage, self.billing_file, self.billing_db)
+        self.writer = GroupCommitWriter(self.store, FLEXPRICE_COMMIT_MAX_BATCH, FLEXPRICE_COMMIT_DELAY,
+                                        on_commit=self._on_commit)
         self.connected = True
-        
-        # Pricing configuration (would come from Flexprice dashboard)
-        self.pricing_config = {
-            'portfolio_analysis_price': 5.0,  # ₹5 per portfolio analysis
-            'advice_item_price': 2.0,         # ₹2 per advice item
-            'currency': 'INR',
-            'billing_model': 'pay_per_use'
-        }
+        self._totals: Optional[Dict] = None
+        self.pricing_config = get_pricing_config()
         
         logger.info(f"[Flexprice Mock] Initialized with API key: {self.api_key[:10]}...")
     
-    def charge_for_portfolio(self) -> Dict:
+    def create_session_event(self, advice_count: int, session_id: Optional[str] = None) -> Dict:
         """
-        Process charge for portfolio analysis.
+        Price one portfolio analysis as a single compound billing event.
         
-        In real Flexprice:
-        - Creates a billing event
-        - Processes payment if needed
-        - Updates customer usage quotas
-        - Handles billing cycles
+        In real Flexprice this is one usage event carrying both meters
+        (portfolio_analysis: 1, advice_generation: advice_count).
         
+        Args:
+            advice_count: Number of advice items generated
+            session_id: Billing session id; generated when omitted
+            
         Returns:
-            Billing record with transaction details
+            Billing record with the total amount and its breakdown
         """
-        try:
-            transaction_id = str(uuid.uuid4())[:8]
-            amount = self.pricing_config['portfolio_analysis_price']
-            
-            billing_record = {
-                'transaction_id': f"flx_portfolio_{transaction_id}",
-                'item_type': 'portfolio_analysis',
-                'amount': amount,
-                'currency': self.pricing_config['currency'],
-                'timestamp': datetime.now().isoformat(),
-                'status': 'completed',
-                'billing_model': self.pricing_config['billing_model'],
-                'metadata': {
-                    'feature': 'portfolio_analysis',
-                    'api_version': 'v1'
+        pricing = self.pricing_config
+        base_amount = pricing['portfolio_analysis_price']
+        unit_price = pricing['advice_item_price']
+        advice_amount = advice_count * unit_price
+        # Full 128-bit ids: truncated ones collide once there are thousands of records
+        transaction_id = uuid.uuid4().hex
+        return {
+            'transaction_id': f"flx_analysis_{transaction_id}",
+            'item_type': SESSION_ITEM_TYPE,
+            'session_id': session_id or f"flx_session_{transaction_id}",
+            'quantity': advice_count,
+            'amount': base_amount + advice_amount,
+            'currency': pricing['currency'],
+            'timestamp': datetime.now().isoformat(),
+            'status': 'completed',
+            'billing_model': pricing['billing_model'],
+            'breakdown': {
+                'portfolio_analysis': {
+                    'amount': base_amount,
+                    'description': 'Portfolio analysis base fee'
+                },
+                'advice_generation': {
+                    'quantity': advice_count,
+                    'unit_price': unit_price,
+                    'amount': advice_amount,
+                    'description': f'Generated {advice_count} investment recommendations'
                 }
+            },
+            'metadata': {
+                'api_version': 'v1',
+                'integration_version': 'mock_v1.0'
             }
-            
-            logger.info(f"[Flexprice Mock] Portfolio charge: ₹{amount} (Transaction: {transaction_id})")
-            
-            # Save to mock billing storage
-            self._save_billing_record(billing_record)
-            
-            return billing_record
-            
-        except Exception as e:
-            logger.error(f"[Flexprice Mock] Portfolio billing error: {e}")
-            return self._create_error_record('portfolio_analysis', str(e))
+        }
     
-    def charge_for_advice(self, advice_count: int) -> Dict:
+    async def record_analysis(self, advice_count: int) -> Dict:
         """
-        Process charge for advice items generated.
+        Bill a portfolio analysis session through the group-commit queue.
+        
+        Concurrent sessions are written to storage together; this returns once
+        the session's event is stored.
         
         Args:
-            advice_count: Number of advice items to bill for
+            advice_count: Number of advice items generated
             
         Returns:
-            Billing record with transaction details
+            The session's billing event
         """
+        event = self.create_session_event(advice_count)
         try:
-            transaction_id = str(uuid.uuid4())[:8]
-            unit_price = self.pricing_config['advice_item_price']
-            total_amount = advice_count * unit_price
-            
-            billing_record = {
-                'transaction_id': f"flx_advice_{transaction_id}",
-                'item_type': 'advice_generation',
-                'quantity': advice_count,
-                'unit_price': unit_price,
-                'amount': total_amount,
-                'currency': self.pricing_config['currency'],
-                'timestamp': datetime.now().isoformat(),
-                'status': 'completed',
-                'billing_model': self.pricing_config['billing_model'],
-                'metadata': {
-                    'feature': 'advice_generation',
-                    'advice_count': advice_count,
-                    'api_version': 'v1'
-                }
-            }
-            
-            logger.info(f"[Flexprice Mock] Advice charge: {advice_count} items × ₹{unit_price} = ₹{total_amount} (Transaction: {transaction_id})")
-            
-            # Save to mock billing storage
-            self._save_billing_record(billing_record)
-            
-            return billing_record
-            
+            await self.writer.append(event)
         except Exception as e:
-            logger.error(f"[Flexprice Mock] Advice billing error: {e}")
-            return self._create_error_record('advice_generation', str(e))
+            logger.error(f"[Flexprice Mock] Failed to save billing records: {e}")
+            event['status'] = 'failed'
+            return event
+        logger.debug(f"[Flexprice Mock] Session billing: ₹{event['amount']} ({event['session_id']})")
+        return event
     
     def process_full_analysis_billing(self, advice_count: int) -> Dict:
         """
-        Process complete billing for a portfolio analysis session.
+        Bill a portfolio analysis session, writing its event immediately.
         
-        This combines portfolio analysis fee + advice generation fees
-        into a single billing summary.
+        Synchronous counterpart of record_analysis for callers outside the event loop.
         
         Args:
             advice_count: Number of advice items generated
             
         Returns:
-            Complete billing summary with breakdown
+            The session's billing event
         """
-        portfolio_record = self.charge_for_portfolio()
-        advice_record = self.charge_for_advice(advice_count)
-        
-        # Create summary billing record
-        total_amount = portfolio_record['amount'] + advice_record['amount']
-        
-        billing_summary = {
-            'session_id': f"flx_session_{str(uuid.uuid4())[:8]}",
-            'total_amount': total_amount,
-            'currency': self.pricing_config['currency'],
-            'timestamp': datetime.now().isoformat(),
-            'status': 'completed',
-            'breakdown': {
-                'portfolio_analysis': {
-                    'transaction_id': portfolio_record['transaction_id'],
-                    'amount': portfolio_record['amount'],
-                    'description': 'Portfolio analysis base fee'
-                },
-                'advice_generation': {
-                    'transaction_id': advice_record['transaction_id'],
-                    'quantity': advice_count,
-                    'unit_price': advice_record['unit_price'],
-                    'amount': advice_record['amount'],
-                    'description': f'Generated {advice_count} investment recommendations'
-                }
-            },
-            'flexprice_metadata': {
-                'billing_model': self.pricing_config['billing_model'],
-                'api_key_prefix': self.api_key[:10],
-                'integration_version': 'mock_v1.0'
-            }
-        }
-        
-        logger.info(f"[Flexprice Mock] Complete session billing: ₹{total_amount}")
-        
-        return billing_summary
+        event = self.create_session_event(advice_count)
+        if not self._save_billing_records([event]):
+            event['status'] = 'failed'
+            return event
+        logger.info(f"[Flexprice Mock] Complete session billing: ₹{event['amount']}")
+        return event
+    
+    async def flush(self) -> None:
+        """Wait for queued billing events to be written (called on shutdown)."""
+        await self.writer.flush()
     
     def get_usage_summary(self) -> Dict:
         """
@@ -192,24 +180,12 @@ class FlexpriceMock:
             Usage summary with totals and trends
         """
         try:
-            billing_data = self._load_billing_data()
-            
-            total_sessions = 0
-            total_advice_items = 0
-            total_revenue = 0.0
-            
-            for record in billing_data:
-                if record.get('item_type') == 'portfolio_analysis':
-                    total_sessions += 1
-                    total_revenue += record.get('amount', 0)
-                elif record.get('item_type') == 'advice_generation':
-                    total_advice_items += record.get('quantity', 0)
-                    total_revenue += record.get('amount', 0)
+            totals = self._get_totals()
             
             return {
-                'total_sessions': total_sessions,
-                'total_advice_items': total_advice_items,
-                'total_revenue': total_revenue,
+                'total_sessions': totals['total_sessions'],
+                'total_advice_items': totals['total_advice_items'],
+                'total_revenue': totals['total_revenue'],
                 'currency': self.pricing_config['currency'],
                 'billing_model': self.pricing_config['billing_model'],
                 'last_updated': datetime.now().isoformat()
@@ -224,37 +200,82 @@ class FlexpriceMock:
                 'error': str(e)
             }
     
-    def _save_billing_record(self, record: Dict) -> None:
-        """Save billing record to mock storage."""
+    def _get_totals(self) -> Dict:
+        """Lifetime totals, computed from storage once and then maintained incrementally."""
+        if self._totals is None:
+            # Under the writer lock, so a batch is either in the scan or applied by _on_commit, never both
+            with self.writer.lock:
+                by_type = self.store.totals_by_item_type()
+                empty = {'count': 0, 'amount': 0, 'quantity': 0}
+                portfolio = by_type.get('portfolio_analysis', empty)
+                advice = by_type.get('advice_generation', empty)
+                session = by_type.get(SESSION_ITEM_TYPE, empty)
+                self._totals = {
+                    'total_sessions': portfolio['count'] + session['count'],
+                    'total_advice_items': advice['quantity'] + session['quantity'],
+                    'total_revenue': float(portfolio['amount'] + advice['amount'] + session['amount'])
+                }
+        return self._totals
+    
+    @staticmethod
+    def _apply_to_totals(totals: Dict, record: Dict) -> None:
+        """Add one billing record to running totals."""
+        if record.get('item_type') == SESSION_ITEM_TYPE:
+            totals['total_sessions'] += 1
+            totals['total_advice_items'] += record.get('quantity', 0)
+            totals['total_revenue'] += record.get('amount', 0)
+        elif record.get('item_type') == 'portfolio_analysis':
+            totals['total_sessions'] += 1
+            totals['total_revenue'] += record.get('amount', 0)
+        elif record.get('item_type') == 'advice_generation':
+            totals['total_advice_items'] += record.get('quantity', 0)
+            totals['total_revenue'] += record.get('amount', 0)
+    
+    def _on_commit(self, records: List[Dict], inserted: int) -> None:
+        """Keep running totals current for every batch the writer stores."""
+        if self._totals is None:
+            return
+        if inserted != len(records):
+            # Which records are missing is unknown; recount from storage on the next summary
+            self._totals = None
+            return
+        for record in records:
+            self._apply_to_totals(self._totals, record)
+    
+    def _save_billing_records(self, records: List[Dict]) -> bool:
+        """Save billing records to mock storage in one batch. Returns False if they were not stored."""
+        if not records:
+            return True
         try:
-            billing_data = self._load_billing_data()
-            billing_data.append(record)
-            
-            with open(self.billing_file, 'w') as f:
-                json.dump(billing_data, f, indent=2)
-                
+            self.writer.write(records)
         except Exception as e:
-            logger.error(f"[Flexprice Mock] Failed to save billing record: {e}")
+            logger.error(f"[Flexprice Mock] Failed to save billing records: {e}")
+            return False
+        return True
+    
+    def get_queue_depth(self) -> int:
+        """Number of billing records accepted but not yet written to storage."""
+        return self.writer.queue_depth()
+    
+    def get_metrics(self) -> Dict:
+        """Group-commit counters (commits, records, batch sizes) and queue depth."""
+        return self.writer.get_metrics()
     
     def _load_billing_data(self) -> list:
         """Load billing data from mock storage."""
-        try:
-            with open(self.billing_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        return self.store.load_all()
     
-    def _create_error_record(self, item_type: str, error_message: str) -> Dict:
-        """Create error billing record."""
-        return {
-            'transaction_id': f"flx_error_{str(uuid.uuid4())[:8]}",
-            'item_type': item_type,
-            'amount': 0.0,
-            'currency': self.pricing_config['currency'],
-            'timestamp': datetime.now().isoformat(),
-            'status': 'failed',
-            'error': error_message
-        }
+    def get_records_between(self, start: datetime, end: datetime, item_type: Optional[str] = None) -> List[Dict]:
+        """Billing records with start <= timestamp < end, optionally of one item type."""
+        return self.store.records_between(start.isoformat(), end.isoformat(), item_type)
+    
+    def get_session_records(self, session_id: str) -> List[Dict]:
+        """All billing records belonging to one analysis session."""
+        return self.store.session_records(session_id)
+    
+    def get_revenue_between(self, start: datetime, end: datetime) -> float:
+        """Revenue billed with start <= timestamp < end."""
+        return self.store.revenue_between(start.isoformat(), end.isoformat())
 
 
 # Global Flexprice instance
@@ -0,0 +1,343 @@
+"""
+Load Generator
+
+Drives the Stock Consultant API with concurrent requests and reports
+throughput, latency percentiles and event-loop lag.
+
+By default the FastAPI app is driven in-process through its ASGI interface,
+so the numbers reflect one worker with no network in between. Pass --url to
+drive a running uvicorn instead.
+
+Usage:
+    python loadgen.py --duration 20 --concurrency 32
+    python loadgen.py --url http://localhost:8000 --mix analyze:100
+    python loadgen.py --json results.json --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+
+# ------------------------------
+# Endpoint catalogue: name -> (method, path)
+ENDPOINTS = {
+    'market': ('GET', '/api/market'),
+    'analyze': ('POST', '/api/analyze'),
+    'usage': ('GET', '/api/usage'),
+    'health': ('GET', '/health'),
+}
+
+DEFAULT_MIX = 'analyze:70,market:10,usage:10,health:10'
+DEFAULT_PORTFOLIO_SIZES = '1:30,3:40,5:20,20:10'
+
+LAG_SAMPLE_INTERVAL = 0.01  # seconds between event-loop lag probes
+
+
+def parse_weighted(spec: str) -> List[Tuple[str, float]]:
+    """
+    Parse a weighted spec such as "analyze:70,market:30".
+
+    Args:
+        spec: Comma-separated name:weight pairs
+
+    Returns:
+        List of (name, weight) tuples
+    """
+    pairs = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition(':')
+        weight = float(weight) if weight else 1.0
+        if weight < 0:
+            raise ValueError(f"Negative weight in spec: {part}")
+        pairs.append((name.strip(), weight))
+    if not pairs or sum(w for _, w in pairs) <= 0:
+        raise ValueError(f"Spec has no positive weights: {spec}")
+    return pairs
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 for empty input)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_latencies(latencies: List[float], elapsed: float) -> Dict:
+    """Summarize a list of latencies (seconds) into a millisecond report."""
+    ordered = sorted(latencies)
+    return {
+        'count': len(ordered),
+        'throughput_rps': len(ordered) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+def git_revision() -> Optional[str]:
+    """Return the current git commit hash, if available."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+class LoadGenerator:
+    """Closed-loop load generator with a fixed number of concurrent clients."""
+
+    def __init__(self, client: httpx.AsyncClient, concurrency: int, duration: float,
+                 warmup: float, mix: List[Tuple[str, float]],
+                 portfolio_sizes: List[Tuple[str, float]], seed: int):
+        for name, _ in mix:
+            if name not in ENDPOINTS:
+                raise ValueError(f"Unknown endpoint '{name}', expected one of {sorted(ENDPOINTS)}")
+        self.client = client
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.mix_names = [name for name, _ in mix]
+        self.mix_weights = [weight for _, weight in mix]
+        self.size_values = [int(size) for size, _ in portfolio_sizes]
+        self.size_weights = [weight for _, weight in portfolio_sizes]
+        self.seed = seed
+        self.symbols: List[str] = []
+
+        self.latencies: Dict[str, List[float]] = {name: [] for name in self.mix_names}
+        self.errors: Dict[str, int] = {name: 0 for name in self.mix_names}
+        self.loop_lags: List[float] = []
+        self._measuring = False
+
+    async def load_universe(self) -> None:
+        """Fetch the symbol universe once so generated portfolios hit real stocks."""
+        response = await self.client.get('/api/market')
+        response.raise_for_status()
+        self.symbols = sorted(stock['symbol'] for stock in response.json())
+        if not self.symbols:
+            raise RuntimeError("Market universe is empty; nothing to analyze")
+
+    def make_portfolio(self, rng: random.Random) -> List[Dict]:
+        """Generate a portfolio whose size follows the configured distribution."""
+        size = rng.choices(self.size_values, weights=self.size_weights)[0]
+        return [
+            {'symbol': rng.choice(self.symbols), 'quantity': rng.randint(1, 100)}
+            for _ in range(size)
+        ]
+
+    async def _client_loop(self, worker_id: int, deadline: float) -> None:
+        rng = random.Random(self.seed * 1000003 + worker_id)
+        # Each simulated client gets its own address so per-client rate limits apply per worker
+        # (honored only when the server lists this host in ADMISSION_TRUSTED_PROXIES)
+        headers = {'X-Forwarded-For': f'10.77.{worker_id // 256}.{worker_id % 256}'}
+        while time.perf_counter() < deadline:
+            name = rng.choices(self.mix_names, weights=self.mix_weights)[0]
+            method, path = ENDPOINTS[name]
+            body = {'portfolio': self.make_portfolio(rng)} if method == 'POST' else None
+
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, json=body, headers=headers)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latency = time.perf_counter() - start
+
+            # In-process ASGI calls can complete without ever suspending;
+            # yield so timers and other clients get a turn.
+            await asyncio.sleep(0)
+
+            if self._measuring:
+                if ok:
+                    self.latencies[name].append(latency)
+                else:
+                    self.errors[name] += 1
+
+    async def _lag_monitor(self, deadline: float) -> None:
+        """Measure how late the event loop wakes up a sleeping task."""
+        while time.perf_counter() < deadline:
+            expected = time.perf_counter() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            if self._measuring:
+                self.loop_lags.append(max(0.0, time.perf_counter() - expected))
+
+    async def run(self) -> Dict:
+        """Run warmup plus the measured phase and return the report."""
+        await self.load_universe()
+
+        start = time.perf_counter()
+        deadline = start + self.warmup + self.duration
+        tasks = [asyncio.create_task(self._client_loop(i, deadline)) for i in range(self.concurrency)]
+        tasks.append(asyncio.create_task(self._lag_monitor(deadline)))
+
+        await asyncio.sleep(self.warmup)
+        self._measuring = True
+        measure_start = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - measure_start
+
+        all_latencies = [lat for values in self.latencies.values() for lat in values]
+        lags = sorted(self.loop_lags)
+        return {
+            'endpoints': {
+                name: dict(summarize_latencies(values, elapsed), errors=self.errors[name])
+                for name, values in self.latencies.items()
+            },
+            'overall': dict(summarize_latencies(all_latencies, elapsed), errors=sum(self.errors.values())),
+            'event_loop_lag_ms': {
+                'samples': len(lags),
+                'p50_ms': percentile(lags, 50) * 1000,
+                'p99_ms': percentile(lags, 99) * 1000,
+                'max_ms': (lags[-1] if lags else 0.0) * 1000,
+            },
+            'elapsed_s': elapsed,
+        }
+
+
+async def run_in_process(args: argparse.Namespace, make_generator) -> Dict:
+    """Drive the app through ASGI, running its lifespan so the market cache is warm."""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    import main
+    logging.getLogger().setLevel(args.log_level)
+
+    async with main.app.router.lifespan_context(main.app):
+        # Don't race the updater task's initial load
+        import market_updater
+        await market_updater.refresh_market_data()
+
+        # Every in-process request comes from the transport's loopback address; trust it like a
+        # proxy so the per-worker X-Forwarded-For addresses get their own rate-limit buckets.
+        # The trust list is module state, so it is restored for whatever runs in this process next.
+        import admission
+        trusted = list(admission._trusted_proxies)
+        admission._trusted_proxies.extend(admission.parse_networks('127.0.0.1'))
+        try:
+            transport = httpx.ASGITransport(app=main.app, client=('127.0.0.1', 123))
+            async with httpx.AsyncClient(transport=transport, base_url='http://loadgen') as client:
+                return await make_generator(client).run()
+        finally:
+            admission._trusted_proxies[:] = trusted
+
+
+async def run_remote(args: argparse.Namespace, make_generator) -> Dict:
+    """Drive a running server over HTTP."""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        return await make_generator(client).run()
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None) -> None:
+    """Print a human-readable table, with deltas against a baseline report if given."""
+    header = f"{'endpoint':<10} {'count':>8} {'err':>5} {'rps':>9} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8}"
+    print(header)
+    print('-' * len(header))
+    rows = list(report['results']['endpoints'].items()) + [('overall', report['results']['overall'])]
+    for name, stats in rows:
+        print(f"{name:<10} {stats['count']:>8} {stats['errors']:>5} {stats['throughput_rps']:>9.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}")
+
+    lag = report['results']['event_loop_lag_ms']
+    print(f"\nevent loop lag: p50 {lag['p50_ms']:.2f}ms  p99 {lag['p99_ms']:.2f}ms  max {lag['max_ms']:.2f}ms")
+
+    if baseline:
+        print(f"\nvs baseline ({baseline.get('git_commit') or 'unknown'}):")
+        base_endpoints = dict(baseline['results']['endpoints'], overall=baseline['results']['overall'])
+        for name, stats in rows:
+            base = base_endpoints.get(name)
+            if not base or not base['count']:
+                continue
+            for key in ('throughput_rps', 'p50_ms', 'p99_ms'):
+                if base[key]:
+                    change = (stats[key] - base[key]) / base[key] * 100
+                    print(f"  {name:<10} {key:<15} {base[key]:>9.2f} -> {stats[key]:>9.2f} ({change:+.1f}%)")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Load generator for the Stock Consultant API')
+    parser.add_argument('--url', help='Base URL of a running server (default: drive the app in-process)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Measured phase length in seconds')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured warmup in seconds')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Endpoint mix as name:weight pairs')
+    parser.add_argument('--portfolio-sizes', default=DEFAULT_PORTFOLIO_SIZES,
+                        help='Portfolio size distribution as size:weight pairs')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for request generation')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout for --url mode')
+    parser.add_argument('--log-level', default='WARNING', help='App log level for in-process runs')
+    parser.add_argument('--json', dest='json_path', help='Write the full report to this file')
+    parser.add_argument('--compare', help='Baseline report (from --json) to compare against')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    args = build_arg_parser().parse_args(argv)
+    mix = parse_weighted(args.mix)
+    sizes = parse_weighted(args.portfolio_sizes)
+
+    def make_generator(client: httpx.AsyncClient) -> LoadGenerator:
+        return LoadGenerator(client, args.concurrency, args.duration, args.warmup, mix, sizes, args.seed)
+
+    if args.url:
+        results = asyncio.run(run_remote(args, make_generator))
+    else:
+        # Keep usage/billing files written by the app out of the working tree
+        previous_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory(prefix='loadgen-') as workdir:
+            os.chdir(workdir)
+            try:
+                results = asyncio.run(run_in_process(args, make_generator))
+            finally:
+                os.chdir(previous_cwd)
+
+    report = {
+        'git_commit': git_revision(),
+        'python': platform.python_version(),
+        'target': args.url or 'in-process',
+        'config': {
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'mix': args.mix,
+            'portfolio_sizes': args.portfolio_sizes,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,29 @@
 # Run instructions:
 # python -m venv .venv ; source .venv/bin/activate ; pip install -r requirements.txt ; uvicorn main:app --port 8000
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 import market
-import advisor
 import usage_store
+import usage_rollup
 import market_updater
 import pathway_mock
 import flexprice_mock
+import admission
+import analysis_pool
+import portfolio_watch
+import profiler
+import capture
+import screener
+import symbol_search
+from snapshot import MarketSnapshot
+import asyncio
 import logging
+import time
+from datetime import datetime
 from contextlib import asynccontextmanager
 
 # ------------------------------
@@ -25,6 +37,7 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Startup and shutdown logic for the FastAPI app."""
     # Startup
+    analysis_pool.analysis_pool.start()
     logger.info("🚀 Starting market updater background task...")
     market_updater.start_market_updater()
 
@@ -32,6 +45,18 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("🛑 Shutting down application... cleanup if needed")
+    await market_updater.stop_market_updater()
+    usage_store.flush()
+    await flexprice_mock.flexprice_client.flush()
+    capture.request_recorder.close()
+    analysis_pool.analysis_pool.shutdown()
+
+# Workers in the analysis pool receive every new market snapshot
+market_updater.add_snapshot_listener(analysis_pool.analysis_pool.publish_snapshot)
+# Saved portfolios holding changed symbols are re-evaluated on every refresh
+market_updater.add_snapshot_listener(portfolio_watch.portfolio_watcher.on_snapshot)
+# Screening indexes are built at publish time so requests never pay for them
+market_updater.add_snapshot_listener(lambda snapshot: snapshot.screen_index)
 
 # ------------------------------
 # Create FastAPI app with lifespan
@@ -50,52 +75,167 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request cProfile capture, switched on through /api/admin/profile/requests
+app.add_middleware(profiler.RequestProfilerMiddleware, profiler=profiler.request_profiler)
+
 # ------------------------------
-# Billing constants
-PRICE_PER_ADVICE = 2
-PRICE_PER_PORTFOLIO = 5
+# Health and status settings
+READY_MAX_STALENESS = 300  # seconds a change of stocks.csv may go unpublished before the app is not ready
+STATUS_CACHE_TTL = 15         # seconds the integrations status is served from cache
+
+_started_at = time.time()
+_status_cache: Dict = {'value': None, 'cached_at': 0.0}
 
 # ------------------------------
 # Request models
 class PortfolioRequest(BaseModel):
     portfolio: List[Dict]
 
+class RequestProfilingConfig(BaseModel):
+    enabled: bool
+    threshold_ms: Optional[float] = None
+
 # ------------------------------
 # API Endpoints
+def resolve_snapshot(as_of: Optional[str]) -> MarketSnapshot:
+    """
+    Pick the market snapshot for an optional as_of parameter.
+
+    Args:
+        as_of: None for the latest snapshot, a snapshot version number, or an
+            ISO datetime (the snapshot that was current at that time)
+
+    Raises:
+        HTTPException: 400 if as_of is malformed, 404 if it predates the retained history
+    """
+    if as_of is None:
+        return market_updater.get_snapshot()
+    if as_of.isdigit():
+        snapshot = market_updater.get_snapshot_as_of(version=int(as_of))
+    else:
+        try:
+            timestamp = datetime.fromisoformat(as_of).timestamp()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="as_of must be a snapshot version or an ISO datetime")
+        snapshot = market_updater.get_snapshot_as_of(timestamp=timestamp)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Snapshot is not in the retained history")
+    return snapshot
+
 @app.get("/api/market")
-async def get_market():
-    """Get market data from in-memory cache."""
-    return await market_updater.get_market_data()
+async def get_market(as_of: Optional[str] = None):
+    """
+    Get market data from in-memory cache, optionally as of an earlier snapshot.
+
+    The latest snapshot is serialized once and the bytes are reused until the next refresh.
+    """
+    if as_of is None:
+        body = market_updater.get_snapshot().market_json()
+    else:
+        body = resolve_snapshot(as_of).market_json(cache=False)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/api/market/memory")
+async def get_market_memory():
+    """Bytes per symbol held by the latest snapshot: columnar store, signal table and search index."""
+    snapshot = market_updater.get_snapshot()
+    return dict(snapshot.memory_report(), snapshot_version=snapshot.version)
+
+@app.get("/api/symbols/search")
+async def search_symbols(q: str, limit: int = 10):
+    """
+    Autocomplete symbols by case-insensitive prefix of the symbol or any word of the name.
+
+    Symbol matches rank before name matches; every word of q must match.
+    """
+    if not 1 <= limit <= symbol_search.MAX_SEARCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {symbol_search.MAX_SEARCH_LIMIT}")
+    snapshot = market_updater.get_snapshot()
+    results = []
+    for symbol in snapshot.search_index.search(q, limit):
+        stock = snapshot.get(symbol).to_dict(json_safe=True)
+        results.append({
+            'symbol': symbol,
+            'name': stock.get('name'),
+            'sector': stock.get('sector'),
+            'price': stock.get('price')
+        })
+    return {'query': q, 'results': results}
+
+@app.get("/api/market/history")
+async def get_market_history():
+    """Retained snapshot versions and the memory they hold."""
+    return market_updater.get_history_report()
+
+@app.get("/api/screen")
+async def screen_market(field: str = 'change_1d_pct', sector: Optional[str] = None,
+                        min_value: Optional[float] = Query(None, alias='min'),
+                        max_value: Optional[float] = Query(None, alias='max'),
+                        order: str = 'desc', limit: int = 20, offset: int = 0,
+                        as_of: Optional[str] = None):
+    """
+    Screen the market on one numeric field using the snapshot's sorted indexes.
+
+    Returns rows with min <= field <= max (optionally within one sector),
+    largest first for order=desc, paginated with limit/offset.
+    """
+    if not 1 <= limit <= screener.MAX_SCREEN_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {screener.MAX_SCREEN_LIMIT}")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
+    snapshot = resolve_snapshot(as_of)
+    try:
+        result = snapshot.screen_index.screen(field, sector, min_value, max_value, order, offset, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        'field': field,
+        'sector': sector,
+        'order': order,
+        'offset': offset,
+        'limit': limit,
+        'total': result['total'],
+        'snapshot_version': snapshot.version,
+        'results': [record.to_dict(json_safe=True) for record in result['records']]
+    }
 
 @app.post("/api/analyze")
-async def analyze_portfolio(request: PortfolioRequest):
-    """Analyze portfolio and provide investment advice."""
-    # Get latest market data from in-memory cache
-    market_data = await market_updater.get_market_data()
-    
-    # Analyze portfolio
-    analysis_result = advisor.analyze_portfolio(request.portfolio, market_data)
-    
-    # Record usage
-    advice_count = len(analysis_result['advice'])
-    usage_store.record_portfolio_analysis(advice_count)
+async def analyze_portfolio(request: PortfolioRequest, http_request: Request, as_of: Optional[str] = None):
+    """Analyze portfolio and provide investment advice, optionally as of an earlier snapshot."""
+    # Admission control: per-client rate limit and weighted in-flight cap (429 when over budget)
+    units = admission.portfolio_weight(len(request.portfolio))
+    async with admission.analysis_admission.admit(admission.client_key(http_request), units):
+        # Market snapshot from in-memory cache or history (signals precomputed at publish)
+        snapshot = resolve_snapshot(as_of)
+        
+        # Analyze portfolio (large portfolios run in the process pool)
+        analysis_result = await analysis_pool.analysis_pool.analyze(request.portfolio, snapshot)
+        
+        # Opt-in capture for offline replay (CAPTURE_DIR)
+        capture.request_recorder.record(request.portfolio, snapshot, analysis_result)
+        
+        advice_count = len(analysis_result['advice'])
+        
+        # One compound billing event per analysis; concurrent sessions are group-committed
+        flexprice_billing = await flexprice_mock.flexprice_client.record_analysis(advice_count)
+        
+        # Record usage, including the amount charged for the time-bucketed rollups
+        total_charged = flexprice_billing['amount']
+        usage_store.record_portfolio_analysis(advice_count, revenue=total_charged)
     
-    # Process billing through Flexprice Mock
-    flexprice_billing = flexprice_mock.flexprice_client.process_full_analysis_billing(advice_count)
-    
-    # Create simplified billing response
-    total_charged = PRICE_PER_PORTFOLIO + (advice_count * PRICE_PER_ADVICE)
+    # Create simplified billing response (priced by Flexprice's pricing config)
+    breakdown = flexprice_billing['breakdown']
     billing = {
         'charged': total_charged,
         'breakdown': {
-            'portfolio_analysis': PRICE_PER_PORTFOLIO,
+            'portfolio_analysis': breakdown['portfolio_analysis']['amount'],
             'advice_items': advice_count,
-            'price_per_advice': PRICE_PER_ADVICE,
-            'advice_cost': advice_count * PRICE_PER_ADVICE
+            'price_per_advice': breakdown['advice_generation']['unit_price'],
+            'advice_cost': breakdown['advice_generation']['amount']
         },
-        'flexprice_session': flexprice_billing.get('session_id'),
-        'flexprice_total': flexprice_billing.get('total_amount'),
-        'flexprice_status': flexprice_billing.get('status')
+        'flexprice_session': flexprice_billing['session_id'],
+        'flexprice_total': flexprice_billing['amount'],
+        'flexprice_status': flexprice_billing['status']
     }
     
     # Get usage summary
@@ -105,15 +245,105 @@ async def analyze_portfolio(request: PortfolioRequest):
         'advice': analysis_result['advice'],
         'portfolio_value': analysis_result['portfolio_value'],
         'details': analysis_result['details'],
+        'snapshot_version': snapshot.version,
         'billing': billing,
         'usage': usage_summary
     }
 
+@app.post("/api/portfolios")
+async def save_portfolio(request: PortfolioRequest, http_request: Request):
+    """
+    Save a portfolio server-side and return its current analysis.
+
+    Saved portfolios are re-evaluated whenever a market refresh changes one of
+    their symbols; advice changes are collected from /api/portfolios/{id}/updates.
+    Each client may keep MAX_SAVED_PER_CLIENT portfolios of at most
+    MAX_SAVED_HOLDINGS holdings (413 above it); unused ones expire after
+    SAVED_PORTFOLIO_TTL seconds.
+    """
+    units = admission.portfolio_weight(len(request.portfolio))
+    client = admission.client_key(http_request)
+    async with admission.analysis_admission.admit(client, units):
+        try:
+            saved = portfolio_watch.portfolio_watcher.register(request.portfolio, market_updater.get_snapshot(),
+                                                               client)
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except OverflowError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+    return saved.to_dict()
+
+@app.get("/api/portfolios/{portfolio_id}")
+async def get_saved_portfolio(portfolio_id: str):
+    """Get a saved portfolio with its latest analysis."""
+    saved = portfolio_watch.portfolio_watcher.get(portfolio_id)
+    if saved is None:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return saved.to_dict()
+
+@app.delete("/api/portfolios/{portfolio_id}")
+async def delete_saved_portfolio(portfolio_id: str):
+    """Stop watching a saved portfolio."""
+    if not portfolio_watch.portfolio_watcher.remove(portfolio_id):
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return {'deleted': portfolio_id}
+
+@app.get("/api/portfolios/{portfolio_id}/updates")
+async def get_portfolio_updates(portfolio_id: str, wait: float = 0.0):
+    """
+    Drain queued advice changes for a saved portfolio.
+
+    With wait > 0 (seconds, max 30) the request long-polls until an update arrives.
+    """
+    updates = await portfolio_watch.portfolio_watcher.drain_updates(portfolio_id, min(max(wait, 0.0), 30.0))
+    if updates is None:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return {'id': portfolio_id, 'updates': updates}
+
 @app.get("/api/usage")
 async def get_usage():
     """Get usage summary."""
     return usage_store.get_usage_summary()
 
+@app.get("/api/usage/timeseries")
+async def get_usage_timeseries(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                               resolution: Optional[str] = None, max_points: int = 120):
+    """
+    Get usage bucketed over time.
+
+    Defaults to the last 24 hours, aligned to whole buckets ending with the
+    current one. The resolution (minute/hour/day) is picked automatically
+    unless given, and adjacent buckets are merged so that at most max_points
+    points are returned; bucket_seconds gives the width of each point.
+    """
+    if resolution is not None and resolution not in usage_rollup.RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {list(usage_rollup.RESOLUTIONS)}")
+    if not 1 <= max_points <= 2000:
+        raise HTTPException(status_code=400, detail="max_points must be between 1 and 2000")
+
+    if start is None and end is None:
+        return usage_store.get_recent_usage_timeseries(86400, resolution, max_points)
+    end_ts = end.timestamp() if end else time.time()
+    start_ts = start.timestamp() if start else end_ts - 86400
+    if start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    return usage_store.get_usage_timeseries(start_ts, end_ts, resolution, max_points)
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """In-memory runtime metrics for monitoring."""
+    return {
+        'admission': admission.analysis_admission.get_metrics(),
+        'analysis_pool': analysis_pool.analysis_pool.get_metrics(),
+        'saved_portfolios': portfolio_watch.portfolio_watcher.get_metrics(),
+        'capture': capture.request_recorder.get_metrics(),
+        'symbol_search': market_updater.get_snapshot().search_index.get_stats(),
+        'market_refresh': market_updater.get_refresh_metrics(),
+        'market_pipeline': market_updater.get_pipeline_metrics(),
+        'billing': flexprice_mock.flexprice_client.get_metrics()
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for deployment monitoring."""
@@ -121,19 +351,110 @@ async def health_check():
         "status": "healthy",
         "service": "stock-consultant-api",
         "version": "1.0.0",
-        "timestamp": usage_store.get_usage_summary()
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and the event loop is serving requests."""
+    return {
+        "status": "alive",
+        "uptime_seconds": time.time() - _started_at
     }
 
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe served purely from in-memory state."""
+    market_status = market_updater.get_status()
+    age = market_status['snapshot_age_seconds']
+    staleness = market_status['staleness_seconds']
+    checks = {
+        'snapshot_loaded': market_status['snapshot_loaded'],
+        # Snapshots are only republished when the CSV changes, so freshness is staleness, not age
+        'snapshot_fresh': age is not None and staleness <= READY_MAX_STALENESS,
+        'updater_alive': market_status['updater_alive'],
+    }
+    ready = all(checks.values())
+    body = {
+        'status': 'ready' if ready else 'not_ready',
+        'checks': checks,
+        'snapshot_age_seconds': age,
+        'staleness_seconds': staleness,
+        'stocks': market_status['stocks'],
+        'billing_queue_depth': flexprice_mock.flexprice_client.get_queue_depth()
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 @app.get("/api/integrations/status")
 async def get_integrations_status():
-    """Get status of Pathway and Flexprice integrations."""
+    """
+    Get status of Pathway and Flexprice integrations.
+
+    The usage summaries behind this endpoint scan the usage and billing files,
+    so the response is cached for STATUS_CACHE_TTL seconds.
+    """
+    now = time.time()
+    if _status_cache['value'] is None or now - _status_cache['cached_at'] > STATUS_CACHE_TTL:
+        _status_cache['value'] = {
+            'pathway': pathway_mock.get_pathway_status(),
+            'flexprice': {
+                'connected': flexprice_mock.flexprice_client.connected,
+                'api_key_prefix': flexprice_mock.flexprice_client.api_key[:10],
+                'pricing_config': flexprice_mock.flexprice_client.pricing_config,
+                'usage_summary': flexprice_mock.flexprice_client.get_usage_summary()
+            },
+            'timestamp': usage_store.get_usage_summary()
+        }
+        _status_cache['cached_at'] = now
+    return dict(
+        _status_cache['value'],
+        cache={
+            'cached_at': datetime.fromtimestamp(_status_cache['cached_at']).isoformat(),
+            'ttl_seconds': STATUS_CACHE_TTL
+        }
+    )
+
+# ------------------------------
+# Admin endpoints (require ADMIN_TOKEN via the X-Admin-Token header)
+@app.get("/api/admin/profile", dependencies=[Depends(profiler.require_admin)])
+async def sample_profile(seconds: float = 5.0, interval_ms: float = 5.0, include_idle: bool = False):
+    """
+    Sample the stacks of all threads for a number of seconds.
+
+    Returns collapsed stacks ("frame;frame;frame count" per line), ready for
+    flamegraph.pl or speedscope. Sampling runs in a worker thread so the event
+    loop keeps serving requests and shows up in the profile.
+    """
+    if not 0 < seconds <= profiler.MAX_SAMPLE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {profiler.MAX_SAMPLE_SECONDS}")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    try:
+        result = await asyncio.to_thread(profiler.sample_stacks, seconds, interval_ms / 1000, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        profiler.format_collapsed(result['collapsed']),
+        headers={'X-Profile-Samples': str(result['samples'])}
+    )
+
+@app.get("/api/admin/profile/requests", dependencies=[Depends(profiler.require_admin)])
+async def get_request_profiles():
+    """Per-request profiling status and the buffered profiles of slow requests."""
     return {
-        'pathway': pathway_mock.get_pathway_status(),
-        'flexprice': {
-            'connected': flexprice_mock.flexprice_client.connected,
-            'api_key_prefix': flexprice_mock.flexprice_client.api_key[:10],
-            'pricing_config': flexprice_mock.flexprice_client.pricing_config,
-            'usage_summary': flexprice_mock.flexprice_client.get_usage_summary()
-        },
-        'timestamp': usage_store.get_usage_summary()
+        'status': profiler.request_profiler.get_status(),
+        'profiles': profiler.request_profiler.get_profiles()
     }
+
+@app.post("/api/admin/profile/requests", dependencies=[Depends(profiler.require_admin)])
+async def configure_request_profiling(config: RequestProfilingConfig):
+    """Turn per-request profiling on or off and set the latency threshold."""
+    if config.threshold_ms is not None and config.threshold_ms < 0:
+        raise HTTPException(status_code=400, detail="threshold_ms must not be negative")
+    return profiler.request_profiler.configure(config.enabled, config.threshold_ms)
+
+@app.delete("/api/admin/profile/requests", dependencies=[Depends(profiler.require_admin)])
+async def clear_request_profiles():
+    """Drop buffered request profiles."""
+    profiler.request_profiler.clear()
+    return profiler.request_profiler.get_status()
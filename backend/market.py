@@ -1,18 +1,32 @@
 import pandas as pd
 from typing import List, Dict, Optional
 
+from data_source import MARKET_DATA_FILE, CsvFileSource, parse_csv
+from market_store import MarketStore
 
-def load_market(csv_path: str = '../data/stocks.csv') -> List[Dict]:
+
+def read_market_frame(csv_path: str = MARKET_DATA_FILE) -> pd.DataFrame:
+    """Read the market CSV with numeric columns coerced to numbers."""
+    return parse_csv(CsvFileSource(csv_path).load())
+
+
+def load_market(csv_path: str = MARKET_DATA_FILE) -> List[Dict]:
     """Load market data from CSV and return as list of dictionaries with numeric fields converted to floats."""
-    df = pd.read_csv(csv_path)
-    
-    # Convert numeric columns to float
-    numeric_columns = ['price', 'change_1d_pct', 'change_7d_pct', 'volatility', 'market_cap_cr']
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    return df.to_dict('records')
+    return read_market_frame(csv_path).to_dict('records')
+
+
+def load_market_store(csv_path: str = MARKET_DATA_FILE, previous: Optional[MarketStore] = None) -> MarketStore:
+    """
+    Load market data from CSV into a columnar MarketStore.
+
+    Args:
+        csv_path: Path to the market CSV
+        previous: Store of the previous load; unchanged chunks are shared with it
+
+    Returns:
+        MarketStore whose rows match load_market's dictionaries
+    """
+    return MarketStore.from_dataframe(read_market_frame(csv_path), previous)
 
 
 def get_stock_by_symbol(symbol: str, market_list: List[Dict]) -> Optional[Dict]:
@@ -0,0 +1,386 @@
+"""
+Columnar Market Store
+
+Compact in-memory representation of the market universe. Instead of one dict
+per stock with boxed floats and repeated strings, rows are stored in chunks
+of CHUNK_ROWS with one column object per field:
+
+- integer / float fields: array('q') / array('d')
+- sector: array('H') of codes into an append-only, interned lookup table
+- other fields (symbol, name, ...): tuples of interned strings
+
+Code that wants record-style access gets StockRow views: read-only Mappings
+with two slots (chunk, offset) that support stock['price'], .get(), dict(row)
+and equality with plain dicts. Views are created on access and hold no data,
+so a store keeps no per-row objects; StockRow.same_row() tells whether two
+views point at the same row of the same chunk.
+
+When a store is built with the previous store, chunks whose contents are
+unchanged are reused as-is, so a history of snapshots costs memory in
+proportion to the chunks that changed.
+"""
+
+import math
+import os
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from itertools import chain, repeat
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# ------------------------------
+# Configuration (overridable through environment variables)
+CHUNK_ROWS = int(os.getenv('MARKET_CHUNK_ROWS', '256'))
+CATEGORICAL_FIELDS = ('sector',)
+
+# Column kinds
+KIND_INT = 'q'
+KIND_FLOAT = 'd'
+KIND_CATEGORY = 'H'
+KIND_OBJECT = 'o'
+
+MAX_CATEGORIES = 65535
+
+
+class _Missing:
+    """Placeholder for a field absent from a row (only in object columns)."""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return '_MISSING'
+
+    def __repr__(self) -> str:
+        return '<missing>'
+
+
+_MISSING = _Missing()
+
+
+class Categories:
+    """Append-only value <-> code table shared by consecutive stores."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(value)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+class Layout:
+    """Field order, column kinds and category tables shared by a store's chunks."""
+
+    __slots__ = ('fields', 'kinds', 'positions', 'categories')
+
+    def __init__(self, fields: Tuple[str, ...], kinds: Tuple[str, ...], categories: Tuple[Optional[Categories], ...]):
+        self.fields = fields
+        self.kinds = kinds
+        self.positions = {field: position for position, field in enumerate(fields)}
+        self.categories = categories
+
+
+class StoreChunk:
+    """Columns for up to CHUNK_ROWS consecutive rows."""
+
+    __slots__ = ('layout', 'columns', 'length')
+
+    def __init__(self, layout: Layout, columns: Tuple, length: int):
+        self.layout = layout
+        self.columns = columns
+        self.length = length
+
+    def same_data(self, other: 'StoreChunk') -> bool:
+        if other.layout is not self.layout or other.length != self.length:
+            return False
+        for mine, theirs in zip(self.columns, other.columns):
+            if isinstance(mine, array):
+                # Byte comparison so that NaN values compare equal
+                if mine.typecode != theirs.typecode or mine.tobytes() != theirs.tobytes():
+                    return False
+            elif mine != theirs:
+                return False
+        return True
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the columns (strings counted per chunk)."""
+        total = sys.getsizeof(self) + sys.getsizeof(self.columns)
+        for column in self.columns:
+            total += sys.getsizeof(column)
+            if isinstance(column, tuple):
+                total += sum(sys.getsizeof(value) for value in column if isinstance(value, str))
+        return total
+
+
+class StockRow(Mapping):
+    """Read-only record view over one row of a chunk."""
+
+    __slots__ = ('_chunk', '_offset')
+
+    def __init__(self, chunk: StoreChunk, offset: int):
+        self._chunk = chunk
+        self._offset = offset
+
+    def __getitem__(self, key: str):
+        chunk = self._chunk
+        layout = chunk.layout
+        position = layout.positions[key]
+        value = chunk.columns[position][self._offset]
+        if layout.kinds[position] == KIND_CATEGORY:
+            return layout.categories[position].values[value]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        chunk = self._chunk
+        offset = self._offset
+        for field, column in zip(chunk.layout.fields, chunk.columns):
+            if column[offset] is not _MISSING:
+                yield field
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def same_row(self, other) -> bool:
+        """Whether other is a view of the same row of the same chunk (rows of shared chunks match across stores)."""
+        return type(other) is StockRow and other._chunk is self._chunk and other._offset == self._offset
+
+    def to_dict(self, json_safe: bool = False) -> Dict:
+        """
+        Plain dict copy of the row.
+
+        Args:
+            json_safe: Replace NaN floats with None
+        """
+        record = {field: self[field] for field in self}
+        if json_safe:
+            for field, value in record.items():
+                if type(value) is float and math.isnan(value):
+                    record[field] = None
+        return record
+
+    def __repr__(self) -> str:
+        return f'StockRow({self.to_dict()!r})'
+
+
+def _infer_kind(field: str, values: List) -> str:
+    """Column kind for a list of Python values (exact types only, so values round-trip)."""
+    if not values:
+        return KIND_OBJECT
+    if field in CATEGORICAL_FIELDS and all(type(v) is str for v in values):
+        return KIND_CATEGORY
+    if all(type(v) is int for v in values):
+        return KIND_INT
+    if all(type(v) is float for v in values):
+        return KIND_FLOAT
+    return KIND_OBJECT
+
+
+def _chunk_rows(chunk: StoreChunk) -> Iterator[StockRow]:
+    return map(StockRow, repeat(chunk, chunk.length), range(chunk.length))
+
+
+class MarketStore(Sequence):
+    """Chunked columnar table of market records; a Sequence of StockRow views."""
+
+    def __init__(self, layout: Layout, chunks: List[StoreChunk], chunks_reused: int = 0):
+        self.layout = layout
+        self.chunks = chunks
+        self._length = sum(chunk.length for chunk in chunks)
+        self.chunks_reused = chunks_reused
+
+    # ------------------------------
+    # Construction
+    @classmethod
+    def from_records(cls, records: List[Dict], previous: Optional['MarketStore'] = None) -> 'MarketStore':
+        """Build a store from a list of dicts, sharing unchanged chunks with previous."""
+        fields: Dict[str, None] = {}
+        for record in records:
+            for field in record:
+                fields.setdefault(field, None)
+        columns = {
+            field: [record.get(field, _MISSING) for record in records] for field in fields
+        }
+        return cls._build(columns, len(records), previous)
+
+    @classmethod
+    def from_dataframe(cls, df, previous: Optional['MarketStore'] = None) -> 'MarketStore':
+        """
+        Build a store straight from a DataFrame, without per-row dicts.
+
+        Values come out as df.to_dict('records') would produce them: int64 and
+        float64 columns as Python int/float, other columns as their objects.
+        """
+        columns = {}
+        for field in df.columns:
+            series = df[field]
+            if series.dtype.kind in 'iu':
+                columns[field] = array(KIND_INT, series.to_numpy(dtype='int64').tobytes())
+            elif series.dtype.kind == 'f':
+                columns[field] = array(KIND_FLOAT, series.to_numpy(dtype='float64').tobytes())
+            else:
+                columns[field] = series.tolist()
+        return cls._build(columns, len(df), previous)
+
+    @classmethod
+    def _build(cls, columns: Dict[str, object], length: int, previous: Optional['MarketStore']) -> 'MarketStore':
+        fields = tuple(str(field) for field in columns)
+        values = list(columns.values())
+
+        kinds = []
+        for field, column in zip(fields, values):
+            if isinstance(column, array):
+                kinds.append(column.typecode)
+            else:
+                kinds.append(_infer_kind(field, column))
+        kinds = tuple(kinds)
+
+        # Reuse the previous layout (and its category tables) when the schema is unchanged
+        if previous is not None and previous.layout.fields == fields and previous.layout.kinds == kinds:
+            layout = previous.layout
+        else:
+            previous = None
+            layout = Layout(fields, kinds, tuple(
+                Categories() if kind == KIND_CATEGORY else None for kind in kinds
+            ))
+
+        # Encode categorical and typed columns once for the whole table
+        encoded = []
+        for position, (kind, column) in enumerate(zip(kinds, values)):
+            if isinstance(column, array):
+                encoded.append(column)
+            elif kind == KIND_CATEGORY:
+                categories = layout.categories[position]
+                codes = list(map(categories.code, column))
+                if len(categories.values) > MAX_CATEGORIES:
+                    raise ValueError(f"Too many distinct values for categorical field {fields[position]}")
+                encoded.append(array(KIND_CATEGORY, codes))
+            elif kind in (KIND_INT, KIND_FLOAT):
+                encoded.append(array(kind, column))
+            elif all(type(value) is str for value in column):
+                encoded.append(list(map(sys.intern, column)))
+            else:
+                encoded.append(column)
+
+        chunks: List[StoreChunk] = []
+        reused = 0
+        for index, start in enumerate(range(0, length, CHUNK_ROWS)):
+            stop = min(start + CHUNK_ROWS, length)
+            chunk_columns = tuple(
+                column[start:stop] if isinstance(column, array) else tuple(column[start:stop])
+                for column in encoded
+            )
+            chunk = StoreChunk(layout, chunk_columns, stop - start)
+            if previous is not None and index < len(previous.chunks) and chunk.same_data(previous.chunks[index]):
+                chunks.append(previous.chunks[index])
+                reused += 1
+            else:
+                chunks.append(chunk)
+        return cls(layout, chunks, reused)
+
+    # ------------------------------
+    # Sequence interface
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('MarketStore index out of range')
+        return StockRow(self.chunks[index // CHUNK_ROWS], index % CHUNK_ROWS)
+
+    def __iter__(self) -> Iterator[StockRow]:
+        return chain.from_iterable(_chunk_rows(chunk) for chunk in self.chunks)
+
+    def unshared_rows(self, other: 'MarketStore') -> Iterator[StockRow]:
+        """
+        Rows of this store's chunks that are not shared with other at the same position.
+
+        Any row that is added or changed relative to other is among them, so
+        diffs between consecutive stores only need to look at these.
+        """
+        for index, chunk in enumerate(self.chunks):
+            if index >= len(other.chunks) or other.chunks[index] is not chunk:
+                yield from _chunk_rows(chunk)
+
+    def column(self, field: str) -> List:
+        """All values of one field, decoded, in row order."""
+        position = self.layout.positions[field]
+        kind = self.layout.kinds[position]
+        values: List = []
+        for chunk in self.chunks:
+            values.extend(chunk.columns[position])
+        if kind == KIND_CATEGORY:
+            table = self.layout.categories[position].values
+            return [table[code] for code in values]
+        return values
+
+    def to_records(self, json_safe: bool = False) -> List[Dict]:
+        """
+        Materialize plain dicts (for serialization).
+
+        Args:
+            json_safe: Replace NaN floats with None
+        """
+        return [row.to_dict(json_safe) for row in self]
+
+    # ------------------------------
+    # Memory accounting
+    def memory_report(self) -> Dict:
+        """Approximate bytes held by the store, overall and per symbol, by column (row views are created on access)."""
+        layout = self.layout
+        by_field: Dict[str, int] = {field: 0 for field in layout.fields}
+        seen_strings = set()
+        for chunk in self.chunks:
+            for field, column in zip(layout.fields, chunk.columns):
+                size = sys.getsizeof(column)
+                if isinstance(column, tuple):
+                    # Interned strings are shared; count each object once
+                    for value in column:
+                        if type(value) is str and id(value) not in seen_strings:
+                            seen_strings.add(id(value))
+                            size += sys.getsizeof(value)
+                by_field[field] += size
+        for field, categories in zip(layout.fields, layout.categories):
+            if categories is not None:
+                by_field[field] += sum(sys.getsizeof(value) for value in categories.values)
+
+        chunk_overhead = sys.getsizeof(self.chunks) + sum(
+            sys.getsizeof(chunk) + sys.getsizeof(chunk.columns) for chunk in self.chunks
+        )
+        column_bytes = sum(by_field.values())
+        total = column_bytes + chunk_overhead
+
+        # Compare with the dict-per-record layout this replaces, measured on a sample
+        sample = [self[i].to_dict() for i in range(0, self._length, max(1, self._length // 1000))]
+        dict_bytes = 0.0
+        if sample:
+            dict_bytes = sum(
+                sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record.values())
+                for record in sample
+            ) / len(sample)
+
+        def per_symbol(size: float) -> float:
+            return size / self._length if self._length else 0.0
+
+        return {
+            'symbols': self._length,
+            'chunks': len(self.chunks),
+            'chunk_rows': CHUNK_ROWS,
+            'chunks_reused_from_previous': self.chunks_reused,
+            'total_bytes': total,
+            'bytes_per_symbol': per_symbol(total),
+            'column_bytes_per_symbol': {field: per_symbol(size) for field, size in by_field.items()},
+            'dict_records_bytes_per_symbol': dict_bytes,
+        }
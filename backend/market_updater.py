@@ -1,67 +1,237 @@
 import asyncio
 import logging
-from typing import List, Dict
+import time
+from typing import Callable, List, Dict, Optional, Sequence
 import os
-from market import load_market as load_market_original
+import data_source
+from data_source import DataSource
+from refresh_scheduler import RefreshScheduler
+from snapshot import MarketSnapshot, EMPTY_SNAPSHOT, SnapshotHistory
 
 
 # ------------------------------
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Global variable to store the latest market data
-_market_data: List[Dict] = []
+# Global variable to store the latest market snapshot. Snapshots are never
+# mutated after publishing, so readers may hold on to the reference.
+_snapshot: MarketSnapshot = EMPTY_SNAPSHOT
 _market_data_lock = asyncio.Lock()
 
-# ------------------------------
-# Determine the path to stocks.csv dynamically
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # directory of this file
-DATA_FILE = os.path.join(BASE_DIR, "data", "stocks.csv")  # assumes backend/data/stocks.csv
+# Recent snapshots for as-of queries; unchanged records are shared between them
+SNAPSHOT_HISTORY_SIZE = int(os.getenv('SNAPSHOT_HISTORY_SIZE', '120'))  # one snapshot per change of stocks.csv
+_history = SnapshotHistory(SNAPSHOT_HISTORY_SIZE)
+_last_chunks_reused = 0
+
+# Callbacks run after each successful refresh with the new snapshot
+_snapshot_listeners: List[Callable[[MarketSnapshot], None]] = []
+
+# Refresh bookkeeping, readable without touching disk or the lock
+_last_refresh_at: Optional[float] = None
+_last_refresh_error: Optional[str] = None
+_updater_task: Optional[asyncio.Task] = None
 
 # ------------------------------
-# Wrapper to load market using absolute path
-def load_market() -> List[Dict]:
-    if not os.path.exists(DATA_FILE):
-        raise FileNotFoundError(f"Market data CSV not found at {DATA_FILE}")
-    return load_market_original(DATA_FILE)  # pass the absolute path to your original load_market function
+# Where the market universe comes from (MARKET_SOURCE / MARKET_DATA_FILE)
+DATA_FILE = data_source.MARKET_DATA_FILE
+_data_source: DataSource = data_source.create_source()
+
+# Pipeline stage timings of the last refresh and totals since startup
+PIPELINE_STAGES = ('load', 'parse', 'publish')
+_pipeline_metrics: Dict = {
+    'refreshes': 0,
+    'published': 0,
+    'unchanged': 0,
+    'failed': 0,
+    'last_ms': {stage: None for stage in PIPELINE_STAGES},
+    'total_ms': {stage: 0.0 for stage in PIPELINE_STAGES},
+}
 
 # ------------------------------
 # Async functions
-async def get_market_data() -> List[Dict]:
-    """Get the current in-memory market data."""
-    async with _market_data_lock:
-        return _market_data.copy()
+async def get_market_data() -> Sequence[Dict]:
+    """Get the current in-memory market data as read-only record views (no copy)."""
+    return _snapshot.records
+
+
+def get_snapshot() -> MarketSnapshot:
+    """Get the current market snapshot (read-only, no copy)."""
+    return _snapshot
+
+
+def get_snapshot_as_of(version: Optional[int] = None, timestamp: Optional[float] = None) -> Optional[MarketSnapshot]:
+    """
+    Get a retained snapshot by version or by the unix time it was current at.
+
+    Returns:
+        The snapshot, or None if it is older than the retained history
+    """
+    if version is not None:
+        return _history.get_version(version)
+    if timestamp is not None:
+        return _history.at_time(timestamp)
+    return _snapshot
+
+
+def get_history_report() -> Dict:
+    """Retained snapshot versions and their estimated memory footprint."""
+    return dict(
+        _history.memory_report(),
+        versions=_history.versions(),
+        last_chunks_reused=_last_chunks_reused,
+    )
 
 
-async def refresh_market_data() -> None:
-    """Refresh market data from CSV file."""
-    global _market_data
+def add_snapshot_listener(listener: Callable[[MarketSnapshot], None]) -> None:
+    """Register a callback to run whenever a new snapshot is published."""
+    _snapshot_listeners.append(listener)
+
+
+def _notify_listeners(snapshot: MarketSnapshot) -> None:
+    for listener in _snapshot_listeners:
+        try:
+            listener(snapshot)
+        except Exception as e:
+            logger.error(f"Snapshot listener {getattr(listener, '__qualname__', listener)} failed: {e}")
+
+
+async def refresh_market_data() -> bool:
+    """
+    Run the load/parse/publish pipeline on the configured data source.
+
+    Returns:
+        True on success: a new snapshot was published, or the input was
+        unchanged and the current snapshot is still up to date. False if
+        loading or parsing failed. The refresh scheduler relies on this to
+        clear a pending change only once the served data reflects it.
+    """
+    global _snapshot, _last_refresh_at, _last_refresh_error, _last_chunks_reused
+    source = _data_source
+    _pipeline_metrics['refreshes'] += 1
     try:
-        new_data = load_market()
+        started = time.perf_counter()
+        raw = source.load()
+        loaded = time.perf_counter()
+        _record_stage('load', loaded - started)
+
+        # Unchanged store chunks (and their signals) are shared with the previous snapshot
+        new_data = source.parse(raw, _snapshot.store)
+        parsed = time.perf_counter()
+        _record_stage('parse', parsed - loaded)
+        if new_data is _snapshot.store and _snapshot.version > 0:
+            _pipeline_metrics['unchanged'] += 1
+            _last_refresh_error = None
+            return True
+
+        _last_chunks_reused = new_data.chunks_reused
         async with _market_data_lock:
-            _market_data = new_data
-        logger.info(f"Market data refreshed: {len(new_data)} stocks loaded")
+            new_snapshot = MarketSnapshot(new_data, version=_snapshot.version + 1, previous=_snapshot)
+            _snapshot.supersede()
+            _snapshot = new_snapshot
+            _history.add(new_snapshot)
+        _last_refresh_at = new_snapshot.published_at
+        _last_refresh_error = None
+        _notify_listeners(new_snapshot)
+        _record_stage('publish', time.perf_counter() - parsed)
+        _pipeline_metrics['published'] += 1
+        logger.info(f"Market data refreshed: {len(new_data)} stocks loaded from {source.describe()} "
+                    f"(snapshot v{new_snapshot.version})")
+        return True
     except Exception as e:
+        _pipeline_metrics['failed'] += 1
+        _last_refresh_error = str(e)
         logger.error(f"Failed to refresh market data: {e}")
+        return False
+
+
+def _record_stage(stage: str, seconds: float) -> None:
+    _pipeline_metrics['last_ms'][stage] = seconds * 1000
+    _pipeline_metrics['total_ms'][stage] += seconds * 1000
+
+
+def get_pipeline_metrics() -> Dict:
+    """Refresh counts and load/parse/publish stage timings of the snapshot pipeline."""
+    return {
+        'source': _data_source.describe(),
+        'refreshes': _pipeline_metrics['refreshes'],
+        'published': _pipeline_metrics['published'],
+        'unchanged': _pipeline_metrics['unchanged'],
+        'failed': _pipeline_metrics['failed'],
+        'last_ms': dict(_pipeline_metrics['last_ms']),
+        'total_ms': dict(_pipeline_metrics['total_ms']),
+    }
+
+
+def get_data_source() -> DataSource:
+    """Get the source feeding the snapshot pipeline."""
+    return _data_source
+
+
+def set_data_source(source: DataSource) -> None:
+    """
+    Replace the source feeding the snapshot pipeline (before start_market_updater).
+
+    The next refresh builds on the current snapshot, sharing any unchanged chunks.
+    """
+    global _data_source, _scheduler
+    _data_source = source
+    _scheduler = _create_scheduler(source)
+
+
+def get_status() -> Dict:
+    """
+    Get updater status from in-memory state only.
+
+    Returns:
+        Dict with snapshot presence, size, age, staleness (seconds a change of
+        the CSV has been waiting to be published) and whether the updater task is alive
+    """
+    age = time.time() - _last_refresh_at if _last_refresh_at is not None else None
+    return {
+        'snapshot_loaded': _last_refresh_at is not None,
+        'stocks': len(_snapshot),
+        'snapshot_version': _snapshot.version,
+        'snapshot_age_seconds': age,
+        'staleness_seconds': _scheduler.staleness_seconds(),
+        'updater_alive': _updater_task is not None and not _updater_task.done(),
+        'last_error': _last_refresh_error,
+    }
+
+
+def _create_scheduler(source: DataSource) -> RefreshScheduler:
+    # Reloads when the source's file changes (inotify or polling), within min/max interval bounds
+    return RefreshScheduler(source.watch_path, refresh_market_data, on_modify=source.appends)
+
+
+_scheduler = _create_scheduler(_data_source)
+
+
+def get_refresh_metrics() -> Dict:
+    """Refresh scheduler counters, staleness and reaction latency."""
+    return _scheduler.get_metrics()
 
 
 async def market_updater_task() -> None:
-    """Background task that refreshes market data every 30 seconds."""
+    """Background task that reloads market data whenever the data source changes."""
     logger.info("Market updater task started")
-    
-    # Initial load
-    await refresh_market_data()
-    
-    # Periodic refresh every 30 seconds
-    while True:
-        try:
-            await asyncio.sleep(30)
-            await refresh_market_data()
-        except Exception as e:
-            logger.error(f"Error in market updater task: {e}")
-            await asyncio.sleep(30)
+    # Initial load, then one refresh per (debounced) change of the file
+    await _scheduler.run()
 
 
 def start_market_updater() -> None:
     """Start the market updater background task."""
-    asyncio.create_task(market_updater_task())
+    global _updater_task
+    _updater_task = asyncio.create_task(market_updater_task())
+
+
+async def stop_market_updater() -> None:
+    """Cancel the market updater task and release its file watcher."""
+    global _updater_task
+    if _updater_task is None:
+        return
+    _updater_task.cancel()
+    try:
+        await _updater_task
+    except asyncio.CancelledError:
+        pass
+    _updater_task = None
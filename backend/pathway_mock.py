@@ -1,32 +1,35 @@
 """
 Pathway Mock Integration
 
-This module simulates Pathway's real-time data streaming capabilities
-by reading from a CSV file. In a real implementation, this would connect
-to Pathway's streaming data pipeline.
+This module simulates Pathway's real-time data streaming capabilities on
+top of the market snapshot pipeline (see data_source and market_updater),
+so the universe is parsed once and Pathway reports the same snapshot, and
+the same freshness, as the rest of the API. In a real implementation, this
+would connect to Pathway's streaming data pipeline.
 
 Pathway Documentation: https://pathway.com/
 """
 
-import pandas as pd
 import logging
 from typing import List, Dict, Optional
 from datetime import datetime
 
+import market_updater
+
 logger = logging.getLogger(__name__)
 
 
 class PathwayDataSource:
-    """Mock Pathway data source that reads from CSV files."""
-    
-    def __init__(self, csv_path: str = '../data/stocks.csv'):
-        self.csv_path = csv_path
-        self.last_updated = None
-        self._cache = None
-    
+    """Mock Pathway data source reading from the shared snapshot pipeline."""
+
+    @property
+    def data_source(self) -> str:
+        """Description of the source feeding the pipeline, e.g. csv:/path/to/stocks.csv."""
+        return market_updater.get_data_source().describe()
+
     def fetch_latest_csv(self) -> List[Dict]:
         """
-        Fetch latest market data from CSV source.
+        Fetch latest market data from the current snapshot.
         
         In a real Pathway integration, this would:
         - Connect to streaming data sources (Kafka, databases, APIs)
@@ -35,48 +38,22 @@ class PathwayDataSource:
         - Provide fault tolerance and recovery
         
         Returns:
-            List of stock data dictionaries
+            Read-only stock records of the latest snapshot (empty before the first load)
         """
-        try:
-            logger.info(f"[Pathway Mock] Fetching data from {self.csv_path}")
-            
-            # Simulate Pathway's data loading
-            df = pd.read_csv(self.csv_path)
-            
-            # Convert numeric columns (Pathway would handle schema validation)
-            numeric_columns = ['price', 'change_1d_pct', 'change_7d_pct', 'volatility', 'market_cap_cr']
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            # Convert to list of dicts (Pathway output format)
-            data = df.to_dict('records')
-            
-            # Update metadata
-            self.last_updated = datetime.now()
-            self._cache = data
-            
-            logger.info(f"[Pathway Mock] Successfully loaded {len(data)} stocks at {self.last_updated}")
-            
-            return data
-            
-        except FileNotFoundError:
-            logger.error(f"[Pathway Mock] CSV file not found: {self.csv_path}")
-            return self._cache or []
-        except Exception as e:
-            logger.error(f"[Pathway Mock] Error loading data: {e}")
-            return self._cache or []
+        return market_updater.get_snapshot().records
     
     def get_data_freshness(self) -> Optional[datetime]:
-        """Get timestamp of last data update."""
-        return self.last_updated
+        """Get timestamp of the snapshot currently served, or None before the first load."""
+        snapshot = market_updater.get_snapshot()
+        if snapshot.version == 0:
+            return None
+        return datetime.fromtimestamp(snapshot.published_at)
     
     def is_connected(self) -> bool:
         """Check if data source is available."""
         try:
-            import os
-            return os.path.exists(self.csv_path)
-        except:
+            return market_updater.get_data_source().is_available()
+        except OSError:
             return False
 
 
@@ -104,13 +81,17 @@ def get_pathway_status() -> Dict:
     Get status information about the Pathway connection.
     
     Returns:
-        Dict with connection status, last update time, and data count
+        Dict with connection status, last update time and data count of the
+        snapshot being served, plus the pipeline's stage timings
     """
+    snapshot = market_updater.get_snapshot()
     return {
         'connected': pathway_source.is_connected(),
         'last_updated': pathway_source.get_data_freshness(),
-        'data_source': pathway_source.csv_path,
-        'cached_records': len(pathway_source._cache) if pathway_source._cache else 0
+        'data_source': pathway_source.data_source,
+        'snapshot_version': snapshot.version,
+        'cached_records': len(snapshot),
+        'pipeline': market_updater.get_pipeline_metrics()
     }
 
 
@@ -0,0 +1,343 @@
+"""
+Saved Portfolios
+
+Portfolios registered server-side are re-evaluated when the market changes,
+so clients can collect advice changes instead of resubmitting.
+
+A reverse index maps each symbol to the portfolios holding it. When a new
+snapshot is published only rows in store chunks not shared with the previous
+snapshot are diffed, only the symbols whose records changed are looked up,
+and only the portfolios holding them are re-analyzed. Advice deltas are queued
+per portfolio; clients drain them, optionally long-polling for the next one.
+
+The diff runs inside the snapshot listener; the re-analysis runs afterwards
+in batches of SAVED_REEVALUATE_BATCH portfolios that yield to the event loop
+in between, always against the latest snapshot, so a refresh touching many
+saved portfolios does not stall request handling.
+
+Each client may save up to MAX_SAVED_PER_CLIENT portfolios of at most
+MAX_SAVED_HOLDINGS holdings, and a portfolio that is neither read nor polled
+for SAVED_PORTFOLIO_TTL seconds is dropped.
+State is in memory only and does not survive a restart.
+"""
+
+import asyncio
+import math
+import os
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from typing import Dict, List, Mapping, Optional, Set
+
+import advisor
+from snapshot import MarketSnapshot, EMPTY_SNAPSHOT
+
+
+# ------------------------------
+# Configuration (overridable through environment variables)
+MAX_SAVED_PORTFOLIOS = int(os.getenv('MAX_SAVED_PORTFOLIOS', '10000'))
+MAX_SAVED_PER_CLIENT = int(os.getenv('MAX_SAVED_PER_CLIENT', '20'))
+MAX_SAVED_HOLDINGS = int(os.getenv('MAX_SAVED_HOLDINGS', '200'))
+SAVED_REEVALUATE_BATCH = int(os.getenv('SAVED_REEVALUATE_BATCH', '100'))  # portfolios per event-loop turn
+SAVED_PORTFOLIO_TTL = float(os.getenv('SAVED_PORTFOLIO_TTL', '86400'))  # seconds since last access
+MAX_QUEUED_UPDATES = 50  # per portfolio; oldest updates are dropped first
+
+
+def same_value(a, b) -> bool:
+    """Equality that treats two NaN floats as equal."""
+    if a == b:
+        return True
+    return type(a) is float and type(b) is float and math.isnan(a) and math.isnan(b)
+
+
+def same_record(a: Mapping, b: Mapping) -> bool:
+    """Field-by-field record equality using same_value."""
+    if a is b:
+        return True
+    if len(a) != len(b):
+        return False
+    for field, value in a.items():
+        if field not in b or not same_value(value, b[field]):
+            return False
+    return True
+
+
+def changed_symbols(old: MarketSnapshot, new: MarketSnapshot) -> Set[str]:
+    """Symbols added, removed or whose record differs between two snapshots."""
+    changed = set()
+    # Rows in chunks shared at the same position are identical in both stores
+    for row in new.store.unshared_rows(old.store):
+        symbol = row.get('symbol')
+        previous = old.get(symbol)
+        if previous is None or not same_record(previous, row):
+            changed.add(symbol)
+    for row in old.store.unshared_rows(new.store):
+        symbol = row.get('symbol')
+        if new.get(symbol) is None:
+            changed.add(symbol)
+    return changed
+
+
+def _advice_items(counts: Counter) -> List[Dict]:
+    return [
+        {'symbol': symbol, 'action': action, 'message': message}
+        for (symbol, action, message), count in counts.items() for _ in range(count)
+    ]
+
+
+def advice_delta(old: List[Dict], new: List[Dict]) -> Dict[str, List[Dict]]:
+    """Advice items present only in new ('added') or only in old ('removed')."""
+    old_counts = Counter((a['symbol'], a['action'], a['message']) for a in old)
+    new_counts = Counter((a['symbol'], a['action'], a['message']) for a in new)
+    return {'added': _advice_items(new_counts - old_counts), 'removed': _advice_items(old_counts - new_counts)}
+
+
+class SavedPortfolio:
+    """A registered portfolio with its latest analysis and pending updates."""
+
+    __slots__ = ('id', 'portfolio', 'symbols', 'result', 'snapshot_version', 'client',
+                 'created_at', 'last_access', 'updates', 'updated')
+
+    def __init__(self, portfolio_id: str, portfolio: List[Dict], client: Optional[str] = None):
+        self.id = portfolio_id
+        self.portfolio = portfolio
+        self.symbols = {holding['symbol'] for holding in portfolio}
+        self.result: Dict = {}
+        self.snapshot_version = 0
+        self.client = client
+        self.created_at = time.time()
+        self.last_access = time.monotonic()
+        self.updates: deque = deque(maxlen=MAX_QUEUED_UPDATES)
+        self.updated: Optional[asyncio.Event] = None  # created on first long-poll
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'portfolio': self.portfolio,
+            'advice': self.result.get('advice', []),
+            'portfolio_value': self.result.get('portfolio_value', 0.0),
+            'details': self.result.get('details', {}),
+            'snapshot_version': self.snapshot_version,
+            'pending_updates': len(self.updates),
+        }
+
+
+class PortfolioWatcher:
+    """Registry of saved portfolios with a symbol -> portfolio reverse index."""
+
+    def __init__(self, max_portfolios: int = MAX_SAVED_PORTFOLIOS, max_per_client: int = MAX_SAVED_PER_CLIENT,
+                 ttl: float = SAVED_PORTFOLIO_TTL, max_holdings: int = MAX_SAVED_HOLDINGS,
+                 batch_size: int = SAVED_REEVALUATE_BATCH):
+        self.max_portfolios = max_portfolios
+        self.max_per_client = max_per_client
+        self.ttl = ttl
+        self.max_holdings = max_holdings
+        self.batch_size = max(1, batch_size)
+        # Least recently accessed first, so expiry only looks at the front
+        self._portfolios: 'OrderedDict[str, SavedPortfolio]' = OrderedDict()
+        self._watchers: Dict[str, Set[str]] = {}
+        self._by_client: Dict[str, Set[str]] = {}
+        self._snapshot: MarketSnapshot = EMPTY_SNAPSHOT
+        # Ids of portfolios holding a changed symbol, in the order they are re-evaluated
+        self._stale: Dict[str, None] = {}
+        self._reevaluation: Optional[asyncio.Task] = None
+        self._refresh_started = 0.0
+        self._reevaluated_since_refresh = 0
+        self._metrics = {
+            'refreshes': 0,
+            'last_changed_symbols': 0,
+            'last_reevaluated': 0,
+            'last_refresh_ms': 0.0,
+            'reevaluated_total': 0,
+            'updates_queued_total': 0,
+            'expired_total': 0,
+        }
+
+    def _evaluate(self, saved: SavedPortfolio, snapshot: MarketSnapshot) -> Dict:
+        result = advisor.analyze_portfolio(saved.portfolio, snapshot.records, snapshot.signals)
+        saved.snapshot_version = snapshot.version
+        return result
+
+    def _touch(self, saved: SavedPortfolio) -> None:
+        saved.last_access = time.monotonic()
+        self._portfolios.move_to_end(saved.id)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop portfolios not accessed within the TTL. Returns how many were dropped."""
+        now = time.monotonic() if now is None else now
+        expired = 0
+        while self._portfolios:
+            saved = next(iter(self._portfolios.values()))
+            if now - saved.last_access < self.ttl:
+                break
+            self.remove(saved.id)
+            expired += 1
+        self._metrics['expired_total'] += expired
+        return expired
+
+    def register(self, portfolio: List[Dict], snapshot: MarketSnapshot,
+                 client: Optional[str] = None) -> SavedPortfolio:
+        """
+        Save a portfolio and evaluate it against the given snapshot.
+
+        Args:
+            portfolio: Holdings to watch
+            snapshot: Snapshot to evaluate against
+            client: Client key the per-client limit is counted under; None for no per-client limit
+
+        Raises:
+            ValueError: When the portfolio has more than max_holdings holdings
+            OverflowError: When the registry or the client's share of it is full
+        """
+        if len(portfolio) > self.max_holdings:
+            raise ValueError(f'Saved portfolios are limited to {self.max_holdings} holdings')
+        self.expire()
+        if len(self._portfolios) >= self.max_portfolios:
+            raise OverflowError('Saved portfolio limit reached')
+        if client is not None and len(self._by_client.get(client, ())) >= self.max_per_client:
+            raise OverflowError('Saved portfolio limit per client reached')
+        if snapshot.version >= self._snapshot.version:
+            self._snapshot = snapshot
+
+        saved = SavedPortfolio(uuid.uuid4().hex[:12], portfolio, client)
+        saved.result = self._evaluate(saved, snapshot)
+        self._portfolios[saved.id] = saved
+        if client is not None:
+            self._by_client.setdefault(client, set()).add(saved.id)
+        for symbol in saved.symbols:
+            self._watchers.setdefault(symbol, set()).add(saved.id)
+        return saved
+
+    def remove(self, portfolio_id: str) -> bool:
+        """Forget a saved portfolio. Returns False if it did not exist."""
+        saved = self._portfolios.pop(portfolio_id, None)
+        if saved is None:
+            return False
+        owned = self._by_client.get(saved.client)
+        if owned is not None:
+            owned.discard(portfolio_id)
+            if not owned:
+                del self._by_client[saved.client]
+        for symbol in saved.symbols:
+            watchers = self._watchers.get(symbol)
+            if watchers is not None:
+                watchers.discard(portfolio_id)
+                if not watchers:
+                    del self._watchers[symbol]
+        if saved.updated is not None:
+            saved.updated.set()  # release long-pollers
+        return True
+
+    def get(self, portfolio_id: str) -> Optional[SavedPortfolio]:
+        self.expire()
+        saved = self._portfolios.get(portfolio_id)
+        if saved is not None:
+            self._touch(saved)
+        return saved
+
+    def on_snapshot(self, snapshot: MarketSnapshot) -> None:
+        """
+        Snapshot listener: mark portfolios holding changed symbols for re-evaluation.
+
+        Inside a running event loop the re-evaluation is left to a background
+        task working in batches; without one it runs before returning.
+        """
+        self._refresh_started = time.perf_counter()
+        self._reevaluated_since_refresh = 0
+        self.expire()
+        previous, self._snapshot = self._snapshot, snapshot
+
+        changed = changed_symbols(previous, snapshot)
+        for symbol in changed:
+            for portfolio_id in self._watchers.get(symbol, ()):
+                self._stale[portfolio_id] = None
+        self._metrics['refreshes'] += 1
+        self._metrics['last_changed_symbols'] = len(changed)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._reevaluate_batch(len(self._stale))
+            self._finish_refresh()
+            return
+        task = self._reevaluation
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._reevaluation = loop.create_task(self._reevaluate_stale())
+
+    async def _reevaluate_stale(self) -> None:
+        while self._stale:
+            self._reevaluate_batch(self.batch_size)
+            await asyncio.sleep(0)
+        self._finish_refresh()
+
+    def _reevaluate_batch(self, limit: int) -> None:
+        """Re-analyze up to limit stale portfolios against the latest snapshot and queue their changes."""
+        snapshot = self._snapshot
+        for _ in range(min(limit, len(self._stale))):
+            portfolio_id = next(iter(self._stale))
+            del self._stale[portfolio_id]
+            saved = self._portfolios.get(portfolio_id)
+            if saved is None:  # removed or expired since the refresh
+                continue
+            result = self._evaluate(saved, snapshot)
+            delta = advice_delta(saved.result.get('advice', []), result['advice'])
+            value_changed = not same_value(result['portfolio_value'], saved.result.get('portfolio_value'))
+            saved.result = result
+            self._reevaluated_since_refresh += 1
+            self._metrics['reevaluated_total'] += 1
+            if delta['added'] or delta['removed'] or value_changed:
+                saved.updates.append({
+                    'snapshot_version': snapshot.version,
+                    'timestamp': snapshot.published_at,
+                    'added': delta['added'],
+                    'removed': delta['removed'],
+                    'portfolio_value': result['portfolio_value'],
+                })
+                self._metrics['updates_queued_total'] += 1
+                if saved.updated is not None:
+                    saved.updated.set()
+
+    def _finish_refresh(self) -> None:
+        self._metrics['last_reevaluated'] = self._reevaluated_since_refresh
+        self._metrics['last_refresh_ms'] = (time.perf_counter() - self._refresh_started) * 1000
+
+    async def drain_updates(self, portfolio_id: str, wait: float = 0.0) -> Optional[List[Dict]]:
+        """
+        Take all queued updates for a portfolio.
+
+        Args:
+            portfolio_id: Saved portfolio id
+            wait: Seconds to wait for an update when none is queued (long-poll)
+
+        Returns:
+            List of updates, or None if the portfolio does not exist
+        """
+        saved = self.get(portfolio_id)
+        if saved is None:
+            return None
+        if not saved.updates and wait > 0:
+            if saved.updated is None:
+                saved.updated = asyncio.Event()
+            saved.updated.clear()
+            try:
+                await asyncio.wait_for(saved.updated.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        if saved.id in self._portfolios:  # not removed while waiting
+            self._touch(saved)
+        updates = list(saved.updates)
+        saved.updates.clear()
+        return updates
+
+    def get_metrics(self) -> Dict:
+        return dict(
+            self._metrics,
+            saved_portfolios=len(self._portfolios),
+            pending_reevaluations=len(self._stale),
+            watched_symbols=len(self._watchers),
+            clients=len(self._by_client),
+        )
+
+
+# Global saved-portfolio registry
+portfolio_watcher = PortfolioWatcher()
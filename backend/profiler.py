@@ -0,0 +1,193 @@
+"""
+Runtime Profiling
+
+Two low-overhead tools for finding where time goes in a running server:
+
+- sample_stacks(): a wall-clock sampling profiler. A background thread reads
+  every thread's current stack via sys._current_frames() at a fixed interval
+  and returns collapsed stacks ("thread;outer;inner count"), the input format
+  of flamegraph.pl and speedscope. This covers the event loop thread
+  (including the market updater task while it runs) and executor threads.
+  Nothing is instrumented, so the app pays only for the sampling thread.
+
+- RequestProfilerMiddleware: when switched on, runs cProfile around one
+  request at a time and keeps a pstats summary of requests slower than a
+  threshold in a bounded in-memory buffer. cProfile observes the event loop
+  thread, so work from requests interleaved with the profiled one is included.
+
+Admin endpoints using these are enabled by setting ADMIN_TOKEN and passing it
+in the X-Admin-Token header.
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+MAX_SAMPLE_SECONDS = 60
+REQUEST_PROFILE_BUFFER = 50   # slow-request profiles kept
+REQUEST_PROFILE_LINES = 25    # functions listed per profile
+
+# Frames where a thread is parked waiting, reported as idle
+IDLE_FUNCTIONS = {'select', 'poll', 'epoll', 'wait', '_wait_for_tstate_lock', 'acquire', 'sleep'}
+
+
+def require_admin(request: Request) -> None:
+    """FastAPI dependency guarding admin endpoints."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail='Admin endpoints are disabled')
+    token = request.headers.get('x-admin-token', '')
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail='Invalid admin token')
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_label(frame))
+        frame = frame.f_back
+    names.append(thread_name)
+    return ';'.join(reversed(names))
+
+
+_sampling_lock = threading.Lock()
+
+
+def sample_stacks(seconds: float, interval: float = 0.005, include_idle: bool = False) -> Dict:
+    """
+    Sample all thread stacks for a while.
+
+    Args:
+        seconds: How long to sample
+        interval: Seconds between samples
+        include_idle: Keep samples of threads parked in select/wait/sleep
+
+    Returns:
+        Dict with 'collapsed' (stack -> count), sample count and elapsed time
+
+    Raises:
+        RuntimeError: If another sampling run is in progress
+    """
+    if not _sampling_lock.acquire(blocking=False):
+        raise RuntimeError('A profile is already being collected')
+    try:
+        own_id = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + min(seconds, MAX_SAMPLE_SECONDS)
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if not include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                stacks[_collapse(frame, names.get(thread_id, f'thread-{thread_id}'))] += 1
+            samples += 1
+            time.sleep(interval)
+        return {
+            'collapsed': dict(stacks),
+            'samples': samples,
+            'elapsed_s': time.perf_counter() - start,
+        }
+    finally:
+        _sampling_lock.release()
+
+
+def format_collapsed(collapsed: Dict[str, int]) -> str:
+    """Render collapsed stacks one per line, heaviest first."""
+    lines = sorted(collapsed.items(), key=lambda item: item[1], reverse=True)
+    return '\n'.join(f'{stack} {count}' for stack, count in lines) + '\n'
+
+
+class RequestProfiler:
+    """Switchable per-request cProfile with a bounded buffer of slow requests."""
+
+    def __init__(self, buffer_size: int = REQUEST_PROFILE_BUFFER):
+        self.enabled = False
+        self.threshold_ms = 200.0
+        self.profiles: deque = deque(maxlen=buffer_size)
+        self._active = False
+        self._metrics = {'profiled': 0, 'captured': 0, 'skipped_busy': 0}
+
+    def configure(self, enabled: bool, threshold_ms: Optional[float] = None) -> Dict:
+        self.enabled = enabled
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        return self.get_status()
+
+    def get_status(self) -> Dict:
+        return dict(self._metrics, enabled=self.enabled, threshold_ms=self.threshold_ms,
+                    buffered=len(self.profiles))
+
+    def get_profiles(self) -> List[Dict]:
+        return list(self.profiles)
+
+    def clear(self) -> None:
+        self.profiles.clear()
+
+    def _record(self, scope: Dict, duration_ms: float, profile: cProfile.Profile) -> None:
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats('cumulative').print_stats(REQUEST_PROFILE_LINES)
+        self.profiles.append({
+            'method': scope.get('method'),
+            'path': scope.get('path'),
+            'duration_ms': duration_ms,
+            'timestamp': time.time(),
+            'profile': out.getvalue(),
+        })
+        self._metrics['captured'] += 1
+
+
+class RequestProfilerMiddleware:
+    """Pure ASGI middleware: a single attribute check per request while disabled."""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if scope['type'] != 'http' or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        if profiler._active:
+            # cProfile hooks the whole thread, so only one request is profiled at a time
+            profiler._metrics['skipped_busy'] += 1
+            await self.app(scope, receive, send)
+            return
+
+        profiler._active = True
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.disable()
+            profiler._active = False
+            profiler._metrics['profiled'] += 1
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= profiler.threshold_ms:
+                profiler._record(scope, duration_ms, profile)
+
+
+# Global request profiler
+request_profiler = RequestProfiler()
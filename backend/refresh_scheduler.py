@@ -0,0 +1,375 @@
+"""
+Refresh Scheduler
+
+Reloads a data file when it changes instead of on a fixed timer.
+
+Changes are detected with inotify (through ctypes, Linux only) on the file's
+directory, or by polling os.stat where inotify is unavailable. Only complete
+files trigger a reload:
+
+- inotify: IN_CLOSE_WRITE (an in-place writer closed the file) and
+  IN_MOVED_TO (a new version was atomically renamed over it); the
+  intermediate IN_MODIFY events of a write in progress are not watched
+- polling: a new (inode, size, mtime) signature is reported only once it has
+  stayed the same for a full poll interval
+
+Append-only sources (see data_source.TailingCsvSource) read complete lines
+only, so for them IN_MODIFY is watched too. A source without a file is only
+refreshed by the maximum interval or by calling its refresh directly.
+
+Bursts of changes are debounced into one reload, reloads are never closer
+together than the minimum interval, and a reload is forced after the maximum
+interval even without a notification, as a safety net for missed events.
+A failed reload is retried with exponential backoff, starting at the minimum
+interval and capped at the maximum, until one succeeds.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------
+# Configuration (overridable through environment variables)
+REFRESH_MIN_INTERVAL = float(os.getenv('MARKET_REFRESH_MIN_INTERVAL', '1.0'))
+REFRESH_MAX_INTERVAL = float(os.getenv('MARKET_REFRESH_MAX_INTERVAL', '300'))
+REFRESH_DEBOUNCE = float(os.getenv('MARKET_REFRESH_DEBOUNCE', '0.2'))
+REFRESH_DEBOUNCE_MAX = float(os.getenv('MARKET_REFRESH_DEBOUNCE_MAX', '2.0'))  # cap for a continuous burst
+REFRESH_POLL_INTERVAL = float(os.getenv('MARKET_REFRESH_POLL_INTERVAL', '1.0'))
+REFRESH_WATCHER = os.getenv('MARKET_REFRESH_WATCHER', 'auto')  # auto, inotify or polling
+
+LATENCY_SAMPLES = 100
+RETRY_MIN_DELAY = 0.1  # floor for the first retry when the minimum interval is zero
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class FileWatcher:
+    """Base for watchers: records the time of the first unconsumed change of a file.
+
+    Used as is when there is no file to watch; it then never reports a change.
+    """
+
+    kind = 'none'
+
+    def __init__(self, path: Optional[str]):
+        self.path = os.path.abspath(path) if path is not None else None
+        self.pending_since: Optional[float] = None
+        self.failed: Optional[str] = None
+        self.notifications = 0
+        self._changed = asyncio.Event()
+
+    def _notify(self, at: float) -> None:
+        self.notifications += 1
+        if self.pending_since is None:
+            self.pending_since = at
+        self._changed.set()
+
+    def _fail(self, reason: str) -> None:
+        self.failed = reason
+        self._changed.set()
+
+    async def wait(self, timeout: Optional[float]) -> Optional[float]:
+        """
+        Wait for a change of the file.
+
+        Args:
+            timeout: Seconds to wait; None waits indefinitely
+
+        Returns:
+            Time of the first change since the last call, or None on timeout
+            (or when the watcher failed; check .failed)
+        """
+        if self.pending_since is None and self.failed is None:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        at, self.pending_since = self.pending_since, None
+        self._changed.clear()
+        return at
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(FileWatcher):
+    """inotify watch on the file's directory, read from the event loop."""
+
+    kind = 'inotify'
+
+    def __init__(self, path: str, on_modify: bool = False):
+        super().__init__(path)
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._name = os.fsencode(os.path.basename(self.path))
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'inotify_init1: {os.strerror(errno)}')
+        # Watch the directory, not the file: an atomic rename replaces the file's inode
+        self._change_mask = IN_CLOSE_WRITE | IN_MOVED_TO | (IN_MODIFY if on_modify else 0)
+        mask = self._change_mask | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+        if libc.inotify_add_watch(self._fd, os.fsencode(os.path.dirname(self.path)), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f'inotify_add_watch: {os.strerror(errno)}')
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._fd, self._read_events)
+
+    def _read_events(self) -> None:
+        now = time.time()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                self._fail(str(e))
+                return
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                _, mask, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset:offset + name_length].rstrip(b'\0')
+                offset += name_length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped; assume the file may have changed
+                    self._notify(now)
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    self._fail('watched directory was removed or moved')
+                elif mask & self._change_mask and name == self._name:
+                    self._notify(now)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            self._loop.remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(FileWatcher):
+    """os.stat polling, for platforms or filesystems without inotify."""
+
+    kind = 'polling'
+
+    def __init__(self, path: str, interval: float = REFRESH_POLL_INTERVAL):
+        super().__init__(path)
+        self.interval = interval
+        self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    def _signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    async def _poll(self) -> None:
+        previous = reported = self._signature()
+        first_seen = time.time()
+        while True:
+            await asyncio.sleep(self.interval)
+            current = self._signature()
+            if current != previous:
+                first_seen = time.time()
+            elif current != reported and current is not None:
+                # Unchanged for a full interval, so the write is complete
+                reported = current
+                self._notify(first_seen)
+            previous = current
+
+    def close(self) -> None:
+        self._task.cancel()
+
+
+def open_watcher(path: Optional[str], kind: str = REFRESH_WATCHER, poll_interval: float = REFRESH_POLL_INTERVAL,
+                 on_modify: bool = False) -> FileWatcher:
+    """
+    Watch a file with inotify, falling back to polling.
+
+    Args:
+        path: File to watch; None gives a watcher that never fires
+        kind: 'auto' (inotify if available), 'inotify' or 'polling'
+        poll_interval: Seconds between stat calls when polling
+        on_modify: Also report in-place modifications (inotify only)
+
+    Returns:
+        A started watcher; must be called from a running event loop
+    """
+    if path is None:
+        return FileWatcher(None)
+    if kind != 'polling':
+        try:
+            return InotifyWatcher(path, on_modify)
+        except (OSError, AttributeError) as e:
+            if kind == 'inotify':
+                raise
+            logger.info(f"inotify unavailable ({e}), polling {path} every {poll_interval}s")
+    return PollingWatcher(path, poll_interval)
+
+
+class RefreshScheduler:
+    """Runs a refresh callback when a file changes, within min/max interval bounds."""
+
+    def __init__(self, path: Optional[str], refresh: Callable[[], Awaitable[bool]],
+                 min_interval: float = REFRESH_MIN_INTERVAL, max_interval: float = REFRESH_MAX_INTERVAL,
+                 debounce: float = REFRESH_DEBOUNCE, debounce_max: float = REFRESH_DEBOUNCE_MAX,
+                 watcher: str = REFRESH_WATCHER, poll_interval: float = REFRESH_POLL_INTERVAL,
+                 on_modify: bool = False):
+        """
+        Args:
+            path: File whose changes trigger a refresh, or None
+            refresh: Coroutine function reloading the file; returns True on success
+            min_interval: Minimum seconds between the starts of two refreshes
+            max_interval: Seconds after which a refresh runs even without a change
+            debounce: Quiet seconds that end a burst of changes
+            debounce_max: Maximum seconds a continuous burst can delay a refresh
+            watcher: 'auto', 'inotify' or 'polling'
+            poll_interval: Seconds between stat calls when polling
+            on_modify: Treat in-place modifications as changes (append-only files)
+        """
+        self.path = path
+        self.refresh = refresh
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.debounce = debounce
+        self.debounce_max = debounce_max
+        self.watcher_kind = watcher
+        self.poll_interval = poll_interval
+        self.on_modify = on_modify
+        self._watcher: Optional[FileWatcher] = None
+        self._last_started_at: Optional[float] = None
+        self._last_success_at: Optional[float] = None
+        self._pending_since: Optional[float] = None
+        # Seconds from the start of a failed refresh to its retry; None after a success
+        self._retry_delay: Optional[float] = None
+        self._latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._metrics = {
+            'refreshes': 0,
+            'failed_refreshes': 0,
+            'startup_refreshes': 0,
+            'change_refreshes': 0,
+            'max_interval_refreshes': 0,
+            'retry_refreshes': 0,
+            'coalesced_changes': 0,
+            'min_interval_delays': 0,
+            'watcher_fallbacks': 0,
+        }
+
+    async def run(self) -> None:
+        """Refresh once, then on every change until cancelled."""
+        self._watcher = open_watcher(self.path, self.watcher_kind, self.poll_interval, self.on_modify)
+        try:
+            await self._refresh('startup')
+            while True:
+                timeout = self._last_started_at + (self._retry_delay or self.max_interval) - time.time()
+                changed_at = await self._watcher.wait(max(0.0, timeout))
+                if self._watcher.failed is not None:
+                    self._fall_back()
+                    continue
+                if changed_at is None:
+                    await self._refresh('max_interval' if self._retry_delay is None else 'retry')
+                    continue
+                # Keep the earliest change still waiting for a successful refresh
+                if self._pending_since is None or changed_at < self._pending_since:
+                    self._pending_since = changed_at
+                await self._settle(changed_at)
+                await self._refresh('change')
+        finally:
+            self._watcher.close()
+
+    def _fall_back(self) -> None:
+        logger.warning(f"File watcher failed ({self._watcher.failed}); polling {self.path} instead")
+        self._watcher.close()
+        self._watcher = PollingWatcher(self.path, self.poll_interval)
+        self._metrics['watcher_fallbacks'] += 1
+
+    async def _settle(self, changed_at: float) -> None:
+        """Absorb further changes until the burst is over and the minimum interval has passed."""
+        burst_deadline = changed_at + self.debounce_max
+        while True:
+            now = time.time()
+            quiet_for = min(self.debounce, burst_deadline - now)
+            if quiet_for <= 0 or await self._watcher.wait(quiet_for) is None:
+                break
+            self._metrics['coalesced_changes'] += 1
+
+        ready_at = self._last_started_at + self.min_interval if self._last_started_at is not None else 0.0
+        if ready_at > time.time():
+            self._metrics['min_interval_delays'] += 1
+            while True:
+                remaining = ready_at - time.time()
+                if remaining <= 0 or await self._watcher.wait(remaining) is None:
+                    break
+                self._metrics['coalesced_changes'] += 1
+
+    async def _refresh(self, trigger: str) -> None:
+        self._last_started_at = time.time()
+        pending_since = self._pending_since
+        ok = await self.refresh()
+        now = time.time()
+        self._metrics['refreshes'] += 1
+        if not ok:
+            # The change stays pending, so staleness keeps growing until a retry succeeds
+            self._metrics['failed_refreshes'] += 1
+            delay = self._retry_delay * 2 if self._retry_delay else max(self.min_interval, RETRY_MIN_DELAY)
+            self._retry_delay = min(delay, self.max_interval)
+            logger.warning(f"Refresh ({trigger}) failed; retrying in {self._retry_delay:.1f}s")
+            return
+        self._metrics[f'{trigger}_refreshes'] += 1
+        self._retry_delay = None
+        self._last_success_at = now
+        if pending_since is not None:
+            self._latencies.append(now - pending_since)
+        self._pending_since = None
+
+    def staleness_seconds(self, now: Optional[float] = None) -> float:
+        """Seconds since the earliest change of the file not yet reflected by a successful refresh."""
+        now = time.time() if now is None else now
+        pending = [at for at in (self._pending_since, self._watcher.pending_since if self._watcher else None)
+                   if at is not None]
+        return max(0.0, now - min(pending)) if pending else 0.0
+
+    def get_metrics(self) -> Dict:
+        """Get refresh counters, staleness and reaction latency (change seen to snapshot published)."""
+        latencies = list(self._latencies)
+        return dict(
+            self._metrics,
+            watcher=self._watcher.kind if self._watcher is not None else None,
+            change_notifications=self._watcher.notifications if self._watcher is not None else 0,
+            min_interval_s=self.min_interval,
+            max_interval_s=self.max_interval,
+            debounce_s=self.debounce,
+            retry_delay_s=self._retry_delay,
+            staleness_seconds=self.staleness_seconds(),
+            seconds_since_refresh=time.time() - self._last_success_at if self._last_success_at else None,
+            reaction_latency_ms={
+                'samples': len(latencies),
+                'last': latencies[-1] * 1000 if latencies else None,
+                'mean': sum(latencies) / len(latencies) * 1000 if latencies else None,
+                'max': max(latencies) * 1000 if latencies else None,
+            },
+        )
@@ -0,0 +1,133 @@
+"""
+Capture Replay
+
+Reruns requests recorded by capture.py against advisor.analyze_portfolio as
+fast as possible, checks every output against the recorded digest and
+reports throughput. Use it to validate that an optimization changes nothing
+but speed on production-shaped portfolios.
+
+Usage:
+    python replay.py /var/lib/stock-sense/capture
+    python replay.py capture/ --mode reference --repeat 5 --json replay.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import advisor
+import capture
+from snapshot import MarketSnapshot
+
+
+def load_requests(directory: str, limit: Optional[int] = None) -> Tuple[List[Tuple], Dict[str, MarketSnapshot]]:
+    """
+    Read captured requests and the snapshots they reference.
+
+    Args:
+        directory: CAPTURE_DIR of the recording server
+        limit: Stop after this many requests
+
+    Returns:
+        ([(snapshot_digest, portfolio, output_digest), ...], {snapshot_digest: MarketSnapshot})
+    """
+    requests = []
+    snapshots: Dict[str, MarketSnapshot] = {}
+    for path in capture.log_files(directory):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                snapshot_digest = entry['s']
+                if snapshot_digest not in snapshots:
+                    with open(capture.snapshot_path(directory, snapshot_digest), 'r', encoding='utf-8') as sf:
+                        stored = json.load(sf)
+                    snapshots[snapshot_digest] = MarketSnapshot(stored['records'], stored['version'])
+                portfolio = [{'symbol': symbol, 'quantity': quantity} for symbol, quantity in entry['p']]
+                requests.append((snapshot_digest, portfolio, entry['o']))
+                if limit is not None and len(requests) >= limit:
+                    return requests, snapshots
+    return requests, snapshots
+
+
+def replay(requests: List[Tuple], snapshots: Dict[str, MarketSnapshot], mode: str = 'signals',
+           repeat: int = 1, verify: bool = True) -> Dict:
+    """
+    Run captured requests back to back.
+
+    Args:
+        requests: Output of load_requests
+        snapshots: Output of load_requests
+        mode: 'signals' (precomputed signal table, as the server runs) or 'reference'
+        repeat: Passes over the requests; only the first is verified
+        verify: Compare output digests with the recorded ones
+
+    Returns:
+        Dict with request/holding counts, mismatches, elapsed time and throughput
+    """
+    mismatches = []
+    holdings = sum(len(portfolio) for _, portfolio, _ in requests)
+
+    start = time.perf_counter()
+    for rep in range(repeat):
+        check = verify and rep == 0
+        for index, (snapshot_digest, portfolio, expected) in enumerate(requests):
+            snapshot = snapshots[snapshot_digest]
+            if mode == 'signals':
+                result = advisor.analyze_portfolio(portfolio, snapshot.records, snapshot.signals)
+            else:
+                result = advisor.analyze_portfolio(portfolio, snapshot.records)
+            if check and capture.digest(result) != expected:
+                mismatches.append(index)
+    elapsed = time.perf_counter() - start
+
+    total = len(requests) * repeat
+    return {
+        'mode': mode,
+        'requests': len(requests),
+        'snapshots': len(snapshots),
+        'repeat': repeat,
+        'verified': verify,
+        'mismatches': len(mismatches),
+        'first_mismatches': mismatches[:10],
+        'elapsed_s': elapsed,
+        'requests_per_s': total / elapsed if elapsed > 0 else 0.0,
+        'holdings_per_s': holdings * repeat / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Replay captured /api/analyze requests offline')
+    parser.add_argument('directory', help='Capture directory (CAPTURE_DIR of the recording server)')
+    parser.add_argument('--mode', choices=['signals', 'reference'], default='signals',
+                        help='Analysis path to exercise')
+    parser.add_argument('--repeat', type=int, default=1, help='Passes over the captured requests')
+    parser.add_argument('--limit', type=int, help='Replay at most this many requests')
+    parser.add_argument('--no-verify', action='store_true', help='Skip output digest checks')
+    parser.add_argument('--json', dest='json_path', help='Write the report to this file')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    args = build_arg_parser().parse_args(argv)
+    requests, snapshots = load_requests(args.directory, args.limit)
+    report = replay(requests, snapshots, args.mode, max(1, args.repeat), not args.no_verify)
+
+    print(f"Replayed {report['requests']} requests x{report['repeat']} against "
+          f"{report['snapshots']} snapshots ({report['mode']} path)")
+    print(f"  {report['requests_per_s']:.0f} req/s, {report['holdings_per_s']:.0f} holdings/s "
+          f"in {report['elapsed_s']:.3f}s")
+    if report['verified']:
+        print(f"  mismatches: {report['mismatches']}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main()['mismatches'] else 0)
@@ -0,0 +1,133 @@
+"""
+Market Screener
+
+Sorted indexes over a snapshot's numeric fields, overall and per sector, so
+range filters, top-k and paginated screens cost a binary search plus the
+rows returned instead of a scan and sort of the whole universe.
+"""
+
+import bisect
+import math
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+
+SCREEN_FIELDS = ('change_1d_pct', 'change_7d_pct', 'volatility', 'market_cap_cr')
+MAX_SCREEN_LIMIT = 500
+
+
+def _column(records: Sequence[Dict], field: str) -> List:
+    if hasattr(records, 'column') and field in records.layout.positions:
+        return records.column(field)
+    return [record.get(field) for record in records]
+
+
+class SortedIndex:
+    """
+    Row positions ordered by one numeric field; rows with a missing/NaN value are left out.
+
+    Positions and their sorted values are kept in typed arrays (4 + 8 bytes per
+    row); records are looked up in the snapshot only for the page returned.
+    """
+
+    __slots__ = ('keys', 'positions', 'records')
+
+    def __init__(self, records: Sequence[Dict], values: List, positions: Optional[List[int]] = None):
+        if positions is None:
+            positions = range(len(values))
+        rows = [
+            position for position in positions
+            if isinstance(values[position], (int, float)) and not math.isnan(values[position])
+        ]
+        rows.sort(key=values.__getitem__)
+        self.keys = array('d', [values[position] for position in rows])
+        self.positions = array('i', rows)
+        self.records = records
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.keys) + sys.getsizeof(self.positions)
+
+    def query(self, min_value: Optional[float], max_value: Optional[float],
+              descending: bool, offset: int, limit: int) -> Dict:
+        """
+        Rows with min_value <= value <= max_value, in order, from offset.
+
+        Returns:
+            Dict with 'total' rows in range and the page of 'records'
+        """
+        lo = 0 if min_value is None else bisect.bisect_left(self.keys, min_value)
+        hi = len(self.keys) if max_value is None else bisect.bisect_right(self.keys, max_value)
+        total = max(0, hi - lo)
+        if descending:
+            stop = hi - offset
+            start = max(lo, stop - limit)
+            page = self.positions[start:stop][::-1] if stop > lo else []
+        else:
+            start = lo + offset
+            page = self.positions[start:min(hi, start + limit)]
+        records = self.records
+        return {'total': total, 'records': [records[position] for position in page]}
+
+
+class ScreenIndex:
+    """Per-field sorted indexes over a whole snapshot and each sector."""
+
+    def __init__(self, records: Sequence[Dict]):
+        by_sector: Dict[str, List[int]] = {}
+        for position, sector in enumerate(_column(records, 'sector')):
+            by_sector.setdefault(sector, []).append(position)
+
+        self.sectors = sorted(sector for sector in by_sector if isinstance(sector, str))
+        columns = {field: _column(records, field) for field in SCREEN_FIELDS}
+        self._all = {field: SortedIndex(records, columns[field]) for field in SCREEN_FIELDS}
+        self._by_sector = {
+            sector: {field: SortedIndex(records, columns[field], positions) for field in SCREEN_FIELDS}
+            for sector, positions in by_sector.items()
+        }
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the index (records belong to the snapshot and are not counted)."""
+        indexes = list(self._all.values())
+        for sector_indexes in self._by_sector.values():
+            indexes.extend(sector_indexes.values())
+        containers = [self, self.sectors, self._all, self._by_sector, *self._by_sector.values()]
+        return sum(index.nbytes() for index in indexes) + sum(map(sys.getsizeof, containers))
+
+    def screen(self, field: str, sector: Optional[str] = None, min_value: Optional[float] = None,
+               max_value: Optional[float] = None, order: str = 'desc', offset: int = 0,
+               limit: int = 20) -> Dict:
+        """
+        Screen the snapshot on one indexed field.
+
+        Args:
+            field: One of SCREEN_FIELDS
+            sector: Restrict to one sector (exact match)
+            min_value: Inclusive lower bound
+            max_value: Inclusive upper bound
+            order: 'desc' (top-k largest first) or 'asc'
+            offset: Rows to skip, for pagination
+            limit: Page size
+
+        Returns:
+            Dict with the total matching rows and the requested page of records
+
+        Raises:
+            ValueError: For an unknown field or order
+        """
+        if field not in SCREEN_FIELDS:
+            raise ValueError(f"field must be one of {list(SCREEN_FIELDS)}")
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+
+        if sector is None:
+            index = self._all[field]
+        else:
+            indexes = self._by_sector.get(sector)
+            if indexes is None:
+                return {'total': 0, 'records': []}
+            index = indexes[field]
+        return index.query(min_value, max_value, order == 'desc', offset, limit)
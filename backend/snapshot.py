@@ -0,0 +1,215 @@
+"""
+Market Snapshot
+
+An immutable, versioned view of the market universe as published by the
+market updater, together with structures derived from it once at publish
+time so that requests don't recompute them.
+
+Records live in a columnar MarketStore. Consecutive snapshots share the
+store chunks of rows whose data did not change (and the symbol lookups when
+no symbol moved), so a history of snapshots costs memory in proportion to
+churn rather than to history length times universe size. Derived structures
+hold typed arrays of row positions rather than per-row objects.
+"""
+
+import bisect
+import json
+import sys
+import time
+from collections import deque
+from typing import Dict, List, Optional, Union
+
+from advisor import SignalTable, build_signal_table, signal_table_nbytes
+from market_store import MarketStore
+from screener import ScreenIndex
+from symbol_search import SymbolSearchIndex
+
+
+class MarketSnapshot:
+    """One published version of the market data. Treat as read-only."""
+
+    def __init__(self, data: Union[MarketStore, List[Dict]], version: int, published_at: Optional[float] = None,
+                 previous: Optional['MarketSnapshot'] = None):
+        if not isinstance(data, MarketStore):
+            data = MarketStore.from_records(data, previous.store if previous is not None else None)
+        self.store = data
+        # Sequence of read-only StockRow views, usable wherever a list of records was
+        self.records = data
+        self.version = version
+        self.published_at = time.time() if published_at is None else published_at
+        self.signals: SignalTable = build_signal_table(
+            data, previous.signals if previous is not None else None
+        )
+        self._screen_index: Optional[ScreenIndex] = None
+        self._market_json: Optional[bytes] = None
+        # Set once a newer snapshot is published; history snapshots keep no lazily built caches
+        self.superseded = False
+        # Shared with the previous snapshot when no symbol or name changed
+        self.search_index = SymbolSearchIndex.from_records(
+            data, previous.search_index if previous is not None else None
+        )
+
+    def __getstate__(self) -> Dict:
+        # Lazily built indexes and cached JSON are rebuilt on demand rather than pickled to pool workers
+        state = self.__dict__.copy()
+        state['_screen_index'] = None
+        state['_market_json'] = None
+        return state
+
+    def market_json(self, cache: bool = True) -> bytes:
+        """
+        The /api/market payload, serialized once per snapshot.
+
+        Args:
+            cache: Keep the bytes on the snapshot (done for the latest snapshot only,
+                so that retained history does not hold serialized copies)
+        """
+        if self._market_json is not None:
+            return self._market_json
+        body = json.dumps(self.store.to_records(json_safe=True), ensure_ascii=False,
+                          allow_nan=False, separators=(',', ':')).encode('utf-8')
+        if cache and not self.superseded:
+            self._market_json = body
+        return body
+
+    @property
+    def screen_index(self) -> ScreenIndex:
+        """
+        Sorted per-field indexes, built on first use (at publish for the latest snapshot).
+
+        Superseded snapshots build them per call for as_of queries and do not keep them.
+        """
+        if self._screen_index is not None:
+            return self._screen_index
+        index = ScreenIndex(self.records)
+        if not self.superseded:
+            self._screen_index = index
+        return index
+
+    def supersede(self) -> None:
+        """Mark the snapshot as replaced by a newer one and drop its lazily built indexes and cached JSON."""
+        self.superseded = True
+        self._screen_index = None
+        self._market_json = None
+
+    def memory_report(self) -> Dict:
+        """
+        Approximate bytes held by this snapshot: the store (see MarketStore.memory_report)
+        plus the signal table, symbol search index, screen index and cached /api/market JSON.
+        """
+        report = self.store.memory_report()
+        parts = {
+            'store_bytes': report['total_bytes'],
+            'signals_bytes': signal_table_nbytes(self.signals),
+            'search_index_bytes': self.search_index.nbytes(),
+            'screen_index_bytes': self._screen_index.nbytes() if self._screen_index is not None else 0,
+            'market_json_bytes': len(self._market_json) if self._market_json is not None else 0,
+        }
+        total = sum(parts.values())
+        symbols = report['symbols']
+        report.update(parts)
+        report['total_bytes'] = total
+        report['bytes_per_symbol'] = total / symbols if symbols else 0.0
+        report['store_bytes_per_symbol'] = parts['store_bytes'] / symbols if symbols else 0.0
+        return report
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """Record for a symbol, or None."""
+        position = self.signals.positions.get(symbol)
+        return self.records[position] if position is not None else None
+
+
+# Placeholder published before the first load
+EMPTY_SNAPSHOT = MarketSnapshot([], version=0, published_at=0.0)
+
+
+class SnapshotHistory:
+    """Bounded history of published snapshots, looked up by version or time."""
+
+    def __init__(self, max_snapshots: int):
+        self.max_snapshots = max(1, max_snapshots)
+        self._snapshots: deque = deque(maxlen=self.max_snapshots)
+
+    def add(self, snapshot: MarketSnapshot) -> None:
+        self._snapshots.append(snapshot)
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def versions(self) -> List[int]:
+        return [snapshot.version for snapshot in self._snapshots]
+
+    def get_version(self, version: int) -> Optional[MarketSnapshot]:
+        """Snapshot with this version, or None if it is not retained."""
+        if not self._snapshots:
+            return None
+        index = version - self._snapshots[0].version
+        # Versions are consecutive unless a refresh failed, so try the direct index first
+        if 0 <= index < len(self._snapshots) and self._snapshots[index].version == version:
+            return self._snapshots[index]
+        for snapshot in self._snapshots:
+            if snapshot.version == version:
+                return snapshot
+        return None
+
+    def at_time(self, timestamp: float) -> Optional[MarketSnapshot]:
+        """Snapshot that was current at a unix time, or None if older than the history."""
+        published = [snapshot.published_at for snapshot in self._snapshots]
+        index = bisect.bisect_right(published, timestamp) - 1
+        return self._snapshots[index] if index >= 0 else None
+
+    def memory_report(self) -> Dict:
+        """
+        Estimate memory held by the history and what it would cost without sharing.
+
+        Store chunks, signal position maps and search indexes shared between
+        snapshots are counted once; the per-snapshot chunk lists and signal
+        masks are counted for every snapshot. Cached JSON and screen indexes
+        are only held by the latest snapshot and are not included.
+        """
+        unique: Dict[int, int] = {}
+        referenced = 0
+        unique_rows = 0
+        container_bytes = 0
+        unshared_bytes = 0
+        seen_signals: set = set()
+        signals_bytes = 0
+        search_indexes: Dict[int, int] = {}
+        unshared_derived_bytes = 0
+        for snapshot in self._snapshots:
+            store = snapshot.store
+            referenced += len(store)
+            container_bytes += sys.getsizeof(store.chunks)
+            for chunk in store.chunks:
+                size = unique.get(id(chunk))
+                if size is None:
+                    size = unique[id(chunk)] = chunk.nbytes()
+                    unique_rows += chunk.length
+                unshared_bytes += size
+            signals_bytes += signal_table_nbytes(snapshot.signals, seen_signals)
+            unshared_derived_bytes += signal_table_nbytes(snapshot.signals)
+            index_bytes = search_indexes.get(id(snapshot.search_index))
+            if index_bytes is None:
+                index_bytes = search_indexes[id(snapshot.search_index)] = snapshot.search_index.nbytes()
+            unshared_derived_bytes += index_bytes
+
+        unique_bytes = sum(unique.values())
+        derived_bytes = signals_bytes + sum(search_indexes.values())
+        return {
+            'snapshots': len(self._snapshots),
+            'max_snapshots': self.max_snapshots,
+            'oldest_version': self._snapshots[0].version if self._snapshots else None,
+            'newest_version': self._snapshots[-1].version if self._snapshots else None,
+            'records_referenced': referenced,
+            'records_unique': unique_rows,
+            'chunks_unique': len(unique),
+            'record_bytes': unique_bytes,
+            'signals_bytes': signals_bytes,
+            'search_index_bytes': derived_bytes - signals_bytes,
+            'container_bytes': container_bytes,
+            'estimated_bytes': unique_bytes + derived_bytes + container_bytes,
+            'estimated_bytes_without_sharing': unshared_bytes + unshared_derived_bytes + container_bytes,
+        }
@@ -0,0 +1,231 @@
+"""
+Symbol Search
+
+Case-insensitive prefix index over stock symbols and name tokens, used for
+autocomplete. Tokens live in three sorted arrays (parallel lists of interned
+tokens and their symbols, so an entry costs two list slots), searched in
+rank order:
+
+    1. symbols            ("inf" -> INFY, "bajaja" -> BAJAJ-AUTO)
+    2. first name token   ("tata" -> TCS, "Tata Consultancy Services")
+    3. other name tokens  ("cons" -> TCS)
+
+Within a rank, matches come out in token order, so a query walks only its
+bisected range until it has `limit` symbols. With several terms, the term
+with the fewest matching tokens drives the walk and every other term must
+prefix-match one of the symbol's tokens, which are re-derived from the name
+for the symbols walked rather than stored.
+
+The index depends only on (symbol, name) pairs. A new snapshot reuses the
+previous index outright when those are unchanged (the usual price-only
+refresh), patches a copy of it when few symbols changed, and rebuilds from
+scratch otherwise.
+"""
+
+import bisect
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+
+MAX_SEARCH_LIMIT = 50
+INCREMENTAL_MAX_FRACTION = 0.1  # changed symbols above this fraction trigger a full rebuild
+
+RANK_SYMBOL = 0
+RANK_NAME_FIRST = 1
+RANK_NAME_OTHER = 2
+
+_TOKEN_SPLIT = re.compile(r'[^0-9a-z]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case alphanumeric tokens of a string."""
+    return [token for token in _TOKEN_SPLIT.split(text.lower()) if token]
+
+
+def symbol_token(symbol: str) -> str:
+    """A symbol normalized like name tokens: lower-case, punctuation dropped ("M&M" -> "mm")."""
+    return ''.join(tokenize(symbol))
+
+
+def _symbol_tokens(symbol: str, name: str) -> Tuple[str, ...]:
+    return (symbol_token(symbol), *tokenize(name))
+
+
+def _entries(symbol: str, name: str) -> List[Tuple[int, Tuple[str, str]]]:
+    """(rank, (token, symbol)) pairs indexed for one symbol; tokens are interned, as words repeat across names."""
+    entries = [(RANK_SYMBOL, (sys.intern(symbol_token(symbol)), symbol))]
+    for position, token in enumerate(tokenize(name)):
+        entries.append((RANK_NAME_FIRST if position == 0 else RANK_NAME_OTHER, (sys.intern(token), symbol)))
+    return entries
+
+
+class _TokenArray:
+    """Entries (token, symbol) sorted by token then symbol, kept as two parallel lists."""
+
+    __slots__ = ('tokens', 'symbols')
+
+    def __init__(self, entries: List[Tuple[str, str]]):
+        entries.sort()
+        self.tokens = [token for token, _ in entries]
+        self.symbols = [symbol for _, symbol in entries]
+
+    def copy(self) -> '_TokenArray':
+        array = _TokenArray([])
+        array.tokens = list(self.tokens)
+        array.symbols = list(self.symbols)
+        return array
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def _position(self, token: str, symbol: str) -> int:
+        lo = bisect.bisect_left(self.tokens, token)
+        hi = bisect.bisect_right(self.tokens, token, lo)
+        return bisect.bisect_left(self.symbols, symbol, lo, hi)
+
+    def insert(self, token: str, symbol: str) -> None:
+        position = self._position(token, symbol)
+        self.tokens.insert(position, token)
+        self.symbols.insert(position, symbol)
+
+    def remove(self, token: str, symbol: str) -> None:
+        position = self._position(token, symbol)
+        if position < len(self.tokens) and self.tokens[position] == token and self.symbols[position] == symbol:
+            del self.tokens[position]
+            del self.symbols[position]
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        # Symbols and name tokens are both normalized by tokenize() to [0-9a-z], so '{'
+        # sorts after every continuation of the prefix
+        return bisect.bisect_left(self.tokens, prefix), bisect.bisect_left(self.tokens, prefix + '{')
+
+    def nbytes(self) -> int:
+        # Symbols are shared with the store; tokens are counted by SymbolSearchIndex.nbytes
+        return sys.getsizeof(self) + sys.getsizeof(self.tokens) + sys.getsizeof(self.symbols)
+
+
+def names_from_records(records: List[Dict]) -> Dict[str, str]:
+    """symbol -> name for a snapshot; the first record wins for duplicate symbols."""
+    if hasattr(records, 'column') and {'symbol', 'name'} <= set(records.layout.fields):
+        # Columnar store: read the two columns instead of going through row views
+        pairs = zip(records.column('symbol'), records.column('name'))
+    else:
+        pairs = ((record.get('symbol'), record.get('name')) for record in records)
+    names: Dict[str, str] = {}
+    for symbol, name in pairs:
+        if isinstance(symbol, str) and symbol not in names:
+            names[symbol] = name if isinstance(name, str) else ''
+    return names
+
+
+class SymbolSearchIndex:
+    """Immutable prefix index; build with from_records()."""
+
+    def __init__(self, names: Dict[str, str], arrays: Optional[List[_TokenArray]] = None):
+        self.names = names
+        if arrays is None:
+            entries: List[List[Tuple[str, str]]] = [[], [], []]
+            for symbol, name in names.items():
+                for rank, entry in _entries(symbol, name):
+                    entries[rank].append(entry)
+            arrays = [_TokenArray(rank_entries) for rank_entries in entries]
+        self._arrays = arrays
+        self.build_mode = 'full'
+        self.build_ms = 0.0
+
+    @classmethod
+    def from_records(cls, records: List[Dict], previous: Optional['SymbolSearchIndex'] = None) -> 'SymbolSearchIndex':
+        """
+        Index a snapshot, reusing or patching the previous snapshot's index when possible.
+
+        Args:
+            records: Snapshot records
+            previous: Index of the previous snapshot
+
+        Returns:
+            The previous index itself if no symbol or name changed, else a new index
+        """
+        start = time.perf_counter()
+        names = names_from_records(records)
+        if previous is not None and previous.names == names:
+            return previous
+
+        index = None
+        if previous is not None:
+            removed = {symbol for symbol, name in previous.names.items() if names.get(symbol) != name}
+            added = {symbol: name for symbol, name in names.items() if previous.names.get(symbol) != name}
+            if len(removed) + len(added) <= max(1, len(names)) * INCREMENTAL_MAX_FRACTION:
+                index = previous._patched(names, removed, added)
+                index.build_mode = 'incremental'
+        if index is None:
+            index = cls(names)
+        index.build_ms = (time.perf_counter() - start) * 1000
+        return index
+
+    def _patched(self, names: Dict[str, str], removed: Set[str], added: Dict[str, str]) -> 'SymbolSearchIndex':
+        arrays = [array.copy() for array in self._arrays]
+        for symbol in removed:
+            for rank, (token, _) in _entries(symbol, self.names[symbol]):
+                arrays[rank].remove(token, symbol)
+        for symbol, name in added.items():
+            for rank, (token, _) in _entries(symbol, name):
+                arrays[rank].insert(token, symbol)
+        return SymbolSearchIndex(names, arrays)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        """
+        Ranked symbols matching every term of the query as a prefix.
+
+        Args:
+            query: Free text, e.g. "inf" or "tata cons"
+            limit: Maximum symbols to return
+
+        Returns:
+            Symbols, best match first
+        """
+        terms = tokenize(query)
+        if not terms or limit <= 0:
+            return []
+        # The term with the fewest matching tokens drives the scan; the others filter it
+        ranges = [[array.prefix_range(term) for array in self._arrays] for term in terms]
+        driver_position = min(range(len(terms)), key=lambda i: sum(hi - lo for lo, hi in ranges[i]))
+        others = terms[:driver_position] + terms[driver_position + 1:]
+
+        found: List[str] = []
+        seen: Set[str] = set()
+        for array, (lo, hi) in zip(self._arrays, ranges[driver_position]):
+            symbols = array.symbols
+            for position in range(lo, hi):
+                symbol = symbols[position]
+                if symbol in seen:
+                    continue
+                tokens = _symbol_tokens(symbol, self.names[symbol]) if others else ()
+                if all(any(t.startswith(term) for t in tokens) for term in others):
+                    seen.add(symbol)
+                    found.append(symbol)
+                    if len(found) >= limit:
+                        return found
+        return found
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the index (distinct token strings counted once)."""
+        total = sys.getsizeof(self) + sys.getsizeof(self.names) + sys.getsizeof(self._arrays)
+        tokens = {}
+        for array in self._arrays:
+            total += array.nbytes()
+            for token in array.tokens:
+                tokens[id(token)] = token
+        return total + sum(sys.getsizeof(token) for token in tokens.values())
+
+    def get_stats(self) -> Dict:
+        return {
+            'symbols': len(self.names),
+            'tokens': sum(len(array) for array in self._arrays),
+            'build_mode': self.build_mode,
+            'build_ms': self.build_ms,
+        }
@@ -0,0 +1,224 @@
+"""
+Usage Rollups
+
+Incrementally aggregates usage and billing events into per-minute, per-hour
+and per-day buckets. Each resolution is a fixed-size ring, so memory is
+constant and recording an event is O(1). Range queries cost O(buckets in the
+range), independent of how many events were recorded, and ranges are clamped
+to the retained window so a query never visits more buckets than one ring holds.
+"""
+
+import json
+import math
+import os
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# resolution name -> (bucket width in seconds, number of buckets kept)
+RESOLUTIONS = {
+    'minute': (60, 24 * 60),      # last 24 hours
+    'hour': (3600, 30 * 24),      # last 30 days
+    'day': (86400, 366),          # last year
+}
+
+EMPTY = -1  # bucket start marker for unused slots
+
+
+class RingSeries:
+    """Fixed-size ring of time buckets at one resolution."""
+
+    def __init__(self, width: int, slots: int):
+        self.width = width
+        self.slots = slots
+        self.starts = array('q', [EMPTY]) * slots
+        self.portfolios = array('q', [0]) * slots
+        self.advice = array('q', [0]) * slots
+        self.revenue = array('d', [0.0]) * slots
+
+    def _slot(self, bucket_start: int) -> int:
+        return (bucket_start // self.width) % self.slots
+
+    def add(self, ts: float, portfolios: int, advice: int, revenue: float) -> None:
+        """Add an event at unix time ts to its bucket, recycling the slot if it held an older bucket."""
+        bucket_start = int(ts // self.width) * self.width
+        i = self._slot(bucket_start)
+        if self.starts[i] != bucket_start:
+            if self.starts[i] > bucket_start:
+                return  # older than the ring's retention window
+            self.starts[i] = bucket_start
+            self.portfolios[i] = 0
+            self.advice[i] = 0
+            self.revenue[i] = 0.0
+        self.portfolios[i] += portfolios
+        self.advice[i] += advice
+        self.revenue[i] += revenue
+
+    def retention_start(self, now: float) -> int:
+        """Start of the oldest bucket still retained at time now."""
+        return (int(now // self.width) - self.slots + 1) * self.width
+
+    def clamp(self, start: float, end: float, now: float) -> Tuple[int, int]:
+        """
+        First and last bucket start of [start, end] that can hold data at time now.
+
+        Buckets older than retention or later than now are always empty, so
+        iteration never leaves the ring's window however wide the range is.
+        """
+        first = max(int(start // self.width) * self.width, self.retention_start(now))
+        last = int(min(end, now) // self.width) * self.width
+        return first, last
+
+    def iter_buckets(self, start: float, end: float, now: Optional[float] = None) -> Iterator[Tuple]:
+        """
+        Yield (bucket_start, portfolios, advice, revenue) for the retained buckets
+        covering [start, end], including empty ones. At most `slots` buckets.
+        """
+        first, last = self.clamp(start, end, end if now is None else now)
+        for bucket_start in range(first, last + 1, self.width):
+            i = self._slot(bucket_start)
+            if self.starts[i] == bucket_start:
+                yield bucket_start, self.portfolios[i], self.advice[i], self.revenue[i]
+            else:
+                yield bucket_start, 0, 0, 0.0
+
+    def buckets(self, start: float, end: float, now: Optional[float] = None) -> List[List]:
+        """
+        Buckets covering [start, end], including empty ones.
+
+        Returns:
+            List of [bucket_start, portfolios, advice, revenue]
+        """
+        return [list(bucket) for bucket in self.iter_buckets(start, end, now)]
+
+    def to_compact(self) -> Dict:
+        """Serialize only the occupied slots as parallel lists."""
+        used = [i for i in range(self.slots) if self.starts[i] != EMPTY]
+        return {
+            'starts': [self.starts[i] for i in used],
+            'portfolios': [self.portfolios[i] for i in used],
+            'advice': [self.advice[i] for i in used],
+            'revenue': [round(self.revenue[i], 4) for i in used],
+        }
+
+    def load_compact(self, data: Dict) -> None:
+        """Restore slots saved by to_compact."""
+        for start, portfolios, advice, revenue in zip(
+                data['starts'], data['portfolios'], data['advice'], data['revenue']):
+            i = self._slot(start)
+            if self.starts[i] == EMPTY or self.starts[i] < start:
+                self.starts[i] = start
+                self.portfolios[i] = portfolios
+                self.advice[i] = advice
+                self.revenue[i] = revenue
+
+
+class UsageRollup:
+    """Usage counters bucketed at several resolutions."""
+
+    def __init__(self):
+        self.series = {name: RingSeries(width, slots) for name, (width, slots) in RESOLUTIONS.items()}
+
+    def record(self, portfolios: int, advice: int, revenue: float, ts: Optional[float] = None) -> None:
+        """Record one usage event into every resolution."""
+        ts = time.time() if ts is None else ts
+        for series in self.series.values():
+            series.add(ts, portfolios, advice, revenue)
+
+    def choose_resolution(self, start: float, end: float, max_points: int, now: float) -> str:
+        """
+        Pick the coarsest resolution that still yields about max_points buckets,
+        among those that retain data back to start.
+        """
+        covering = [name for name, series in self.series.items() if series.retention_start(now) <= start]
+        if not covering:
+            return 'day'
+        target_width = (end - start) / max_points
+        fitting = [name for name in covering if self.series[name].width <= target_width]
+        if fitting:
+            return max(fitting, key=lambda name: self.series[name].width)
+        return min(covering, key=lambda name: self.series[name].width)
+
+    def query(self, start: float, end: float, resolution: Optional[str] = None,
+              max_points: int = 120, now: Optional[float] = None) -> Dict:
+        """
+        Range query with automatic downsampling.
+
+        Args:
+            start: Range start (unix seconds)
+            end: Range end (unix seconds)
+            resolution: 'minute', 'hour' or 'day'; chosen automatically when None
+            max_points: Upper bound on returned points; adjacent buckets are merged to fit
+
+        Returns:
+            Dict with the resolution used, effective bucket width and the points
+        """
+        now = time.time() if now is None else now
+        if resolution is None:
+            resolution = self.choose_resolution(start, end, max_points, now)
+        series = self.series[resolution]
+
+        # Buckets are merged into points as they are visited; the range is
+        # clamped to the retained window, so no query walks more than one ring
+        first, last = series.clamp(start, end, now)
+        count = max(0, (last - first) // series.width + 1)
+        group = max(1, math.ceil(count / max_points))
+        points = []
+        point = None
+        for n, (bucket_start, portfolios, advice, revenue) in enumerate(series.iter_buckets(start, end, now)):
+            if n % group == 0:
+                point = {'ts': bucket_start, 'portfolios': 0, 'advice': 0, 'revenue': 0.0}
+                points.append(point)
+            point['portfolios'] += portfolios
+            point['advice'] += advice
+            point['revenue'] += revenue
+        for point in points:
+            point['revenue'] = round(point['revenue'], 4)
+
+        return {
+            'resolution': resolution,
+            'bucket_seconds': series.width * group,
+            'start': start,
+            'end': end,
+            'points': points,
+        }
+
+    def recent(self, seconds: float, resolution: Optional[str] = None, max_points: int = 120,
+               now: Optional[float] = None) -> Dict:
+        """
+        Query the last `seconds` aligned to whole buckets.
+
+        The window ends (exclusive) where the bucket holding now ends and spans
+        a whole number of buckets, so the last 24 hours at hourly resolution
+        are 24 points rather than 25 partly covered ones.
+
+        Returns:
+            Same as query(), with 'end' the exclusive end of the window
+        """
+        now = time.time() if now is None else now
+        if resolution is None:
+            resolution = self.choose_resolution(now - seconds, now, max_points, now)
+        width = self.series[resolution].width
+        end = (int(now // width) + 1) * width
+        start = end - max(1, round(seconds / width)) * width
+        return self.query(start, end, resolution, max_points, now)
+
+    def save(self, path: str) -> None:
+        """Persist all rings compactly; written to a temp file and renamed into place."""
+        payload = {name: series.to_compact() for name, series in self.series.items()}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        """Load rings saved by save(); missing or corrupt files leave the rollup empty."""
+        try:
+            with open(path, 'r') as f:
+                payload = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for name, data in payload.items():
+            if name in self.series:
+                self.series[name].load_compact(data)
@@ -1,9 +1,19 @@
 import json
 import os
-from typing import Dict
+import time
+from typing import Dict, Optional
+
+from usage_rollup import UsageRollup
 
 
 USAGE_FILE = 'usage.json'
+ROLLUP_FILE = 'usage_rollups.json'
+ROLLUP_PERSIST_INTERVAL = 10  # seconds between rollup writes
+
+# In-memory copies; the files are only read once per process
+_usage_cache: Optional[Dict] = None
+_rollup: Optional[UsageRollup] = None
+_rollup_saved_at = 0.0
 
 
 def _load_usage() -> Dict:
@@ -14,7 +24,7 @@ def _load_usage() -> Dict:
                 return json.load(f)
         except (json.JSONDecodeError, FileNotFoundError):
             pass
-    
+
     # Return default structure
     return {
         'portfolios_analyzed_total': 0,
@@ -28,14 +38,57 @@ def _save_usage(usage_data: Dict) -> None:
         json.dump(usage_data, f, indent=2)
 
 
-def record_portfolio_analysis(advice_count: int) -> None:
-    """Record a portfolio analysis and the number of advice items generated."""
-    usage_data = _load_usage()
+def _get_usage() -> Dict:
+    """Get the cached usage totals, loading them from disk on first use."""
+    global _usage_cache
+    if _usage_cache is None:
+        _usage_cache = _load_usage()
+    return _usage_cache
+
+
+def _get_rollup() -> UsageRollup:
+    """Get the usage rollup, loading persisted buckets on first use."""
+    global _rollup
+    if _rollup is None:
+        _rollup = UsageRollup()
+        _rollup.load(ROLLUP_FILE)
+    return _rollup
+
+
+def record_portfolio_analysis(advice_count: int, revenue: float = 0.0) -> None:
+    """Record a portfolio analysis, the number of advice items generated and the amount billed."""
+    global _rollup_saved_at
+    usage_data = _get_usage()
     usage_data['portfolios_analyzed_total'] += 1
     usage_data['advice_generated_total'] += advice_count
     _save_usage(usage_data)
 
+    rollup = _get_rollup()
+    rollup.record(1, advice_count, revenue)
+    now = time.time()
+    if now - _rollup_saved_at >= ROLLUP_PERSIST_INTERVAL:
+        rollup.save(ROLLUP_FILE)
+        _rollup_saved_at = now
+
+
+def flush() -> None:
+    """Persist the rollups now (called on shutdown)."""
+    if _rollup is not None:
+        _rollup.save(ROLLUP_FILE)
+
 
 def get_usage_summary() -> Dict:
     """Get current usage summary."""
-    return _load_usage()
+    return dict(_get_usage())
+
+
+def get_usage_timeseries(start: float, end: float, resolution: Optional[str] = None,
+                         max_points: int = 120) -> Dict:
+    """Get bucketed usage between two unix timestamps (see UsageRollup.query)."""
+    return _get_rollup().query(start, end, resolution, max_points)
+
+
+def get_recent_usage_timeseries(seconds: float, resolution: Optional[str] = None,
+                                max_points: int = 120) -> Dict:
+    """Get bucketed usage for the last `seconds`, aligned to whole buckets (see UsageRollup.recent)."""
+    return _get_rollup().recent(seconds, resolution, max_points)
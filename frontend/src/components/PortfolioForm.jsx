@@ -1,10 +1,13 @@
-import { useState } from 'react'
+import { useState, useRef } from 'react'
 import { API_ENDPOINTS } from '../config'
 
 function PortfolioForm({ onAnalysisStart, onAnalysisComplete, loading }) {
   const [portfolio, setPortfolio] = useState([{ symbol: '', quantity: '' }])
   const [csvFile, setCsvFile] = useState(null)
   const [csvStatus, setCsvStatus] = useState('')
+  const [suggestions, setSuggestions] = useState({ row: null, items: [] })
+  const searchTimer = useRef(null)
+  const searchController = useRef(null)
 
   const addRow = () => {
     setPortfolio([...portfolio, { symbol: '', quantity: '' }])
@@ -17,6 +20,51 @@ function PortfolioForm({ onAnalysisStart, onAnalysisComplete, loading }) {
     setPortfolio(updated)
   }
 
+  // Cancel the pending lookup and abort the one in flight, so its response is ignored
+  const cancelLookup = () => {
+    clearTimeout(searchTimer.current)
+    searchController.current?.abort()
+    searchController.current = null
+  }
+
+  const clearSuggestions = () => {
+    cancelLookup()
+    setSuggestions({ row: null, items: [] })
+  }
+
+  // Debounced autocomplete against the server-side symbol index
+  const lookupSymbol = (index, value) => {
+    cancelLookup()
+    if (!value.trim()) {
+      setSuggestions({ row: null, items: [] })
+      return
+    }
+    searchTimer.current = setTimeout(async () => {
+      const controller = new AbortController()
+      searchController.current = controller
+      try {
+        const response = await fetch(
+          `${API_ENDPOINTS.SYMBOL_SEARCH}?q=${encodeURIComponent(value)}&limit=8`,
+          { signal: controller.signal }
+        )
+        if (!response.ok) return
+        const data = await response.json()
+        // Superseded by a later keystroke, blur or Escape while the body was read
+        if (controller.signal.aborted) return
+        setSuggestions({ row: index, items: data.results })
+      } catch (error) {
+        if (error.name !== 'AbortError') {
+          console.error('Error searching symbols:', error)
+        }
+      }
+    }, 150)
+  }
+
+  const chooseSuggestion = (index, symbol) => {
+    updateRow(index, 'symbol', symbol)
+    clearSuggestions()
+  }
+
   const removeRow = (index) => {
     if (portfolio.length > 1) {
       setPortfolio(portfolio.filter((_, i) => i !== index))
@@ -325,34 +373,86 @@ function PortfolioForm({ onAnalysisStart, onAnalysisComplete, loading }) {
             border: '1px solid rgba(102, 126, 234, 0.1)',
             transition: 'all 0.3s ease'
           }}>
-            <input
-              type="text"
-              placeholder="Symbol (e.g., TCS)"
-              value={row.symbol}
-              onChange={(e) => updateRow(index, 'symbol', e.target.value.toUpperCase())}
-              style={{
-                padding: '12px 16px',
-                border: '2px solid #e2e8f0',
-                borderRadius: '10px',
-                flex: 1,
-                fontSize: '0.95rem',
-                transition: 'all 0.3s ease',
-                background: 'white',
-                ':focus': {
-                  outline: 'none',
-                  borderColor: '#667eea',
-                  boxShadow: '0 0 0 3px rgba(102, 126, 234, 0.1)'
-                }
-              }}
-              onFocus={(e) => {
-                e.target.style.borderColor = '#667eea'
-                e.target.style.boxShadow = '0 0 0 3px rgba(102, 126, 234, 0.1)'
-              }}
-              onBlur={(e) => {
-                e.target.style.borderColor = '#e2e8f0'
-                e.target.style.boxShadow = 'none'
-              }}
-            />
+            <div style={{ position: 'relative', flex: 1, display: 'flex' }}>
+              <input
+                type="text"
+                placeholder="Symbol or company name (e.g., TCS)"
+                value={row.symbol}
+                onChange={(e) => {
+                  const value = e.target.value.toUpperCase()
+                  updateRow(index, 'symbol', value)
+                  lookupSymbol(index, value)
+                }}
+                onKeyDown={(e) => {
+                  if (e.key === 'Escape') clearSuggestions()
+                }}
+                style={{
+                  padding: '12px 16px',
+                  border: '2px solid #e2e8f0',
+                  borderRadius: '10px',
+                  flex: 1,
+                  fontSize: '0.95rem',
+                  transition: 'all 0.3s ease',
+                  background: 'white',
+                  ':focus': {
+                    outline: 'none',
+                    borderColor: '#667eea',
+                    boxShadow: '0 0 0 3px rgba(102, 126, 234, 0.1)'
+                  }
+                }}
+                onFocus={(e) => {
+                  e.target.style.borderColor = '#667eea'
+                  e.target.style.boxShadow = '0 0 0 3px rgba(102, 126, 234, 0.1)'
+                }}
+                onBlur={(e) => {
+                  e.target.style.borderColor = '#e2e8f0'
+                  e.target.style.boxShadow = 'none'
+                  clearSuggestions()
+                }}
+              />
+              {suggestions.row === index && suggestions.items.length > 0 && (
+                <ul style={{
+                  position: 'absolute',
+                  top: '100%',
+                  left: 0,
+                  right: 0,
+                  margin: '4px 0 0 0',
+                  padding: '6px 0',
+                  listStyle: 'none',
+                  background: 'white',
+                  borderRadius: '10px',
+                  border: '1px solid #e2e8f0',
+                  boxShadow: '0 8px 24px rgba(0, 0, 0, 0.12)',
+                  zIndex: 10
+                }}>
+                  {suggestions.items.map((item) => (
+                    <li
+                      key={item.symbol}
+                      // mousedown fires before the input's blur clears the list
+                      onMouseDown={(e) => {
+                        e.preventDefault()
+                        chooseSuggestion(index, item.symbol)
+                      }}
+                      style={{
+                        padding: '8px 16px',
+                        cursor: 'pointer',
+                        display: 'flex',
+                        justifyContent: 'space-between',
+                        gap: '12px',
+                        fontSize: '0.9rem'
+                      }}
+                      onMouseOver={(e) => { e.currentTarget.style.background = 'rgba(102, 126, 234, 0.1)' }}
+                      onMouseOut={(e) => { e.currentTarget.style.background = 'transparent' }}
+                    >
+                      <strong style={{ color: '#2d3748' }}>{item.symbol}</strong>
+                      <span style={{ color: '#718096', overflow: 'hidden', textOverflow: 'ellipsis', whiteSpace: 'nowrap' }}>
+                        {item.name}
+                      </span>
+                    </li>
+                  ))}
+                </ul>
+              )}
+            </div>
             <input
               type="number"
               placeholder="Quantity"
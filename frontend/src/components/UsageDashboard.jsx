@@ -1,10 +1,34 @@
 import { useState, useEffect } from 'react'
 import { API_ENDPOINTS } from '../config'
 
+// "hour", "2 hours", "15 minutes" ... for a bucket width in seconds
+const bucketLabel = (seconds) => {
+  const units = [['day', 86400], ['hour', 3600], ['minute', 60]]
+  const [unit, size] = units.find(([, width]) => seconds % width === 0) || ['second', 1]
+  const count = seconds / size
+  return count === 1 ? unit : `${count} ${unit}s`
+}
+
 function UsageDashboard({ analysisResult }) {
   const [usage, setUsage] = useState(null)
+  const [trend, setTrend] = useState(null)
+  const [trendBucketSeconds, setTrendBucketSeconds] = useState(3600)
   const [loading, setLoading] = useState(false)
 
+  const fetchTrend = async () => {
+    try {
+      // Last 24 hours in whole buckets, downsampled server-side to at most 24 points
+      const response = await fetch(`${API_ENDPOINTS.USAGE_TIMESERIES}?max_points=24`)
+      if (response.ok) {
+        const data = await response.json()
+        setTrend(data.points)
+        setTrendBucketSeconds(data.bucket_seconds)
+      }
+    } catch (error) {
+      console.error('Error fetching usage trend:', error)
+    }
+  }
+
   const fetchUsage = async () => {
     setLoading(true)
     try {
@@ -13,6 +37,7 @@ function UsageDashboard({ analysisResult }) {
         const data = await response.json()
         setUsage(data)
       }
+      fetchTrend()
     } catch (error) {
       console.error('Error fetching usage:', error)
     } finally {
@@ -30,6 +55,7 @@ function UsageDashboard({ analysisResult }) {
       // Use the usage data from the analysis result if available
       if (analysisResult.usage) {
         setUsage(analysisResult.usage)
+        fetchTrend()
       } else {
         // Otherwise fetch fresh data
         fetchUsage()
@@ -37,6 +63,8 @@ function UsageDashboard({ analysisResult }) {
     }
   }, [analysisResult])
 
+  const trendPeak = trend ? Math.max(1, ...trend.map(point => point.portfolios)) : 1
+
   return (
     <div className="card" style={{
       background: 'linear-gradient(135deg, rgba(255, 255, 255, 0.95) 0%, rgba(255, 255, 255, 0.9) 100%)',
@@ -231,6 +259,53 @@ function UsageDashboard({ analysisResult }) {
             </p>
           </div>
 
+          {/* Analyses over the last 24 hours */}
+          {trend && trend.some(point => point.portfolios > 0) && (
+            <div style={{
+              background: 'linear-gradient(135deg, #f7fafc 0%, #edf2f7 100%)',
+              padding: '20px',
+              borderRadius: '16px',
+              border: '2px solid #cbd5e0'
+            }}>
+              <h4 style={{
+                margin: '0 0 12px 0',
+                color: '#2d3748',
+                fontSize: '1.1rem',
+                fontWeight: '600'
+              }}>
+                Last 24 Hours
+              </h4>
+              <div style={{
+                display: 'flex',
+                alignItems: 'flex-end',
+                gap: '3px',
+                height: '60px'
+              }}>
+                {trend.map(point => (
+                  <div
+                    key={point.ts}
+                    title={`${new Date(point.ts * 1000).toLocaleTimeString()}: ${point.portfolios} analyses, ₹${point.revenue}`}
+                    style={{
+                      flex: 1,
+                      height: `${Math.max(2, (point.portfolios / trendPeak) * 100)}%`,
+                      background: 'linear-gradient(180deg, #667eea 0%, #764ba2 100%)',
+                      borderRadius: '3px 3px 0 0',
+                      opacity: point.portfolios > 0 ? 1 : 0.25
+                    }}
+                  />
+                ))}
+              </div>
+              <p style={{
+                margin: '8px 0 0 0',
+                color: '#4a5568',
+                fontSize: '0.9rem',
+                fontWeight: '500'
+              }}>
+                Analyses per {bucketLabel(trendBucketSeconds)}
+              </p>
+            </div>
+          )}
+
           {/* Last Analysis Billing */}
           {analysisResult?.billing && (
             <div style={{ 
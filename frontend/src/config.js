@@ -5,5 +5,7 @@ export const API_BASE = "https://stock-sense-production.up.railway.app";
 export const API_ENDPOINTS = {
   ANALYZE: `${API_BASE}/api/analyze`,
   USAGE: `${API_BASE}/api/usage`,
+  USAGE_TIMESERIES: `${API_BASE}/api/usage/timeseries`,
   MARKET: `${API_BASE}/api/market`,
+  SYMBOL_SEARCH: `${API_BASE}/api/symbols/search`,
 };
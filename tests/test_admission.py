@@ -0,0 +1,117 @@
+import pytest
+import sys
+import os
+import asyncio
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi import HTTPException
+
+from starlette.requests import Request
+
+from admission import AdmissionController, TokenBucket, client_key, parse_networks, portfolio_weight
+
+
+class TestAdmissionControl:
+    """Test cases for token buckets and the weighted in-flight cap."""
+
+    def test_token_bucket_refills_over_time(self):
+        """Test that an empty bucket reports the wait until enough tokens return."""
+        bucket = TokenBucket(capacity=2, now=0.0)
+        assert bucket.try_take(2, rate=1.0, capacity=2, now=0.0) == 0.0
+        assert bucket.try_take(1, rate=1.0, capacity=2, now=0.5) == pytest.approx(0.5)
+        assert bucket.try_take(1, rate=1.0, capacity=2, now=1.0) == 0.0
+
+    def test_portfolio_weight_grows_with_size(self):
+        """Test that larger portfolios cost more admission units."""
+        assert portfolio_weight(0) == 1
+        assert portfolio_weight(9) == 1
+        assert portfolio_weight(25) == 3
+
+    def test_forwarded_for_only_trusted_from_proxies(self):
+        """Test that X-Forwarded-For cannot be used to pick a fresh client key."""
+        def request(peer, forwarded):
+            return Request({'type': 'http', 'client': (peer, 1234),
+                            'headers': [(b'x-forwarded-for', forwarded.encode())]})
+
+        trusted = parse_networks('10.0.0.0/8, not-an-ip')
+        assert client_key(request('203.0.113.9', '1.2.3.4'), trusted) == '203.0.113.9'
+        assert client_key(request('10.0.0.2', '1.2.3.4'), trusted) == '1.2.3.4'
+        # Spoofed hops to the left of the real client are ignored
+        assert client_key(request('10.0.0.2', '6.6.6.6, 1.2.3.4, 10.0.0.5'), trusted) == '1.2.3.4'
+        assert client_key(request('10.0.0.2', '1.2.3.4'), []) == '10.0.0.2'
+
+    def test_rate_limited_client_gets_retry_after(self):
+        """Test that a client over budget is rejected with 429 and Retry-After."""
+        controller = AdmissionController(rate=1.0, burst=2)
+
+        async def run():
+            async with controller.admit('a', 2):
+                pass
+            with pytest.raises(HTTPException) as exc:
+                async with controller.admit('a', 1):
+                    pass
+            # Other clients are unaffected
+            async with controller.admit('b', 1):
+                pass
+            return exc.value
+
+        error = asyncio.run(run())
+        assert error.status_code == 429
+        assert int(error.headers['Retry-After']) >= 1
+        assert controller.get_metrics()['rejected_rate_limited'] == 1
+
+    def test_idle_clients_are_evicted(self):
+        """Test that the client table is bounded with least-recently-seen eviction."""
+        controller = AdmissionController(max_clients=2)
+
+        async def run():
+            for client in ('a', 'b', 'a', 'c'):
+                async with controller.admit(client, 1):
+                    pass
+
+        asyncio.run(run())
+        assert list(controller._buckets) == ['a', 'c']
+        assert controller.get_metrics()['evicted_clients'] == 1
+
+    def test_overload_queues_then_rejects(self):
+        """Test that work beyond the in-flight cap waits briefly, then gets 429."""
+        controller = AdmissionController(max_inflight=2, max_queue_wait=0.05)
+
+        async def run():
+            release = asyncio.Event()
+
+            async def hold():
+                async with controller.admit('a', 2):
+                    await release.wait()
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as exc:
+                async with controller.admit('b', 1):
+                    pass
+
+            # Once capacity frees up, a queued request is admitted
+            async def queued():
+                async with controller.admit('c', 1):
+                    pass
+
+            waiter = asyncio.create_task(queued())
+            await asyncio.sleep(0)
+            release.set()
+            await holder
+            await waiter
+            return exc.value
+
+        error = asyncio.run(run())
+        assert error.status_code == 429
+        metrics = controller.get_metrics()
+        assert metrics['queue_timeouts'] == 1
+        assert metrics['queued'] == 2
+        assert metrics['admitted'] == 2
+        assert metrics['inflight_units'] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
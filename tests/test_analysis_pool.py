@@ -0,0 +1,85 @@
+import pytest
+import sys
+import os
+import asyncio
+import pickle
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from advisor import analyze_portfolio
+from analysis_pool import AnalysisPool
+from snapshot import MarketSnapshot
+
+
+MARKET = [
+    {'symbol': 'TCS', 'name': 'Tata Consultancy Services', 'sector': 'IT', 'price': 3300.0,
+     'change_1d_pct': 0.4, 'change_7d_pct': 1.8, 'volatility': 0.015, 'market_cap_cr': 125000},
+    {'symbol': 'SUNPHARMA', 'name': 'Sun Pharmaceutical', 'sector': 'Pharma', 'price': 900.0,
+     'change_1d_pct': -2.5, 'change_7d_pct': -7.0, 'volatility': 0.050, 'market_cap_cr': 18000},
+]
+
+
+class TestAnalysisPool:
+    """Test cases for inline vs process-pool dispatch of analyses."""
+
+    def test_small_portfolios_stay_inline(self):
+        """Test that portfolios below the threshold never touch the pool."""
+        pool = AnalysisPool(threshold=10, workers=1)
+        pool.start()
+        try:
+            snapshot = MarketSnapshot(MARKET, version=1)
+            pool.publish_snapshot(snapshot).result()
+            result = asyncio.run(pool.analyze([{'symbol': 'TCS', 'quantity': 1}], snapshot))
+        finally:
+            pool.shutdown()
+        assert result == analyze_portfolio([{'symbol': 'TCS', 'quantity': 1}], MARKET)
+        assert pool.get_metrics()['inline'] == 1
+
+    def test_large_portfolio_offloaded_with_same_result(self):
+        """Test that offloaded analyses match inline results and follow new snapshots."""
+        portfolio = [{'symbol': 'TCS', 'quantity': 1}, {'symbol': 'SUNPHARMA', 'quantity': 2}] * 3
+        repriced = [dict(stock, price=stock['price'] * 2) for stock in MARKET]
+        pool = AnalysisPool(threshold=4, workers=2)
+        pool.start()
+        try:
+            first_snapshot = MarketSnapshot(MARKET, version=1)
+            pool.publish_snapshot(first_snapshot).result()
+            first = asyncio.run(pool.analyze(portfolio, first_snapshot))
+            second_snapshot = MarketSnapshot(repriced, version=2)
+            pool.publish_snapshot(second_snapshot).result()
+            second = asyncio.run(pool.analyze(portfolio, second_snapshot))
+        finally:
+            pool.shutdown()
+
+        assert first == analyze_portfolio(portfolio, MARKET)
+        assert second == analyze_portfolio(portfolio, repriced)
+        assert pool.get_metrics()['offloaded'] == 2
+
+    def test_publish_sends_only_analysis_data(self):
+        """Test that published files hold the records and signals but no indexes."""
+        pool = AnalysisPool(threshold=1, workers=2)
+        pool.start()
+        try:
+            snapshot = MarketSnapshot(MARKET, version=3)
+            pool.publish_snapshot(snapshot).result()
+            with open(pool._snapshot_files[-1], 'rb') as f:
+                records, signals = pickle.load(f)
+            assert [row['symbol'] for row in records] == ['TCS', 'SUNPHARMA']
+            assert set(signals) == {'TCS', 'SUNPHARMA'}
+            result = asyncio.run(pool.analyze([{'symbol': 'TCS', 'quantity': 1}], snapshot))
+        finally:
+            pool.shutdown()
+        assert result == analyze_portfolio([{'symbol': 'TCS', 'quantity': 1}], MARKET)
+        assert pool.get_metrics()['offloaded'] == 1
+
+    def test_version_mismatch_runs_inline(self):
+        """Test that data from a snapshot the pool does not hold is analyzed inline."""
+        pool = AnalysisPool(threshold=1, workers=1)
+        result = asyncio.run(pool.analyze([{'symbol': 'TCS', 'quantity': 1}], MarketSnapshot(MARKET, version=7)))
+        assert result['portfolio_value'] == 3300.0
+        assert pool.get_metrics()['inline'] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,187 @@
+import pytest
+import sys
+import os
+import asyncio
+import sqlite3
+from datetime import datetime
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from billing_store import GroupCommitWriter, JsonBillingStore, SqliteBillingStore, migrate_json_to_sqlite
+from flexprice_mock import FlexpriceMock
+
+
+def make_record(n, item_type='portfolio_analysis', session='s1', amount=5.0, quantity=0):
+    return {
+        'transaction_id': f'tx_{n}',
+        'item_type': item_type,
+        'session_id': session,
+        'amount': amount,
+        'quantity': quantity,
+        'timestamp': f'2025-01-01T10:{n:02d}:00',
+        'status': 'completed',
+    }
+
+
+class TestBillingStore:
+    """Test cases for the JSON and SQLite billing backends."""
+
+    def test_sqlite_range_and_session_queries(self, tmp_path):
+        """Test indexed time-range, revenue and per-session lookups."""
+        store = SqliteBillingStore(str(tmp_path / 'billing.db'))
+        store.append_many([
+            make_record(1, session='a'),
+            make_record(2, 'advice_generation', session='a', amount=6.0, quantity=3),
+            make_record(30, session='b'),
+        ])
+
+        in_range = store.records_between('2025-01-01T10:00:00', '2025-01-01T10:10:00')
+        assert [r['transaction_id'] for r in in_range] == ['tx_1', 'tx_2']
+        assert store.revenue_between('2025-01-01T10:00:00', '2025-01-01T11:00:00') == 16.0
+        assert [r['transaction_id'] for r in store.session_records('a')] == ['tx_1', 'tx_2']
+        assert store.totals_by_item_type()['advice_generation'] == {'count': 1, 'amount': 6.0, 'quantity': 3}
+
+    def test_migration_is_idempotent(self, tmp_path):
+        """Test that migrating the same JSON file twice does not duplicate records."""
+        json_path = str(tmp_path / 'billing.json')
+        db_path = str(tmp_path / 'billing.db')
+        JsonBillingStore(json_path).append_many([make_record(1), make_record(2)])
+
+        assert migrate_json_to_sqlite(json_path, db_path) == 2
+        assert migrate_json_to_sqlite(json_path, db_path) == 0
+        assert SqliteBillingStore(db_path).load_all() == JsonBillingStore(json_path).load_all()
+
+    def test_colliding_transaction_ids_are_kept_or_raise(self, tmp_path):
+        """Test that a repeated transaction_id is stored, and rejected loudly by old unique schemas."""
+        store = SqliteBillingStore(str(tmp_path / 'billing.db'))
+        assert store.append_many([make_record(1, session='a'), make_record(1, session='b')]) == 2
+        assert [r['session_id'] for r in store.load_all()] == ['a', 'b']
+
+        legacy_path = str(tmp_path / 'legacy.db')
+        conn = sqlite3.connect(legacy_path)
+        conn.executescript(SqliteBillingStore.SCHEMA.replace('transaction_id TEXT,', 'transaction_id TEXT UNIQUE,'))
+        conn.close()
+        legacy = SqliteBillingStore(legacy_path)
+        legacy.append_many([make_record(1)])
+        with pytest.raises(sqlite3.IntegrityError):
+            legacy.append_many([make_record(2), make_record(1, session='b')])
+        assert len(legacy.load_all()) == 1
+
+    def test_migration_keeps_distinct_records_with_one_id(self, tmp_path):
+        """Test that legacy records sharing a transaction_id all survive migration."""
+        json_path = str(tmp_path / 'billing.json')
+        db_path = str(tmp_path / 'billing.db')
+        JsonBillingStore(json_path).append_many([make_record(1, session='a'), make_record(1, session='b')])
+
+        assert migrate_json_to_sqlite(json_path, db_path) == 2
+        assert migrate_json_to_sqlite(json_path, db_path) == 0
+
+    def test_failed_write_is_not_reported_completed(self, tmp_path, monkeypatch):
+        """Test that a session whose event could not be stored is marked failed."""
+        monkeypatch.chdir(tmp_path)
+        client = FlexpriceMock(storage='json')
+
+        def fail(records):
+            raise OSError('disk full')
+        monkeypatch.setattr(client.store, 'append_many', fail)
+        assert client.process_full_analysis_billing(advice_count=1)['status'] == 'failed'
+        assert asyncio.run(client.record_analysis(1))['status'] == 'failed'
+
+    @pytest.mark.parametrize('storage', ['json', 'sqlite'])
+    def test_flexprice_session_records(self, storage, tmp_path, monkeypatch):
+        """Test that one analysis writes a single compound event tagged with its session id."""
+        monkeypatch.chdir(tmp_path)
+        client = FlexpriceMock(storage=storage)
+
+        billing = client.process_full_analysis_billing(advice_count=3)
+        records = client.get_session_records(billing['session_id'])
+
+        assert [r['item_type'] for r in records] == ['analysis_session']
+        assert records[0]['amount'] == 11.0
+        assert records[0]['breakdown']['advice_generation'] == {
+            'quantity': 3, 'unit_price': 2.0, 'amount': 6.0,
+            'description': 'Generated 3 investment recommendations'
+        }
+        assert client.get_usage_summary()['total_revenue'] == 11.0
+        assert client.get_revenue_between(datetime(2000, 1, 1), datetime(2100, 1, 1)) == 11.0
+
+    @pytest.mark.parametrize('storage', ['json', 'sqlite'])
+    def test_totals_include_legacy_records(self, storage, tmp_path, monkeypatch):
+        """Test that summaries count both compound events and older per-charge records."""
+        monkeypatch.chdir(tmp_path)
+        client = FlexpriceMock(storage=storage)
+        client.store.append_many([
+            make_record(1, session='old'),
+            make_record(2, 'advice_generation', session='old', amount=4.0, quantity=2),
+        ])
+        client.process_full_analysis_billing(advice_count=1)
+
+        summary = client.get_usage_summary()
+        assert (summary['total_sessions'], summary['total_advice_items'], summary['total_revenue']) == (2, 3, 16.0)
+
+        client.process_full_analysis_billing(advice_count=0)
+        assert client.get_usage_summary()['total_sessions'] == 3
+        assert FlexpriceMock(storage=storage).get_usage_summary()['total_revenue'] == 21.0
+
+
+class TestGroupCommit:
+    """Test cases for group-committed billing events."""
+
+    @pytest.mark.parametrize('storage', ['json', 'sqlite'])
+    def test_concurrent_sessions_share_commits(self, storage, tmp_path, monkeypatch):
+        """Test that concurrent analyses are written in fewer commits than sessions."""
+        monkeypatch.chdir(tmp_path)
+        client = FlexpriceMock(storage=storage)
+        client.get_usage_summary()  # totals are maintained incrementally from here on
+
+        async def bill_concurrently():
+            return await asyncio.gather(*(client.record_analysis(i % 4) for i in range(50)))
+
+        events = asyncio.run(bill_concurrently())
+        metrics = client.get_metrics()
+        assert metrics['records'] == 50
+        assert metrics['commits'] < 50
+        assert metrics['queue_depth'] == 0
+        assert len(client.store.load_all()) == 50
+        assert len({event['session_id'] for event in events}) == 50
+        summary = client.get_usage_summary()
+        assert summary['total_sessions'] == 50
+        assert summary['total_revenue'] == sum(event['amount'] for event in events)
+
+    def test_totals_follow_rows_actually_stored(self, tmp_path, monkeypatch):
+        """Test that usage totals never count records the store did not insert."""
+        monkeypatch.chdir(tmp_path)
+        client = FlexpriceMock(storage='sqlite')
+        client.process_full_analysis_billing(advice_count=1)
+        assert client.get_usage_summary()['total_sessions'] == 1
+
+        append_many = client.store.append_many
+        monkeypatch.setattr(client.store, 'append_many', lambda records: append_many(records[:1]))
+
+        async def bill_two():
+            return await asyncio.gather(client.record_analysis(1), client.record_analysis(2))
+
+        asyncio.run(bill_two())
+        assert client.get_usage_summary()['total_sessions'] == len(client.store.load_all())
+
+    def test_write_errors_reach_every_waiter(self):
+        """Test that a failed batch write fails each session waiting on it."""
+        class FailingStore:
+            def append_many(self, records):
+                raise OSError('disk full')
+
+        writer = GroupCommitWriter(FailingStore())
+
+        async def append_two():
+            return await asyncio.gather(writer.append({'n': 1}), writer.append({'n': 2}),
+                                        return_exceptions=True)
+
+        results = asyncio.run(append_two())
+        assert all(isinstance(result, OSError) for result in results)
+        assert writer.get_metrics()['errors'] == 1
+        assert writer.queue_depth() == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
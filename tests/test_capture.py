@@ -0,0 +1,156 @@
+import pytest
+import sys
+import os
+import json
+import threading
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import advisor
+import capture
+import replay
+from snapshot import MarketSnapshot
+
+
+def _records(infy_change=3.0):
+    return [
+        {'symbol': 'TCS', 'name': 'TCS', 'sector': 'IT', 'price': 3500.0, 'change_1d_pct': 1.0,
+         'change_7d_pct': 6.0, 'volatility': 0.02, 'market_cap_cr': 1200000.0},
+        {'symbol': 'INFY', 'name': 'Infosys', 'sector': 'IT', 'price': 1500.0, 'change_1d_pct': -1.0,
+         'change_7d_pct': infy_change, 'volatility': 0.05, 'market_cap_cr': 600000.0},
+        {'symbol': 'SUNPHARMA', 'name': 'Sun Pharma', 'sector': 'Pharma', 'price': 1100.0,
+         'change_1d_pct': 0.5, 'change_7d_pct': -7.0, 'volatility': 0.03, 'market_cap_cr': 250000.0},
+    ]
+
+
+def _record_some(recorder, snapshot, portfolios):
+    for portfolio in portfolios:
+        result = advisor.analyze_portfolio(portfolio, snapshot.records, snapshot.signals)
+        recorder.record(portfolio, snapshot, result)
+
+
+PORTFOLIOS = [
+    [{'symbol': 'TCS', 'quantity': 10}],
+    [{'symbol': 'TCS', 'quantity': 1}, {'symbol': 'INFY', 'quantity': 50}, {'symbol': 'SUNPHARMA', 'quantity': 3}],
+    [{'symbol': 'INFY', 'quantity': 5}, {'symbol': 'UNKNOWN', 'quantity': 5}],
+]
+
+
+class TestRequestRecorder:
+    """Test cases for the capture log."""
+
+    def test_disabled_without_directory(self, tmp_path):
+        """Test that recording is a no-op without a capture directory."""
+        recorder = capture.RequestRecorder(directory=None)
+        _record_some(recorder, MarketSnapshot(_records(), 1), PORTFOLIOS)
+        assert recorder.get_metrics()['captured'] == 0
+
+    def test_writes_compact_lines_and_snapshot_once(self, tmp_path):
+        """Test the log line format and that each snapshot is stored once."""
+        recorder = capture.RequestRecorder(directory=str(tmp_path))
+        snapshot = MarketSnapshot(_records(), 7)
+        _record_some(recorder, snapshot, PORTFOLIOS)
+        recorder.close()
+
+        lines = (tmp_path / capture.LOG_NAME).read_text().splitlines()
+        assert len(lines) == 3
+        entry = json.loads(lines[1])
+        assert entry['v'] == 7
+        assert entry['p'] == [['TCS', 1], ['INFY', 50], ['SUNPHARMA', 3]]
+        assert len(list(tmp_path.glob('snapshot-*.json'))) == 1
+        assert recorder.get_metrics()['snapshots_written'] == 1
+
+    def test_rotation_keeps_bounded_files(self, tmp_path):
+        """Test size-based rotation and the max file count."""
+        recorder = capture.RequestRecorder(directory=str(tmp_path), max_bytes=200, max_files=2)
+        snapshot = MarketSnapshot(_records(), 1)
+        _record_some(recorder, snapshot, PORTFOLIOS * 10)
+        recorder.close()
+
+        files = capture.log_files(str(tmp_path))
+        assert [os.path.basename(f) for f in files] == ['capture.jsonl.2', 'capture.jsonl.1', 'capture.jsonl']
+        assert recorder.get_metrics()['rotations'] > 2
+
+    def test_rotation_prunes_unreferenced_snapshots(self, tmp_path):
+        """Test that snapshot files only referenced by dropped logs are deleted."""
+        recorder = capture.RequestRecorder(directory=str(tmp_path), max_bytes=300, max_files=1)
+        for version in range(1, 6):
+            snapshot = MarketSnapshot(_records(infy_change=float(version)), version)
+            _record_some(recorder, snapshot, PORTFOLIOS)
+        recorder.close()
+
+        referenced = set()
+        for path in capture.log_files(str(tmp_path)):
+            with open(path) as f:
+                referenced.update(json.loads(line)['s'] for line in f)
+        on_disk = {p.name[len('snapshot-'):-len('.json')] for p in tmp_path.glob('snapshot-*.json')}
+        assert referenced <= on_disk
+        assert len(on_disk) <= len(referenced) + 1
+        assert recorder.get_metrics()['snapshots_pruned'] > 0
+
+    def test_record_does_not_write_on_the_calling_thread(self, tmp_path, monkeypatch):
+        """Test that the request path only queues work for the capture thread."""
+        writers = []
+        original = capture.RequestRecorder._snapshot_digest_for
+        monkeypatch.setattr(capture.RequestRecorder, '_snapshot_digest_for',
+                            lambda self, snapshot: writers.append(threading.current_thread()) or
+                            original(self, snapshot))
+        recorder = capture.RequestRecorder(directory=str(tmp_path))
+        _record_some(recorder, MarketSnapshot(_records(), 1), PORTFOLIOS)
+        recorder.close()
+        assert writers and threading.current_thread() not in writers
+        assert recorder.get_metrics()['captured'] == 3
+
+    def test_full_queue_drops_and_counts(self, tmp_path, monkeypatch):
+        """Test that requests beyond max_queue are dropped while the capture thread is behind."""
+        release = threading.Event()
+        original = capture.RequestRecorder._write
+        monkeypatch.setattr(capture.RequestRecorder, '_write',
+                            lambda self, *args: release.wait(5) and original(self, *args))
+        recorder = capture.RequestRecorder(directory=str(tmp_path), max_queue=2)
+        snapshot = MarketSnapshot(_records(), 1)
+        _record_some(recorder, snapshot, PORTFOLIOS + PORTFOLIOS)
+        assert recorder.get_metrics()['queue_depth'] == 2
+        assert recorder.get_metrics()['dropped'] == 4
+
+        release.set()
+        recorder.close()
+        metrics = recorder.get_metrics()
+        assert (metrics['captured'], metrics['dropped'], metrics['queue_depth']) == (2, 4, 0)
+        _record_some(recorder, snapshot, PORTFOLIOS[:1])
+        recorder.close()
+        assert recorder.get_metrics()['captured'] == 3
+
+
+class TestReplay:
+    """Test cases for offline replay."""
+
+    def test_replay_matches_recorded_outputs(self, tmp_path):
+        """Test that both analysis paths reproduce the recorded outputs across snapshots."""
+        recorder = capture.RequestRecorder(directory=str(tmp_path))
+        _record_some(recorder, MarketSnapshot(_records(), 1), PORTFOLIOS)
+        _record_some(recorder, MarketSnapshot(_records(infy_change=-8.0), 2), PORTFOLIOS)
+        recorder.close()
+
+        requests, snapshots = replay.load_requests(str(tmp_path))
+        assert len(requests) == 6
+        assert len(snapshots) == 2
+        for mode in ('signals', 'reference'):
+            report = replay.replay(requests, snapshots, mode=mode, repeat=2)
+            assert report['mismatches'] == 0, report
+            assert report['requests_per_s'] > 0
+
+    def test_replay_detects_changed_output(self, tmp_path, monkeypatch):
+        """Test that a behaviour change shows up as mismatches."""
+        recorder = capture.RequestRecorder(directory=str(tmp_path))
+        _record_some(recorder, MarketSnapshot(_records(), 1), PORTFOLIOS)
+        recorder.close()
+
+        monkeypatch.setattr(advisor, 'DIVERSIFY_MESSAGE', 'changed')
+        report = replay.main([str(tmp_path), '--mode', 'reference'])
+        assert report['mismatches'] > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
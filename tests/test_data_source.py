@@ -0,0 +1,203 @@
+import pytest
+import sys
+import os
+import asyncio
+import math
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import market
+import market_updater
+import pathway_mock
+from market_store import MarketStore
+from data_source import CsvFileSource, DataSource, MemorySource, TailingCsvSource, create_source
+from snapshot import EMPTY_SNAPSHOT, SnapshotHistory
+
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'backend', 'data', 'stocks.csv')
+HEADER = 'symbol,name,sector,price\n'
+
+
+def _refresh(source, previous=None):
+    return source.parse(source.load(), previous)
+
+
+class TestDataSources:
+    """Test cases for the file, stream and in-memory market data sources."""
+
+    def test_csv_source_matches_load_market(self):
+        """Test that the CSV source parses exactly like market.load_market."""
+        store = _refresh(CsvFileSource(DATA_FILE))
+        assert store.to_records() == market.load_market(DATA_FILE)
+
+    def test_csv_source_skips_parse_of_unchanged_file(self, tmp_path):
+        """Test that identical bytes return the previous store without parsing."""
+        path = tmp_path / 'stocks.csv'
+        path.write_text(HEADER + 'A,Alpha,IT,10\n')
+        source = CsvFileSource(str(path))
+        first = _refresh(source)
+        assert _refresh(source, first) is first
+
+        path.write_text(HEADER + 'A,Alpha,IT,11\n')
+        second = _refresh(source, first)
+        assert second is not first
+        assert second[0]['price'] == 11
+
+    def test_csv_source_missing_file(self, tmp_path):
+        """Test that a missing file raises with its path."""
+        source = CsvFileSource(str(tmp_path / 'missing.csv'))
+        assert not source.is_available()
+        with pytest.raises(FileNotFoundError, match='missing.csv'):
+            source.load()
+
+    def test_tailing_source_upserts_appended_rows(self, tmp_path):
+        """Test that appended rows update their symbol and partial lines wait."""
+        path = tmp_path / 'stream.csv'
+        path.write_text(HEADER + 'A,Alpha,IT,10\nB,Beta,Pharma,20\n')
+        source = TailingCsvSource(str(path))
+        first = _refresh(source)
+        assert [row['price'] for row in first] == [10, 20]
+
+        with open(path, 'a') as f:
+            f.write('A,Alpha,IT,12\nC,Gam')
+        second = _refresh(source, first)
+        assert [(row['symbol'], row['price']) for row in second] == [('A', 12), ('B', 20)]
+        assert source.lines_read == 3
+
+        with open(path, 'a') as f:
+            f.write('ma,Banking,30\n')
+        third = _refresh(source, second)
+        assert [row['symbol'] for row in third] == ['A', 'B', 'C']
+        assert _refresh(source, third) is third
+
+    def test_tailing_source_skips_malformed_lines(self, tmp_path):
+        """Test that a malformed appended line is counted without losing its neighbours."""
+        path = tmp_path / 'stream.csv'
+        path.write_text(HEADER + 'A,Alpha,IT,10\n')
+        source = TailingCsvSource(str(path))
+        first = _refresh(source)
+
+        with open(path, 'a') as f:
+            f.write('B,Beta,Pharma,20\nX,Bad,IT,1,2,3\nC,Gamma,IT,5\n')
+        second = _refresh(source, first)
+        assert [(row['symbol'], row['price']) for row in second] == [('A', 10), ('B', 20), ('C', 5)]
+        assert source.bad_lines == 1
+        assert _refresh(source, second) is second
+
+    def test_tailing_source_keeps_offset_when_parse_fails(self, tmp_path, monkeypatch):
+        """Test that lines are read again if parsing them raised."""
+        path = tmp_path / 'stream.csv'
+        path.write_text(HEADER + 'A,Alpha,IT,10\n')
+        source = TailingCsvSource(str(path))
+        first = _refresh(source)
+        with open(path, 'a') as f:
+            f.write('B,Beta,Pharma,20\n')
+
+        monkeypatch.setattr(MarketStore, 'from_records', classmethod(lambda cls, *args: 1 / 0))
+        with pytest.raises(ZeroDivisionError):
+            _refresh(source, first)
+        monkeypatch.undo()
+        assert [row['symbol'] for row in _refresh(source, first)] == ['A', 'B']
+
+    def test_tailing_source_restarts_after_truncation(self, tmp_path):
+        """Test that a truncated or replaced stream is read from the start."""
+        path = tmp_path / 'stream.csv'
+        path.write_text(HEADER + 'A,Alpha,IT,10\nB,Beta,Pharma,20\n')
+        source = TailingCsvSource(str(path))
+        first = _refresh(source)
+
+        path.write_text(HEADER + 'C,Gamma,IT,5\n')
+        second = _refresh(source, first)
+        assert [row['symbol'] for row in second] == ['C']
+        assert source.resets == 1
+
+    def test_memory_source(self):
+        """Test that the in-memory source republishes only after set_records."""
+        source = MemorySource([{'symbol': 'A', 'price': 1.0}])
+        first = _refresh(source)
+        assert _refresh(source, first) is first
+        source.set_records([{'symbol': 'A', 'price': 2.0}])
+        assert _refresh(source, first)[0]['price'] == 2.0
+
+    def test_sources_must_implement_load_and_parse(self):
+        """Test that the base class and incomplete sources cannot be instantiated."""
+        class LoadOnly(DataSource):
+            def load(self):
+                return b''
+
+        with pytest.raises(TypeError):
+            DataSource()
+        with pytest.raises(TypeError):
+            LoadOnly()
+
+    def test_create_source(self):
+        """Test configured source selection."""
+        assert isinstance(create_source('tail', DATA_FILE), TailingCsvSource)
+        with pytest.raises(ValueError):
+            create_source('kafka', DATA_FILE)
+
+
+def _stock(price):
+    return {'symbol': 'A', 'name': 'Alpha', 'sector': 'IT', 'price': price,
+            'change_1d_pct': 0.0, 'change_7d_pct': 0.0, 'volatility': 0.02}
+
+
+@pytest.fixture
+def memory_pipeline(monkeypatch):
+    """Run the market_updater pipeline on a MemorySource with fresh global state."""
+    monkeypatch.setattr(market_updater, '_snapshot', EMPTY_SNAPSHOT)
+    monkeypatch.setattr(market_updater, '_history', SnapshotHistory(10))
+    monkeypatch.setattr(market_updater, '_snapshot_listeners', [])
+    monkeypatch.setattr(market_updater, '_pipeline_metrics', {
+        'refreshes': 0, 'published': 0, 'unchanged': 0, 'failed': 0,
+        'last_ms': {stage: None for stage in market_updater.PIPELINE_STAGES},
+        'total_ms': {stage: 0.0 for stage in market_updater.PIPELINE_STAGES},
+    })
+    original = market_updater.get_data_source()
+    source = MemorySource([_stock(10.0)])
+    market_updater.set_data_source(source)
+    yield source
+    market_updater.set_data_source(original)
+
+
+class TestSnapshotPipeline:
+    """Test cases for the shared load/parse/publish pipeline."""
+
+    def test_pipeline_publishes_and_times_stages(self, memory_pipeline):
+        """Test that a refresh publishes a snapshot and records every stage."""
+        assert asyncio.run(market_updater.refresh_market_data()) is True
+        assert market_updater.get_snapshot().version == 1
+        metrics = market_updater.get_pipeline_metrics()
+        assert metrics['published'] == 1
+        assert metrics['source'] == 'memory:1 records'
+        assert all(metrics['last_ms'][stage] is not None for stage in market_updater.PIPELINE_STAGES)
+
+    def test_unchanged_source_publishes_nothing(self, memory_pipeline):
+        """Test that refreshing an unchanged source keeps the current snapshot."""
+        asyncio.run(market_updater.refresh_market_data())
+        snapshot = market_updater.get_snapshot()
+        assert asyncio.run(market_updater.refresh_market_data()) is True
+        assert market_updater.get_snapshot() is snapshot
+        assert market_updater.get_pipeline_metrics()['unchanged'] == 1
+
+        memory_pipeline.set_records([_stock(11.0)])
+        asyncio.run(market_updater.refresh_market_data())
+        assert market_updater.get_snapshot().version == 2
+
+    def test_pathway_status_reports_the_served_snapshot(self, memory_pipeline):
+        """Test that the Pathway mock reads from the pipeline instead of parsing its own copy."""
+        status = pathway_mock.get_pathway_status()
+        assert status['cached_records'] == 0 and status['last_updated'] is None
+
+        asyncio.run(market_updater.refresh_market_data())
+        status = pathway_mock.get_pathway_status()
+        assert status['snapshot_version'] == market_updater.get_snapshot().version
+        assert status['cached_records'] == 1
+        assert status['data_source'] == 'memory:1 records'
+        assert pathway_mock.fetch_latest_csv() is market_updater.get_snapshot().records
+        assert not math.isnan(pathway_mock.fetch_latest_csv()[0]['price'])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
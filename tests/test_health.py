@@ -0,0 +1,47 @@
+import pytest
+import sys
+import os
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi.testclient import TestClient
+
+import main
+import usage_store
+
+
+class TestHealthEndpoints:
+    """Test cases for liveness, readiness and the cached integrations status."""
+
+    def test_liveness_is_always_ok(self):
+        """Test that the liveness probe answers without the updater running."""
+        client = TestClient(main.app)
+        response = client.get('/health/live')
+        assert response.status_code == 200
+        assert response.json()['status'] == 'alive'
+
+    def test_readiness_after_startup(self):
+        """Test that the app is ready once the lifespan has loaded a snapshot."""
+        with TestClient(main.app) as client:
+            response = client.get('/health/ready')
+            body = response.json()
+            assert response.status_code == 200, body
+            assert body['checks'] == {
+                'snapshot_loaded': True, 'snapshot_fresh': True, 'updater_alive': True
+            }
+            assert body['stocks'] > 0
+
+    def test_health_does_not_read_usage_file(self, monkeypatch):
+        """Test that the health probes never touch the usage store."""
+        def fail():
+            raise AssertionError("health probe read usage.json")
+        monkeypatch.setattr(usage_store, 'get_usage_summary', fail)
+
+        client = TestClient(main.app)
+        assert client.get('/health').status_code == 200
+        assert client.get('/health/live').status_code == 200
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,76 @@
+import pytest
+import sys
+import os
+import asyncio
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import admission
+import usage_store
+from loadgen import LoadGenerator, build_arg_parser, parse_weighted, percentile, run_in_process, summarize_latencies
+
+
+class TestLoadgenHelpers:
+    """Test cases for the load generator's spec parsing and statistics."""
+
+    def test_parse_weighted_spec(self):
+        """Test that name:weight pairs are parsed, defaulting missing weights to 1."""
+        assert parse_weighted('analyze:70, market:30,health') == [
+            ('analyze', 70.0), ('market', 30.0), ('health', 1.0)
+        ]
+
+    def test_parse_weighted_rejects_zero_total(self):
+        """Test that a spec with no positive weight is rejected."""
+        with pytest.raises(ValueError):
+            parse_weighted('analyze:0')
+
+    def test_percentile_nearest_rank(self):
+        """Test nearest-rank percentiles on a known distribution."""
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 50) == 50.0
+        assert percentile(values, 99) == 99.0
+        assert percentile(values, 100) == 100.0
+        assert percentile([], 99) == 0.0
+
+    def test_summarize_latencies_reports_milliseconds(self):
+        """Test that latencies in seconds are summarized as milliseconds."""
+        summary = summarize_latencies([0.002, 0.001, 0.003, 0.004], elapsed=2.0)
+        assert summary['count'] == 4
+        assert summary['throughput_rps'] == 2.0
+        assert summary['p50_ms'] == pytest.approx(2.0)
+        assert summary['max_ms'] == pytest.approx(4.0)
+
+
+
+class TestLoadGenerator:
+    """Smoke test of a short in-process run."""
+
+    def test_in_process_run_reports_every_endpoint(self, tmp_path, monkeypatch):
+        """Test that a short run exercises the mix, reports its stats and leaves the trust list as it was."""
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(usage_store, '_usage_cache', None)
+        monkeypatch.setattr(usage_store, '_rollup', None)
+        trusted = list(admission._trusted_proxies)
+        args = build_arg_parser().parse_args([])
+        mix = parse_weighted('analyze:2,market:1,health:1')
+
+        def make_generator(client):
+            return LoadGenerator(client, concurrency=2, duration=0.5, warmup=0.1, mix=mix,
+                                 portfolio_sizes=parse_weighted('1:1,3:1'), seed=1)
+
+        report = asyncio.run(run_in_process(args, make_generator))
+
+        assert admission._trusted_proxies == trusted
+        assert set(report['endpoints']) == {'analyze', 'market', 'health'}
+        assert report['overall']['errors'] == 0
+        assert report['overall']['count'] == sum(stats['count'] for stats in report['endpoints'].values())
+        assert report['endpoints']['analyze']['count'] > 0
+        assert report['overall']['throughput_rps'] > 0
+        assert 0 < report['overall']['p50_ms'] <= report['overall']['p99_ms'] <= report['overall']['max_ms']
+        assert report['event_loop_lag_ms']['samples'] > 0
+        assert report['elapsed_s'] >= 0.5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
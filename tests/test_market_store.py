@@ -0,0 +1,118 @@
+import pytest
+import sys
+import os
+import math
+import pickle
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi.testclient import TestClient
+
+import main
+import market
+import market_store
+from market_store import MarketStore, StockRow
+
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'backend', 'data', 'stocks.csv')
+
+
+def _records(size):
+    return [
+        {'symbol': f'S{i}', 'name': f'Stock {i}', 'sector': ['IT', 'Pharma', 'Banking'][i % 3],
+         'price': 100.0 + i, 'change_1d_pct': 0.5, 'change_7d_pct': -6.0 if i % 5 == 0 else 3.0,
+         'volatility': 0.02, 'market_cap_cr': 1000 + i}
+        for i in range(size)
+    ]
+
+
+class TestMarketStore:
+    """Test cases for the columnar store and its row views."""
+
+    def test_rows_match_load_market_dicts(self):
+        """Test that the CSV loads to the same values and types as the dict loader."""
+        records = market.load_market(DATA_FILE)
+        store = market.load_market_store(DATA_FILE)
+        assert len(store) == len(records)
+        for row, record in zip(store, records):
+            assert isinstance(row, StockRow)
+            assert row == record and record == row
+            assert [type(row[key]) for key in record] == [type(value) for value in record.values()]
+
+    def test_columns_are_typed_and_sector_is_coded(self):
+        """Test the column representation."""
+        store = MarketStore.from_records(_records(10))
+        kinds = dict(zip(store.layout.fields, store.layout.kinds))
+        assert kinds['price'] == market_store.KIND_FLOAT
+        assert kinds['market_cap_cr'] == market_store.KIND_INT
+        assert kinds['sector'] == market_store.KIND_CATEGORY
+        sector_position = store.layout.positions['sector']
+        assert store.layout.categories[sector_position].values == ['IT', 'Pharma', 'Banking']
+        assert store.column('sector')[:4] == ['IT', 'Pharma', 'Banking', 'IT']
+
+    def test_row_view_mapping_behaviour(self):
+        """Test record-style access on a row view."""
+        row = MarketStore.from_records(_records(3))[1]
+        assert row['symbol'] == 'S1'
+        assert row.get('missing', 'default') == 'default'
+        assert 'price' in row
+        assert dict(row)['sector'] == 'Pharma'
+        with pytest.raises(KeyError):
+            row['missing']
+
+    def test_missing_fields_and_nan(self):
+        """Test rows lacking a field and NaN values."""
+        store = MarketStore.from_records([{'symbol': 'A', 'price': math.nan}, {'symbol': 'B', 'extra': 'x'}])
+        assert 'extra' not in store[0]
+        assert store[1]['extra'] == 'x'
+        assert math.isnan(store[0]['price'])
+        assert store.to_records(json_safe=True)[0] == {'symbol': 'A', 'price': None}
+
+    def test_unchanged_chunks_are_reused(self):
+        """Test that rebuilding with the previous store shares unchanged chunks."""
+        size = 3 * market_store.CHUNK_ROWS
+        first = MarketStore.from_records(_records(size))
+        changed = _records(size)
+        changed[5]['price'] = 1.0
+        second = MarketStore.from_records(changed, previous=first)
+        assert second.chunks_reused == 2
+        assert second.chunks[0] is not first.chunks[0]
+        assert second[market_store.CHUNK_ROWS].same_row(first[market_store.CHUNK_ROWS])
+        assert not second[5].same_row(first[5])
+        assert second[5]['price'] == 1.0 and first[5]['price'] == 105.0
+
+    def test_pickle_round_trip(self):
+        """Test that stores survive the trip to analysis pool workers."""
+        store = MarketStore.from_records([{'symbol': 'A', 'price': 1.0}, {'symbol': 'B'}])
+        copy = pickle.loads(pickle.dumps(store))
+        assert copy.to_records() == store.to_records()
+        assert 'price' not in copy[1]
+
+    def test_memory_report(self):
+        """Test that the store reports fewer bytes per symbol than dict records."""
+        report = MarketStore.from_records(_records(2000)).memory_report()
+        assert report['symbols'] == 2000
+        assert 0 < report['bytes_per_symbol'] < report['dict_records_bytes_per_symbol']
+
+
+class TestMarketEndpoints:
+    """Test cases for the market payload and memory report endpoints."""
+
+    def test_market_payload_and_memory_report(self):
+        """Test that /api/market serves the records and /api/market/memory reports sizes."""
+        with TestClient(main.app) as client:
+            market_response = client.get('/api/market')
+            assert market_response.status_code == 200
+            assert market_response.json() == market.load_market(DATA_FILE)
+
+            memory = client.get('/api/market/memory').json()
+            assert memory['symbols'] == len(market_response.json())
+            assert memory['bytes_per_symbol'] > 0
+            parts = ('store_bytes', 'signals_bytes', 'search_index_bytes', 'screen_index_bytes', 'market_json_bytes')
+            assert all(memory[part] > 0 for part in parts)
+            assert memory['total_bytes'] == sum(memory[part] for part in parts)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,161 @@
+import pytest
+import sys
+import os
+import asyncio
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import portfolio_watch
+from portfolio_watch import PortfolioWatcher, advice_delta, changed_symbols
+from snapshot import MarketSnapshot
+
+
+def stock(symbol, sector, price=100.0, change_7d_pct=0.0, volatility=0.01):
+    return {'symbol': symbol, 'name': symbol, 'sector': sector, 'price': price,
+            'change_1d_pct': 0.0, 'change_7d_pct': change_7d_pct, 'volatility': volatility,
+            'market_cap_cr': 1000}
+
+
+def universe(size):
+    return [stock(f'S{i}', f'Sector{i % 4}') for i in range(size)]
+
+
+class TestPortfolioWatch:
+    """Test cases for saved portfolios and incremental re-evaluation."""
+
+    def test_changed_symbols_detects_updates_additions_and_removals(self):
+        """Test the snapshot diff used to find affected portfolios."""
+        old = MarketSnapshot([stock('A', 'IT'), stock('B', 'IT')], version=1)
+        new = MarketSnapshot([stock('A', 'IT'), stock('B', 'IT', price=101.0), stock('C', 'IT')], version=2)
+        assert changed_symbols(old, new) == {'B', 'C'}
+        assert changed_symbols(new, old) == {'B', 'C'}
+
+    def test_nan_fields_are_not_reported_as_changes(self):
+        """Test that rebuilt records holding NaN compare equal to their previous values."""
+        old = MarketSnapshot([stock('A', 'IT', volatility=float('nan')), stock('B', 'IT')], version=1)
+        new = MarketSnapshot([stock('A', 'IT', volatility=float('nan')), stock('B', 'IT')], version=2)
+        assert changed_symbols(old, new) == set()
+
+        watcher = PortfolioWatcher()
+        saved = watcher.register([{'symbol': 'A', 'quantity': 1}],
+                                 MarketSnapshot([stock('A', 'IT', price=float('nan'))], version=1))
+        watcher.on_snapshot(MarketSnapshot([stock('A', 'IT', price=float('nan')), stock('B', 'IT')], version=2))
+        assert asyncio.run(watcher.drain_updates(saved.id)) == []
+
+    def test_only_unshared_chunks_are_diffed(self, monkeypatch):
+        """Test that rows in chunks shared between snapshots are never compared."""
+        compared = []
+        original = portfolio_watch.same_record
+        monkeypatch.setattr(portfolio_watch, 'same_record', lambda a, b: compared.append(b) or original(a, b))
+        records = universe(1000)
+        old = MarketSnapshot(records, version=1)
+        changed = list(records)
+        changed[700] = stock('S700', 'Sector0', price=1.0)
+        new = MarketSnapshot(changed, version=2, previous=old)
+        assert changed_symbols(old, new) == {'S700'}
+        assert 0 < len(compared) <= new.store.chunks[0].length
+
+    def test_per_client_limit_and_expiry(self):
+        """Test that each client has its own cap and idle portfolios expire."""
+        watcher = PortfolioWatcher(max_per_client=2, ttl=60)
+        snapshot = MarketSnapshot([stock('A', 'IT')], version=1)
+        portfolio = [{'symbol': 'A', 'quantity': 1}]
+        first = watcher.register(portfolio, snapshot, client='1.2.3.4')
+        watcher.register(portfolio, snapshot, client='1.2.3.4')
+        with pytest.raises(OverflowError):
+            watcher.register(portfolio, snapshot, client='1.2.3.4')
+        watcher.register(portfolio, snapshot, client='5.6.7.8')
+
+        assert watcher.expire(now=first.last_access + 30) == 0
+        assert watcher.expire(now=first.last_access + 3600) == 3
+        assert watcher.get(first.id) is None
+        metrics = watcher.get_metrics()
+        assert metrics['saved_portfolios'] == 0 and metrics['watched_symbols'] == 0 and metrics['clients'] == 0
+
+    def test_advice_delta(self):
+        """Test that deltas list advice gained and lost."""
+        old = [{'symbol': 'A', 'action': 'caution', 'message': 'm1'}]
+        new = [{'symbol': 'A', 'action': 'reduce', 'message': 'm2'}]
+        delta = advice_delta(old, new)
+        assert delta['added'] == new
+        assert delta['removed'] == old
+
+    def test_only_portfolios_holding_changed_symbols_are_reevaluated(self):
+        """Test that a refresh touching 1% of the universe re-runs ~1% of portfolios."""
+        watcher = PortfolioWatcher()
+        records = universe(100)
+        first = MarketSnapshot(records, version=1)
+        saved = [watcher.register([{'symbol': f'S{i}', 'quantity': 1},
+                                   {'symbol': f'S{(i + 50) % 100}', 'quantity': 1}], first)
+                 for i in range(100)]
+        watcher.on_snapshot(first)
+
+        changed = list(records)
+        changed[7] = stock('S7', 'Sector3', change_7d_pct=-9.0)
+        watcher.on_snapshot(MarketSnapshot(changed, version=2))
+
+        metrics = watcher.get_metrics()
+        assert metrics['last_changed_symbols'] == 1
+        assert metrics['last_reevaluated'] == 2  # S7 is held by portfolio 7 and portfolio 57
+
+        updates = asyncio.run(watcher.drain_updates(saved[7].id))
+        assert len(updates) == 1
+        assert {'symbol': 'S7', 'action': 'reduce',
+                'message': 'Recent sharp drop — consider reducing or reviewing reason.'} in updates[0]['added']
+        assert asyncio.run(watcher.drain_updates(saved[8].id)) == []
+
+    def test_long_poll_wakes_on_update(self):
+        """Test that a waiting client is released when an update is queued."""
+        watcher = PortfolioWatcher()
+        first = MarketSnapshot([stock('A', 'IT'), stock('B', 'Pharma')], version=1)
+        saved = watcher.register([{'symbol': 'A', 'quantity': 1}, {'symbol': 'B', 'quantity': 1}], first)
+
+        async def run():
+            poll = asyncio.create_task(watcher.drain_updates(saved.id, wait=5))
+            await asyncio.sleep(0.01)
+            watcher.on_snapshot(MarketSnapshot([stock('A', 'IT', price=500.0), stock('B', 'Pharma')], version=2))
+            return await asyncio.wait_for(poll, timeout=1)
+
+        updates = asyncio.run(run())
+        assert updates[0]['snapshot_version'] == 2
+
+    def test_reevaluation_runs_in_batches_on_the_loop(self):
+        """Test that a refresh inside the event loop re-analyzes in batches, yielding in between."""
+        watcher = PortfolioWatcher(batch_size=2)
+        first = MarketSnapshot([stock('A', 'IT'), stock('B', 'Pharma')], version=1)
+        saved = [watcher.register([{'symbol': 'A', 'quantity': i + 1}, {'symbol': 'B', 'quantity': 1}], first)
+                 for i in range(5)]
+
+        async def run():
+            watcher.on_snapshot(MarketSnapshot([stock('A', 'IT', price=500.0), stock('B', 'Pharma')], version=2))
+            pending = [watcher.get_metrics()['pending_reevaluations']]
+            for _ in range(3):
+                await asyncio.sleep(0)
+                pending.append(watcher.get_metrics()['pending_reevaluations'])
+            return pending
+
+        assert asyncio.run(run()) == [5, 3, 1, 0]
+        assert watcher.get_metrics()['last_reevaluated'] == 5
+        assert all(s.snapshot_version == 2 for s in saved)
+
+    def test_holdings_limit(self):
+        """Test that oversized portfolios are rejected before being evaluated."""
+        watcher = PortfolioWatcher(max_holdings=2)
+        snapshot = MarketSnapshot([stock('A', 'IT')], version=1)
+        with pytest.raises(ValueError):
+            watcher.register([{'symbol': 'A', 'quantity': 1}] * 3, snapshot)
+        watcher.register([{'symbol': 'A', 'quantity': 1}] * 2, snapshot)
+        assert watcher.get_metrics()['saved_portfolios'] == 1
+
+    def test_remove_cleans_reverse_index(self):
+        """Test that removed portfolios stop being watched."""
+        watcher = PortfolioWatcher()
+        saved = watcher.register([{'symbol': 'A', 'quantity': 1}], MarketSnapshot([stock('A', 'IT')], version=1))
+        assert watcher.remove(saved.id)
+        assert not watcher.remove(saved.id)
+        assert watcher.get_metrics()['watched_symbols'] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,119 @@
+import pytest
+import sys
+import os
+import threading
+import time
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi.testclient import TestClient
+
+import main
+import profiler
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestSampleStacks:
+    """Test cases for the wall-clock stack sampler."""
+
+    def test_collects_busy_thread_stacks(self):
+        """Test that a busy thread shows up in collapsed stacks under its name."""
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_loop, args=(stop,), name='busy-worker')
+        worker.start()
+        try:
+            result = profiler.sample_stacks(0.2, interval=0.005)
+        finally:
+            stop.set()
+            worker.join()
+
+        assert result['samples'] > 0
+        busy = [stack for stack in result['collapsed'] if stack.startswith('busy-worker;')]
+        assert busy
+        assert any('_busy_loop' in stack for stack in busy)
+
+    def test_rejects_concurrent_runs(self):
+        """Test that only one sampling run can be active at a time."""
+        with profiler._sampling_lock:
+            with pytest.raises(RuntimeError):
+                profiler.sample_stacks(0.01)
+
+    def test_format_collapsed_orders_by_weight(self):
+        """Test the flamegraph text format."""
+        text = profiler.format_collapsed({'main;a': 1, 'main;b': 5})
+        assert text == 'main;b 5\nmain;a 1\n'
+
+
+class TestAdminEndpoints:
+    """Test cases for the admin profiling endpoints."""
+
+    def test_disabled_without_admin_token(self, monkeypatch):
+        """Test that admin endpoints are hidden when ADMIN_TOKEN is unset."""
+        monkeypatch.setattr(profiler, 'ADMIN_TOKEN', None)
+        client = TestClient(main.app)
+        assert client.get('/api/admin/profile/requests').status_code == 404
+
+    def test_rejects_wrong_token(self, monkeypatch):
+        """Test that a wrong token is refused."""
+        monkeypatch.setattr(profiler, 'ADMIN_TOKEN', 'secret')
+        client = TestClient(main.app)
+        response = client.get('/api/admin/profile/requests', headers={'X-Admin-Token': 'nope'})
+        assert response.status_code == 403
+
+    def test_sample_endpoint_returns_collapsed_text(self, monkeypatch):
+        """Test that the sampling endpoint returns flamegraph-ready text."""
+        monkeypatch.setattr(profiler, 'ADMIN_TOKEN', 'secret')
+        client = TestClient(main.app)
+        response = client.get('/api/admin/profile', params={'seconds': 0.1, 'include_idle': True},
+                              headers={'X-Admin-Token': 'secret'})
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/plain')
+        assert int(response.headers['x-profile-samples']) > 0
+        first = response.text.splitlines()[0]
+        stack, count = first.rsplit(' ', 1)
+        assert ';' in stack and int(count) > 0
+
+    def test_request_profiles_over_threshold_are_buffered(self, monkeypatch):
+        """Test the per-request mode toggle and buffer."""
+        monkeypatch.setattr(profiler, 'ADMIN_TOKEN', 'secret')
+        headers = {'X-Admin-Token': 'secret'}
+        client = TestClient(main.app)
+        try:
+            response = client.post('/api/admin/profile/requests', json={'enabled': True, 'threshold_ms': 0},
+                                   headers=headers)
+            assert response.json()['enabled'] is True
+
+            client.get('/health/live')
+            body = client.get('/api/admin/profile/requests', headers=headers).json()
+            paths = [p['path'] for p in body['profiles']]
+            assert '/health/live' in paths
+            profile = body['profiles'][paths.index('/health/live')]
+            assert 'function calls' in profile['profile']
+        finally:
+            client.post('/api/admin/profile/requests', json={'enabled': False}, headers=headers)
+            client.delete('/api/admin/profile/requests', headers=headers)
+
+    def test_fast_requests_are_not_buffered(self, monkeypatch):
+        """Test that requests under the threshold are profiled but not kept."""
+        monkeypatch.setattr(profiler, 'ADMIN_TOKEN', 'secret')
+        headers = {'X-Admin-Token': 'secret'}
+        client = TestClient(main.app)
+        client.delete('/api/admin/profile/requests', headers=headers)
+        try:
+            client.post('/api/admin/profile/requests', json={'enabled': True, 'threshold_ms': 60000},
+                        headers=headers)
+            client.get('/health/live')
+            body = client.get('/api/admin/profile/requests', headers=headers).json()
+            assert body['profiles'] == []
+            assert body['status']['profiled'] >= 1
+        finally:
+            client.post('/api/admin/profile/requests', json={'enabled': False}, headers=headers)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,217 @@
+import pytest
+import sys
+import os
+import asyncio
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import refresh_scheduler
+from refresh_scheduler import RefreshScheduler
+
+
+def _write_atomically(path, text):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class _Recorder:
+    """Refresh callback that records the file contents it read."""
+
+    def __init__(self, path, ok=True):
+        self.path = path
+        self.ok = ok
+        self.seen = []
+
+    async def __call__(self):
+        with open(self.path) as f:
+            self.seen.append(f.read())
+        return self.ok
+
+
+async def _run_scheduler(scheduler, actions):
+    task = asyncio.create_task(scheduler.run())
+    try:
+        await asyncio.sleep(0.05)
+        await actions()
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / 'stocks.csv'
+    path.write_text('v0')
+    return str(path)
+
+
+class TestRefreshScheduler:
+    """Test cases for change-driven market refreshes."""
+
+    @pytest.mark.parametrize('watcher', ['inotify', 'polling'])
+    def test_reloads_complete_file_after_atomic_rename(self, data_file, watcher):
+        """Test that a renamed-in file triggers one reload that sees the whole file."""
+        if watcher == 'inotify' and not sys.platform.startswith('linux'):
+            pytest.skip('inotify is Linux only')
+        refresh = _Recorder(data_file)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0, max_interval=60,
+                                     debounce=0.05, watcher=watcher, poll_interval=0.05)
+
+        async def actions():
+            _write_atomically(data_file, 'v1')
+            await asyncio.sleep(0.5)
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+        assert refresh.seen == ['v0', 'v1']
+        metrics = scheduler.get_metrics()
+        assert metrics['watcher'] == watcher
+        assert metrics['change_refreshes'] == 1
+        assert metrics['reaction_latency_ms']['samples'] == 1
+        assert metrics['staleness_seconds'] == 0.0
+
+    def test_burst_of_writes_is_debounced(self, data_file):
+        """Test that writes closer together than the debounce window cause one reload."""
+        refresh = _Recorder(data_file)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0, max_interval=60, debounce=0.2)
+
+        async def actions():
+            for version in range(1, 6):
+                _write_atomically(data_file, f'v{version}')
+                await asyncio.sleep(0.02)
+            await asyncio.sleep(0.5)
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+        assert refresh.seen == ['v0', 'v5']
+        assert scheduler.get_metrics()['coalesced_changes'] >= 1
+
+    def test_in_place_write_is_read_after_close(self, data_file):
+        """Test that a file written in place is only reloaded once the writer closed it."""
+        refresh = _Recorder(data_file)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0, max_interval=60, debounce=0.01)
+
+        async def actions():
+            with open(data_file, 'w') as f:
+                f.write('partial')
+                f.flush()
+                await asyncio.sleep(0.2)
+                f.write(' and complete')
+            await asyncio.sleep(0.3)
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+        assert refresh.seen == ['v0', 'partial and complete']
+
+    def test_appends_notify_when_watching_modifications(self, data_file):
+        """Test that an append-only stream is refreshed while its writer keeps it open."""
+        if not sys.platform.startswith('linux'):
+            pytest.skip('inotify is Linux only')
+        refresh = _Recorder(data_file)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0, max_interval=60, debounce=0.01,
+                                     watcher='inotify', on_modify=True)
+
+        async def actions():
+            with open(data_file, 'a') as f:
+                f.write(' v1')
+                f.flush()
+                await asyncio.sleep(0.3)
+                assert refresh.seen == ['v0', 'v0 v1']
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+
+    def test_min_interval_spaces_out_refreshes(self, data_file):
+        """Test that a change right after a refresh waits for the minimum interval."""
+        refresh = _Recorder(data_file)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0.5, max_interval=60, debounce=0.01)
+
+        async def actions():
+            _write_atomically(data_file, 'v1')
+            await asyncio.sleep(0.2)
+            assert refresh.seen == ['v0']
+            assert scheduler.staleness_seconds() > 0
+            await asyncio.sleep(0.6)
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+        assert refresh.seen == ['v0', 'v1']
+        assert scheduler.get_metrics()['min_interval_delays'] == 1
+
+    def test_max_interval_forces_refresh_without_changes(self, data_file):
+        """Test the safety-net refresh when no change is notified."""
+        refresh = _Recorder(data_file)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0, max_interval=0.2)
+
+        async def actions():
+            await asyncio.sleep(0.5)
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+        assert len(refresh.seen) >= 2
+        assert scheduler.get_metrics()['max_interval_refreshes'] >= 1
+
+    def test_failed_refresh_keeps_change_pending(self, data_file):
+        """Test that staleness keeps growing while reloads of a change fail."""
+        refresh = _Recorder(data_file, ok=False)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0, max_interval=60, debounce=0.01)
+
+        async def actions():
+            _write_atomically(data_file, 'broken')
+            await asyncio.sleep(0.3)
+            assert scheduler.staleness_seconds() >= 0.2
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+        assert scheduler.get_metrics()['failed_refreshes'] >= 2
+
+    def test_failed_refresh_is_retried_with_backoff(self, data_file):
+        """Test that a failed reload is retried without a new change, backing off, until it succeeds."""
+        refresh = _Recorder(data_file, ok=False)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0.1, max_interval=60, debounce=0.01)
+
+        async def actions():
+            _write_atomically(data_file, 'v2')
+            await asyncio.sleep(0.5)
+            # Change at ~0, then retries 0.1 and 0.2 seconds after each failed attempt
+            assert 3 <= len(refresh.seen) <= 4
+            assert scheduler.get_metrics()['retry_delay_s'] >= 0.4
+            refresh.ok = True
+            await asyncio.sleep(0.9)
+            assert scheduler.staleness_seconds() == 0.0
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+        metrics = scheduler.get_metrics()
+        assert metrics['retry_refreshes'] == 1
+        assert metrics['retry_delay_s'] is None
+        assert metrics['max_interval_refreshes'] == 0
+
+    def test_staleness_counts_from_earliest_pending_change(self, data_file):
+        """Test that a later change does not reset the age of an earlier one still pending."""
+        refresh = _Recorder(data_file, ok=False)
+        scheduler = RefreshScheduler(data_file, refresh, min_interval=0, max_interval=60, debounce=0.01)
+
+        async def actions():
+            _write_atomically(data_file, 'v2')
+            await asyncio.sleep(0.3)
+            _write_atomically(data_file, 'v3')
+            await asyncio.sleep(0.1)
+            assert scheduler.staleness_seconds() >= 0.35
+
+        asyncio.run(_run_scheduler(scheduler, actions))
+
+    def test_auto_falls_back_to_polling(self, data_file, monkeypatch):
+        """Test that the scheduler polls when inotify cannot be used."""
+        def unavailable(path, on_modify=False):
+            raise OSError('no inotify here')
+        monkeypatch.setattr(refresh_scheduler, 'InotifyWatcher', unavailable)
+
+        async def open_and_close():
+            watcher = refresh_scheduler.open_watcher(data_file, 'auto', 0.05)
+            watcher.close()
+            return watcher.kind
+
+        assert asyncio.run(open_and_close()) == 'polling'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
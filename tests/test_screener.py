@@ -0,0 +1,123 @@
+import pytest
+import sys
+import os
+import random
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi.testclient import TestClient
+
+import main
+import market_updater
+from screener import ScreenIndex, SCREEN_FIELDS
+from snapshot import MarketSnapshot
+
+
+SECTORS = ['IT', 'Pharma', 'Banking', 'Energy']
+
+
+def _universe(size, seed=7):
+    rng = random.Random(seed)
+    return [
+        {'symbol': f'S{i}', 'name': f'Stock {i}', 'sector': SECTORS[i % len(SECTORS)],
+         'price': 100.0, 'change_1d_pct': round(rng.uniform(-5, 5), 2),
+         'change_7d_pct': round(rng.uniform(-10, 10), 2), 'volatility': round(rng.uniform(0.005, 0.08), 4),
+         'market_cap_cr': float(rng.randint(1000, 900000))}
+        for i in range(size)
+    ]
+
+
+def _scan(records, field, sector=None, lo=None, hi=None, descending=True):
+    rows = [r for r in records
+            if (sector is None or r['sector'] == sector)
+            and (lo is None or r[field] >= lo) and (hi is None or r[field] <= hi)]
+    return sorted(rows, key=lambda r: r[field], reverse=descending)
+
+
+class TestScreenIndex:
+    """Test cases for sorted-index screening against a brute-force scan."""
+
+    def test_matches_scan_for_ranges_sectors_and_pages(self):
+        """Test range filters, sector partitions, order and pagination."""
+        records = _universe(400)
+        index = ScreenIndex(records)
+        for field in SCREEN_FIELDS:
+            for sector in (None, 'Pharma'):
+                for order in ('asc', 'desc'):
+                    values = sorted(r[field] for r in records)
+                    lo, hi = values[50], values[300]
+                    expected = _scan(records, field, sector, lo, hi, order == 'desc')
+                    result = index.screen(field, sector, lo, hi, order, offset=10, limit=25)
+                    assert result['total'] == len(expected)
+                    assert [r[field] for r in result['records']] == [r[field] for r in expected[10:35]]
+
+    def test_top_k_and_past_the_end(self):
+        """Test unbounded top-k and an offset beyond the matches."""
+        records = _universe(100)
+        index = ScreenIndex(records)
+        top = index.screen('change_1d_pct', limit=5)['records']
+        assert [r['symbol'] for r in top] == [r['symbol'] for r in _scan(records, 'change_1d_pct')[:5]]
+        assert index.screen('volatility', offset=1000)['records'] == []
+        assert index.screen('volatility', order='asc', offset=1000)['records'] == []
+
+    def test_unknown_sector_and_missing_values(self):
+        """Test that unknown sectors are empty and NaN values are not indexed."""
+        records = _universe(10)
+        records[0]['volatility'] = float('nan')
+        index = ScreenIndex(records)
+        assert index.screen('volatility', sector='Nope')['total'] == 0
+        assert index.screen('volatility', limit=100)['total'] == 9
+
+    def test_store_index_is_compact_and_reported(self):
+        """Test that a snapshot's index matches the dict index, holds typed arrays and is counted in its memory."""
+        records = _universe(2000)
+        snapshot = MarketSnapshot(records, 1)
+        assert snapshot.memory_report()['screen_index_bytes'] == 0
+
+        index = snapshot.screen_index
+        expected = ScreenIndex(records).screen('change_7d_pct', 'IT', -5.0, 5.0, offset=7, limit=30)
+        result = index.screen('change_7d_pct', 'IT', -5.0, 5.0, offset=7, limit=30)
+        assert result['total'] == expected['total']
+        assert [r['symbol'] for r in result['records']] == [r['symbol'] for r in expected['records']]
+        # Overall and per-sector positions (4 bytes) and keys (8 bytes) for each field
+        assert index.nbytes() < 2 * len(SCREEN_FIELDS) * 12 * len(records) * 1.25
+        assert snapshot.memory_report()['screen_index_bytes'] == index.nbytes()
+
+    def test_rejects_unknown_field(self):
+        """Test validation of field and order."""
+        index = ScreenIndex(_universe(5))
+        with pytest.raises(ValueError):
+            index.screen('price')
+        with pytest.raises(ValueError):
+            index.screen('volatility', order='sideways')
+
+
+class TestScreenEndpoint:
+    """Test cases for /api/screen."""
+
+    def test_screen_endpoint(self):
+        """Test top movers from the loaded snapshot."""
+        with TestClient(main.app) as client:
+            response = client.get('/api/screen', params={'field': 'change_1d_pct', 'limit': 3})
+            assert response.status_code == 200
+            body = response.json()
+            values = [r['change_1d_pct'] for r in body['results']]
+            assert values == sorted(values, reverse=True)
+            assert body['total'] >= len(values)
+
+            assert client.get('/api/screen', params={'field': 'price'}).status_code == 400
+            assert client.get('/api/screen', params={'limit': 0}).status_code == 400
+
+    def test_nan_fields_are_returned_as_null(self, monkeypatch):
+        """Test that rows with NaN in a non-screened field serialize as null instead of failing."""
+        records = _universe(5)
+        records[2]['price'] = float('nan')
+        monkeypatch.setattr(market_updater, 'get_snapshot', lambda: MarketSnapshot(records, version=1))
+        response = TestClient(main.app).get('/api/screen', params={'field': 'volatility', 'limit': 5})
+        assert response.status_code == 200
+        assert None in [r['price'] for r in response.json()['results']]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
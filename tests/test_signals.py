@@ -0,0 +1,81 @@
+import pytest
+import sys
+import os
+import math
+import random
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from advisor import (analyze_portfolio, build_signal_table, SIGNAL_DROP, SIGNAL_GROWTH,
+                     SIGNAL_MOMENTUM, SIGNAL_VOLATILE)
+
+
+def random_market(rng, size):
+    """Market whose values straddle every rule threshold, including exact boundaries and NaN."""
+    change_choices = [-8.0, -5.0, -4.9, 0.0, 2.0, 2.1, 4.0, 5.0, 5.1, 9.0, math.nan]
+    volatility_choices = [0.01, 0.04, 0.041, 0.08, math.nan]
+    sectors = ['IT', 'Energy', 'Pharma', 'Banking']
+    return [
+        {
+            'symbol': f'S{i}',
+            'name': f'Stock {i}',
+            'sector': rng.choice(sectors),
+            'price': rng.choice([10.0, 250.0, 1700.0, 3300.0]),
+            'change_1d_pct': 0.0,
+            'change_7d_pct': rng.choice(change_choices),
+            'volatility': rng.choice(volatility_choices),
+            'market_cap_cr': 1000,
+        }
+        for i in range(size)
+    ]
+
+
+def same_result(a, b):
+    """Compare analysis results, treating NaN fields as equal."""
+    return repr(a) == repr(b)
+
+
+class TestSignalTable:
+    """Test cases for precomputed per-symbol signals."""
+
+    def test_signal_bits(self):
+        """Test that each stock-only rule maps to its bit."""
+        table = build_signal_table([
+            {'symbol': 'A', 'change_7d_pct': -7.0, 'volatility': 0.05},
+            {'symbol': 'B', 'change_7d_pct': 6.0, 'volatility': 0.01},
+            {'symbol': 'C', 'change_7d_pct': 3.0, 'volatility': 0.04},
+        ])
+        assert table['A'].mask == SIGNAL_DROP | SIGNAL_VOLATILE
+        assert table['B'].mask == SIGNAL_GROWTH | SIGNAL_MOMENTUM
+        assert table['C'].mask == SIGNAL_MOMENTUM
+
+    def test_first_duplicate_symbol_wins(self):
+        """Test that duplicate symbols resolve like get_stock_by_symbol."""
+        table = build_signal_table([
+            {'symbol': 'A', 'price': 1.0, 'change_7d_pct': 0.0, 'volatility': 0.0},
+            {'symbol': 'A', 'price': 2.0, 'change_7d_pct': 0.0, 'volatility': 0.0},
+        ])
+        assert table['A'].stock['price'] == 1.0
+
+    @pytest.mark.parametrize('seed', range(25))
+    def test_equivalent_to_reference_path(self, seed):
+        """Test that the signal path returns exactly what the reference path returns."""
+        rng = random.Random(seed)
+        market = random_market(rng, 12)
+        signals = build_signal_table(market)
+
+        for _ in range(40):
+            size = rng.choice([0, 1, 2, 3, 5, 8])
+            # Duplicates and unknown symbols are deliberately included
+            portfolio = [
+                {'symbol': rng.choice([f'S{i}' for i in range(14)]), 'quantity': rng.choice([0, 1, 3, 40, 500])}
+                for _ in range(size)
+            ]
+            expected = analyze_portfolio(portfolio, market)
+            actual = analyze_portfolio(portfolio, market, signals)
+            assert same_result(actual, expected), portfolio
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
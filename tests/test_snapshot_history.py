@@ -0,0 +1,148 @@
+import pytest
+import sys
+import os
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi.testclient import TestClient
+
+import main
+import market_store
+import usage_store
+from snapshot import MarketSnapshot, SnapshotHistory, EMPTY_SNAPSHOT
+
+
+def _universe(size, bumped=()):
+    return [
+        {'symbol': f'S{i}', 'name': f'Stock {i}', 'sector': 'IT' if i % 2 else 'Pharma',
+         'price': 100.0 + i + (1.0 if i in bumped else 0.0), 'change_1d_pct': 0.5,
+         'change_7d_pct': 3.0, 'volatility': 0.02, 'market_cap_cr': 1000.0 + i}
+        for i in range(size)
+    ]
+
+
+@pytest.fixture
+def isolated_files(tmp_path, monkeypatch):
+    """Keep billing and usage files written by /api/analyze out of the working tree."""
+    monkeypatch.chdir(tmp_path)
+    # Usage state loaded here would otherwise be flushed by later apps, into their working directory
+    monkeypatch.setattr(usage_store, '_usage_cache', None)
+    monkeypatch.setattr(usage_store, '_rollup', None)
+    return tmp_path
+
+
+def _publish(history, previous, records, published_at):
+    snapshot = MarketSnapshot(records, previous.version + 1, published_at, previous=previous)
+    history.add(snapshot)
+    return snapshot, snapshot.store.chunks_reused
+
+
+class TestStructuralSharing:
+    """Test cases for sharing unchanged store chunks between snapshots."""
+
+    def test_unchanged_records_and_signals_are_shared(self):
+        """Test that only the chunk holding a changed symbol is rebuilt and symbol lookups are shared."""
+        rows = market_store.CHUNK_ROWS
+        first = MarketSnapshot(_universe(3 * rows), 1)
+        second = MarketSnapshot(_universe(3 * rows, bumped={rows + 3}), 2, previous=first)
+
+        assert second.store.chunks_reused == 2
+        assert second.get('S0').same_row(first.get('S0'))
+        assert second.signals.positions is first.signals.positions
+        assert not second.get(f'S{rows + 3}').same_row(first.get(f'S{rows + 3}'))
+        assert second.get(f'S{rows + 3}')['price'] == 104.0 + rows
+
+    def test_first_snapshot_shares_nothing(self):
+        """Test publishing on top of the empty placeholder."""
+        snapshot = MarketSnapshot(_universe(3), 1, previous=EMPTY_SNAPSHOT)
+        assert snapshot.store.chunks_reused == 0
+        assert len(snapshot.records) == 3
+
+
+class TestSnapshotHistory:
+    """Test cases for the bounded snapshot history."""
+
+    def test_lookup_by_version_and_time(self):
+        """Test version and as-of-time lookups, including eviction."""
+        history = SnapshotHistory(3)
+        snapshot = EMPTY_SNAPSHOT
+        for i in range(5):
+            snapshot, _ = _publish(history, snapshot, _universe(4, bumped={i}), 1000.0 + 30 * i)
+
+        assert history.versions() == [3, 4, 5]
+        assert history.get_version(4).version == 4
+        assert history.get_version(1) is None
+        assert history.at_time(1075.0).version == 3
+        assert history.at_time(1090.0).version == 4
+        assert history.at_time(5000.0).version == 5
+        assert history.at_time(1000.0) is None
+
+    def test_memory_scales_with_churn(self):
+        """Test that retained chunks grow with changed symbols, not history length."""
+        history = SnapshotHistory(20)
+        snapshot = EMPTY_SNAPSHOT
+        size = 20 * market_store.CHUNK_ROWS
+        for i in range(20):
+            snapshot, _ = _publish(history, snapshot, _universe(size, bumped={i}), 1000.0 + i)
+
+        report = history.memory_report()
+        assert report['records_referenced'] == 20 * size
+        # 20 initial chunks, then one changed chunk per refresh (bump on, previous bump off)
+        assert report['chunks_unique'] == 20 + 19
+        assert report['estimated_bytes'] * 5 < report['estimated_bytes_without_sharing']
+        # Price-only refreshes share one search index and one symbol -> position map
+        assert report['search_index_bytes'] == snapshot.search_index.nbytes()
+        assert 0 < report['signals_bytes'] * 3 < 20 * snapshot.memory_report()['signals_bytes']
+
+    def test_superseded_snapshot_drops_cached_json(self):
+        """Test that the serialized payload is released, and not cached again, once a snapshot is replaced."""
+        old = MarketSnapshot(_universe(10), 1)
+        body = old.market_json()
+        assert old._market_json is body
+        old.supersede()
+        assert old._market_json is None
+        assert old.market_json() == body
+        assert old._market_json is None
+
+    def test_superseded_snapshot_keeps_no_screen_index(self):
+        """Test that replaced snapshots drop their screen index and only build one per as_of query."""
+        old = MarketSnapshot(_universe(10), 1)
+        assert old.screen_index is old.screen_index
+        new = MarketSnapshot(_universe(10, bumped={3}), 2, previous=old)
+        old.supersede()
+        assert old._screen_index is None
+        assert old.screen_index.screen('volatility')['total'] == 10
+        assert old._screen_index is None
+        assert new.screen_index is new.screen_index
+
+
+class TestAsOfEndpoints:
+    """Test cases for as_of on /api/market and /api/analyze."""
+
+    def test_market_and_analyze_as_of_version(self, isolated_files):
+        """Test that a retained version can be requested and is echoed back."""
+        with TestClient(main.app) as client:
+            history = client.get('/api/market/history').json()
+            version = history['versions'][-1]
+
+            market = client.get('/api/market', params={'as_of': str(version)})
+            assert market.status_code == 200
+            assert len(market.json()) > 0
+
+            symbol = market.json()[0]['symbol']
+            response = client.post('/api/analyze', params={'as_of': str(version)},
+                                   json={'portfolio': [{'symbol': symbol, 'quantity': 1}]})
+            assert response.status_code == 200
+            assert response.json()['snapshot_version'] == version
+
+    def test_as_of_errors(self):
+        """Test malformed and out-of-history as_of values."""
+        with TestClient(main.app) as client:
+            assert client.get('/api/market', params={'as_of': 'yesterday'}).status_code == 400
+            assert client.get('/api/market', params={'as_of': '999999'}).status_code == 404
+            assert client.get('/api/market', params={'as_of': '2000-01-01T00:00:00'}).status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
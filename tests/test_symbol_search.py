@@ -0,0 +1,130 @@
+import pytest
+import sys
+import os
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from fastapi.testclient import TestClient
+
+import main
+import market_updater
+from snapshot import MarketSnapshot
+from symbol_search import SymbolSearchIndex, tokenize
+
+
+RECORDS = [
+    {'symbol': 'TCS', 'name': 'Tata Consultancy Services'},
+    {'symbol': 'TATAMOTORS', 'name': 'Tata Motors'},
+    {'symbol': 'INFY', 'name': 'Infosys'},
+    {'symbol': 'INF', 'name': 'Infinite Holdings'},
+    {'symbol': 'HDFCBANK', 'name': 'HDFC Bank'},
+    {'symbol': 'SUNPHARMA', 'name': 'Sun Pharmaceutical Industries'},
+]
+
+
+def _filler(count):
+    return [{'symbol': f'ZZ{i:04d}', 'name': f'Filler Company {i}'} for i in range(count)]
+
+
+class TestSymbolSearchIndex:
+    """Test cases for prefix matching and ranking."""
+
+    def test_tokenize(self):
+        """Test case folding and punctuation splitting."""
+        assert tokenize('  Sun Pharma-ceutical  Ltd. ') == ['sun', 'pharma', 'ceutical', 'ltd']
+
+    def test_symbol_matches_rank_before_names(self):
+        """Test that exact and prefix symbol matches come before name matches."""
+        index = SymbolSearchIndex.from_records(RECORDS)
+        assert index.search('inf') == ['INF', 'INFY']
+        assert index.search('tata') == ['TATAMOTORS', 'TCS']
+        assert index.search('TCS') == ['TCS']
+
+    def test_name_token_prefix_and_multiple_terms(self):
+        """Test matching any word of the name, and requiring every term."""
+        index = SymbolSearchIndex.from_records(RECORDS)
+        assert index.search('bank') == ['HDFCBANK']
+        assert index.search('pharmaceut') == ['SUNPHARMA']
+        assert index.search('tata cons') == ['TCS']
+        assert index.search('mot tata') == ['TATAMOTORS']
+        assert index.search('tata nothing') == []
+
+    def test_limit_and_empty_query(self):
+        """Test the result limit and queries without tokens."""
+        index = SymbolSearchIndex.from_records(RECORDS + _filler(100))
+        assert len(index.search('filler', limit=7)) == 7
+        assert index.search('  ') == []
+
+
+class TestIncrementalRebuild:
+    """Test cases for reusing and patching the previous index."""
+
+    def test_unchanged_names_reuse_index(self):
+        """Test that a price-only refresh reuses the same index object."""
+        first = SymbolSearchIndex.from_records(RECORDS)
+        repriced = [dict(record, price=1.0) for record in RECORDS]
+        assert SymbolSearchIndex.from_records(repriced, previous=first) is first
+
+    def test_few_changes_patch_matches_full_rebuild(self):
+        """Test that an incremental patch gives the same answers as a full build."""
+        universe = RECORDS + _filler(200)
+        first = SymbolSearchIndex.from_records(universe)
+
+        changed = [r for r in universe if r['symbol'] != 'INFY'] + [{'symbol': 'WIPRO', 'name': 'Wipro'}]
+        changed[0] = {'symbol': 'TCS', 'name': 'TCS Limited'}
+        patched = SymbolSearchIndex.from_records(changed, previous=first)
+        full = SymbolSearchIndex.from_records(changed)
+
+        assert patched.build_mode == 'incremental'
+        assert full.build_mode == 'full'
+        for query in ('inf', 'tata', 'wip', 'limited', 'consultancy', 'filler 1', 'tcs'):
+            assert patched.search(query, 20) == full.search(query, 20), query
+        assert 'INFY' not in patched.search('inf')
+        assert first.search('inf') == ['INF', 'INFY']  # the previous index is untouched
+
+    def test_many_changes_rebuild_fully(self):
+        """Test that large churn falls back to a full rebuild."""
+        first = SymbolSearchIndex.from_records(RECORDS)
+        renamed = [dict(record, name=record['name'] + ' Ltd') for record in RECORDS]
+        assert SymbolSearchIndex.from_records(renamed, previous=first).build_mode == 'full'
+
+    def test_symbols_with_punctuation_are_normalized_like_tokens(self):
+        """Test that symbols outside [0-9a-z] are found and stay inside their prefix range."""
+        index = SymbolSearchIndex.from_records([
+            {'symbol': 'M&M', 'name': 'Mahindra & Mahindra'},
+            {'symbol': 'BAJAJ-AUTO', 'name': 'Bajaj Auto'},
+            {'symbol': 'AB~X', 'name': 'Tilde Corp'},
+            {'symbol': 'ABC', 'name': 'Alphabet Co'},
+        ])
+        assert index.search('mm') == ['M&M']
+        assert index.search('bajaja') == ['BAJAJ-AUTO']
+        assert index.search('ab') == ['ABC', 'AB~X']
+
+
+class TestSearchEndpoint:
+    """Test cases for /api/symbols/search."""
+
+    def test_search_endpoint(self):
+        """Test lookup against the loaded snapshot."""
+        with TestClient(main.app) as client:
+            response = client.get('/api/symbols/search', params={'q': 'tc'})
+            assert response.status_code == 200
+            results = response.json()['results']
+            assert results[0]['symbol'] == 'TCS'
+            assert results[0]['name'] == 'Tata Consultancy Services'
+
+            assert client.get('/api/symbols/search', params={'q': 'tc', 'limit': 0}).status_code == 400
+
+    def test_nan_fields_are_returned_as_null(self, monkeypatch):
+        """Test that a matched row with NaN fields serializes as null instead of failing."""
+        snapshot = MarketSnapshot([{'symbol': 'NANCO', 'name': float('nan'), 'sector': 'IT', 'price': float('nan'),
+                                    'change_1d_pct': 0.0, 'change_7d_pct': 0.0, 'volatility': 0.02}], version=1)
+        monkeypatch.setattr(market_updater, 'get_snapshot', lambda: snapshot)
+        response = TestClient(main.app).get('/api/symbols/search', params={'q': 'nan'})
+        assert response.status_code == 200
+        assert response.json()['results'] == [{'symbol': 'NANCO', 'name': None, 'sector': 'IT', 'price': None}]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,95 @@
+import pytest
+import sys
+import os
+
+# Add backend directory to Python path so we can import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from usage_rollup import RingSeries, UsageRollup
+
+
+# A fixed "now" aligned to a day boundary keeps bucket arithmetic readable
+NOW = 1_700_006_400.0
+
+
+class TestUsageRollup:
+    """Test cases for time-bucketed usage aggregation."""
+
+    def test_events_land_in_their_buckets(self):
+        """Test that events are summed per minute bucket."""
+        rollup = UsageRollup()
+        rollup.record(1, 3, 11.0, ts=NOW + 5)
+        rollup.record(1, 2, 9.0, ts=NOW + 50)
+        rollup.record(1, 0, 5.0, ts=NOW + 65)
+
+        result = rollup.query(NOW, NOW + 119, resolution='minute', now=NOW + 120)
+        assert [p['portfolios'] for p in result['points']] == [2, 1]
+        assert [p['advice'] for p in result['points']] == [5, 0]
+        assert result['points'][0]['revenue'] == 20.0
+
+    def test_ring_recycles_old_slots(self):
+        """Test that a slot reused by a newer bucket drops the old counts."""
+        series = RingSeries(width=60, slots=3)
+        series.add(NOW, 1, 1, 1.0)
+        series.add(NOW + 180, 1, 1, 1.0)  # same slot, three buckets later
+        series.add(NOW, 5, 5, 5.0)        # now older than retention: ignored
+
+        assert series.buckets(NOW, NOW)[0][1] == 0
+        assert series.buckets(NOW + 180, NOW + 180)[0][1] == 1
+
+    def test_automatic_resolution_and_downsampling(self):
+        """Test that long ranges use coarser buckets and respect max_points."""
+        rollup = UsageRollup()
+        for hour in range(48):
+            rollup.record(1, 1, 7.0, ts=NOW + hour * 3600)
+        end = NOW + 48 * 3600 - 1
+
+        result = rollup.query(NOW, end, max_points=12, now=end)
+        assert result['resolution'] == 'hour'
+        assert len(result['points']) == 12
+        assert result['bucket_seconds'] == 4 * 3600
+        assert sum(p['portfolios'] for p in result['points']) == 48
+
+    def test_recent_window_is_whole_buckets(self):
+        """Test that the default 24h window is 24 hourly points ending with the current hour."""
+        rollup = UsageRollup()
+        now = NOW + 30 * 3600 + 1800
+        rollup.record(1, 1, 5.0, ts=now - 24 * 3600)  # in the hour before the window
+        rollup.record(1, 1, 5.0, ts=now - 23 * 3600)
+        rollup.record(1, 1, 5.0, ts=now)
+
+        result = rollup.recent(86400, max_points=24, now=now)
+        assert (result['resolution'], result['bucket_seconds']) == ('hour', 3600)
+        assert len(result['points']) == 24
+        assert result['points'][-1]['ts'] == NOW + 30 * 3600
+        assert result['end'] == NOW + 31 * 3600
+        assert sum(p['portfolios'] for p in result['points']) == 2
+        assert len(rollup.recent(86400, max_points=12, now=now)['points']) == 12
+
+    def test_query_is_clamped_to_retention(self):
+        """Test that a range reaching back to the epoch only walks retained buckets."""
+        rollup = UsageRollup()
+        rollup.record(1, 2, 3.0, ts=NOW - 30)
+        series = rollup.series['minute']
+        assert len(series.buckets(0, NOW + 10 ** 9, now=NOW)) == series.slots
+
+        result = rollup.query(0, NOW + 10 ** 9, 'minute', max_points=120, now=NOW)
+        assert len(result['points']) == 120
+        assert result['points'][0]['ts'] == series.retention_start(NOW)
+        assert result['bucket_seconds'] == 12 * 60
+        assert sum(p['portfolios'] for p in result['points']) == 1
+
+    def test_save_and_load_round_trip(self, tmp_path):
+        """Test that persisted rollups answer the same queries after reload."""
+        path = str(tmp_path / 'rollups.json')
+        rollup = UsageRollup()
+        rollup.record(1, 4, 13.0, ts=NOW + 30)
+        rollup.save(path)
+
+        restored = UsageRollup()
+        restored.load(path)
+        assert restored.query(NOW, NOW + 59, 'minute', now=NOW) == rollup.query(NOW, NOW + 59, 'minute', now=NOW)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])